@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟站点 - 模拟 mp3juice 的搜索/转换/下载流程 和 lrclib 的搜索页面/API
+用于离线基准测试，可配置网络延迟、转换耗时、失败率和文件大小
+
+单独运行：python bench/fake_sites.py --latency 0.2 --conversion-delay 3
+"""
+
+import html
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote, quote
+
+# MPEG-1 Layer III, 128kbps, 44.1kHz, 无CRC 的帧头；每帧 417 字节
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+MP3_FRAME_SIZE = 417
+
+MP3JUICE_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>MP3Juice (local)</title></head>
+<body>
+<input type="text" id="q" placeholder="Search">
+<button id="go" onclick="doSearch()">Search</button>
+<div id="results"></div>
+<script>
+function doSearch() {
+  const q = document.getElementById('q').value;
+  fetch('/api/search?q=' + encodeURIComponent(q)).then(r => r.json()).then(items => {
+    const box = document.getElementById('results');
+    box.innerHTML = '';
+    items.forEach(item => {
+      const row = document.createElement('div');
+      const link = document.createElement('a');
+      link.href = '#';
+      link.textContent = 'MP3 Download';
+      link.addEventListener('click', e => { e.preventDefault(); convert(item.id, row); });
+      row.appendChild(document.createTextNode(item.title + ' '));
+      row.appendChild(link);
+      box.appendChild(row);
+    });
+  });
+}
+function convert(id, row) {
+  const status = document.createElement('span');
+  status.textContent = 'initializing';
+  row.appendChild(status);
+  fetch('/api/convert?id=' + id).then(r => {
+    if (!r.ok) throw new Error('convert failed');
+    return r.json();
+  }).then(data => {
+    const link = document.createElement('a');
+    link.href = data.url;
+    link.textContent = 'Download';
+    link.setAttribute('download', '');
+    status.replaceWith(link);
+  }).catch(() => { status.textContent = 'error'; });
+}
+</script>
+</body></html>
+"""
+
+LRCLIB_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>LRCLIB (local)</title></head>
+<body>
+<table>
+<tr><td>{title}</td><td>Synced</td>
+<td><button class="rounded text-indigo-700" onclick="document.getElementById('lrc').style.display='block'">Copy</button></td></tr>
+</table>
+<div id="lrc" style="display:none"><pre>{lyrics}</pre></div>
+</body></html>
+"""
+
+
+def make_lyrics(title, lines=24):
+    """生成带时间标签的歌词"""
+    result = []
+    for i in range(lines):
+        seconds = i * 7
+        result.append(f"[{seconds // 60:02d}:{seconds % 60:02d}.00]{title} line {i + 1}")
+    return "\n".join(result) + "\n"
+
+
+def make_mp3_bytes(size):
+    """生成由合法帧头组成的MP3数据（静音帧）"""
+    frame = MP3_FRAME_HEADER + b"\x00" * (MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    count = max(1, size // MP3_FRAME_SIZE)
+    return frame * count
+
+
+class FakeSiteConfig:
+    """模拟站点参数"""
+
+    def __init__(self, latency=0.05, conversion_delay=2.0, failure_rate=0.0,
+                 file_size=4 * 1024 * 1024, seed=None):
+        self.latency = latency
+        self.conversion_delay = conversion_delay
+        self.failure_rate = failure_rate
+        self.file_size = file_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def should_fail(self):
+        """按失败率随机决定本次请求是否失败"""
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+
+class _BaseHandler(BaseHTTPRequestHandler):
+    """公共处理逻辑"""
+
+    protocol_version = "HTTP/1.1"
+    config = None
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, data):
+        self._send(status, json.dumps(data, ensure_ascii=False), "application/json; charset=utf-8")
+
+
+class Mp3JuiceHandler(_BaseHandler):
+    """模拟 mp3juice：首页 -> 搜索 -> 转换 -> 下载"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(self.config.latency)
+
+        if url.path == "/":
+            self._count("page")
+            self._send(200, MP3JUICE_PAGE)
+        elif url.path == "/api/search":
+            self._count("search")
+            title = query.get("q", [""])[0]
+            if self.config.should_fail():
+                self._json(200, [])
+            else:
+                self._json(200, [{"id": quote(title, safe=""), "title": title}])
+        elif url.path == "/api/convert":
+            self._count("convert")
+            time.sleep(self.config.conversion_delay)
+            if self.config.should_fail():
+                self._json(500, {"error": "conversion failed"})
+            else:
+                song_id = query.get("id", [""])[0]
+                host = self.headers.get("Host")
+                self._json(200, {"url": f"http://{host}/download/{quote(song_id, safe='')}.mp3"})
+        elif url.path.startswith("/download/"):
+            self._count("download")
+            title = unquote(url.path[len("/download/"):-len(".mp3")])
+            body = self.server.mp3_bytes
+            # 站点返回的文件名与歌曲名不同，下载器需要自己重命名
+            filename = quote(f"{title} (mp3juice).mp3")
+            self._send(200, body, "audio/mpeg", {
+                "Content-Disposition": f"attachment; filename*=UTF-8''{filename}"
+            })
+        else:
+            self._send(404, "not found")
+
+
+class LrclibHandler(_BaseHandler):
+    """模拟 lrclib：搜索页面 和 /api/search"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(self.config.latency)
+
+        if url.path.startswith("/search/"):
+            self._count("lrc_page")
+            title = unquote(url.path[len("/search/"):])
+            if self.config.should_fail():
+                self._send(200, "<html><body>No results</body></html>")
+            else:
+                self._send(200, LRCLIB_PAGE.format(title=html.escape(title),
+                                                       lyrics=html.escape(make_lyrics(title))))
+        elif url.path == "/api/search":
+            self._count("lrc_api")
+            title = query.get("q", [""])[0]
+            if self.config.should_fail():
+                self._json(200, [])
+            else:
+                lyrics = make_lyrics(title)
+                self._json(200, [{"id": 1, "trackName": title, "syncedLyrics": lyrics,
+                                  "plainLyrics": lyrics}])
+        else:
+            self._send(404, "not found")
+
+
+class FakeSites:
+    """同时启动模拟的 mp3juice 和 lrclib 两个站点"""
+
+    def __init__(self, config=None, host="127.0.0.1"):
+        self.config = config or FakeSiteConfig()
+        self.host = host
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._servers = []
+
+    def _make_server(self, handler):
+        handler_class = type(handler.__name__, (handler,), {
+            "config": self.config,
+            "stats": self.stats,
+            "stats_lock": self._stats_lock,
+        })
+        server = ThreadingHTTPServer((self.host, 0), handler_class)
+        server.daemon_threads = True
+        server.mp3_bytes = make_mp3_bytes(self.config.file_size)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self._servers.append(server)
+        return f"http://{self.host}:{server.server_port}"
+
+    def start(self):
+        """启动站点，返回 (mp3juice地址, lrclib地址)"""
+        self.mp3juice_url = self._make_server(Mp3JuiceHandler) + "/"
+        self.lrclib_url = self._make_server(LrclibHandler)
+        return self.mp3juice_url, self.lrclib_url
+
+    def stop(self):
+        """停止站点"""
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 mp3juice / lrclib 站点")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的额外延迟（秒）")
+    parser.add_argument("--conversion-delay", type=float, default=2.0, help="转换耗时（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="失败率 0~1")
+    parser.add_argument("--file-size", type=int, default=4 * 1024 * 1024, help="MP3文件大小（字节）")
+    args = parser.parse_args()
+
+    sites = FakeSites(FakeSiteConfig(args.latency, args.conversion_delay,
+                                     args.failure_rate, args.file_size))
+    mp3juice_url, lrclib_url = sites.start()
+    print(f"mp3juice: {mp3juice_url}")
+    print(f"lrclib:   {lrclib_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sites.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载吞吐量基准测试
+启动本地模拟站点，用无头Chrome驱动 MusicDownloader.process_downloads
+（或 --workers N 的并行模式），输出每分钟歌曲数、各阶段耗时和峰值内存。
+
+示例：
+    python bench/run_benchmark.py --songs 10
+    python bench/run_benchmark.py --songs 30 --workers 3 --conversion-delay 5 --failure-rate 0.1
+    python bench/run_benchmark.py --songs 10 --json bench_output.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_sites import FakeSites, FakeSiteConfig
+from stage_tracer import StageTracer
+
+
+def peak_rss_mb():
+    """返回 (本进程峰值内存MB, 已结束子进程峰值内存MB)"""
+    try:
+        import resource
+        # ru_maxrss 在macOS上以字节为单位，Linux上以KB为单位
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+        return own, children
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", info.rss)
+        return peak / 1024 / 1024, 0.0
+    except ImportError:
+        return 0.0, 0.0
+
+
+def run_benchmark(songs=10, workers=1, latency=0.05, conversion_delay=2.0,
+                  failure_rate=0.0, file_size=4 * 1024 * 1024, seed=1, keep=False):
+    """运行一次基准测试，返回结果字典"""
+    from music_downloader_v2 import MusicDownloader
+
+    sites = FakeSites(FakeSiteConfig(latency, conversion_delay, failure_rate, file_size, seed))
+    mp3juice_url, lrclib_url = sites.start()
+
+    work_dir = tempfile.mkdtemp(prefix="mahepo-bench-")
+    download_dir = os.path.join(work_dir, "download")
+    os.makedirs(download_dir)
+
+    downloader = MusicDownloader(download_dir=download_dir)
+    # 所有输出都放在临时目录，不影响正式的记录文件
+    downloader.todo_file = os.path.join(work_dir, "todo-download.txt")
+    downloader.success_file = os.path.join(work_dir, "download-success.txt")
+    downloader.error_file = os.path.join(work_dir, "download-err.txt")
+    downloader.trace_file = os.path.join(work_dir, "download-trace.jsonl")
+    downloader.tracer = StageTracer(downloader.trace_file)
+    downloader.mp3juice_url = mp3juice_url
+    downloader.lrclib_url = lrclib_url
+
+    song_names = [f"Bench Song {i + 1:03d}" for i in range(songs)]
+    with open(downloader.todo_file, 'w', encoding='utf-8') as f:
+        for name in song_names:
+            f.write(f"{name}\n")
+
+    start = time.perf_counter()
+    try:
+        if workers > 1:
+            downloader.process_downloads_parallel(workers)
+        else:
+            downloader.process_downloads()
+    finally:
+        elapsed = time.perf_counter() - start
+        sites.stop()
+
+    mp3_count = sum(1 for f in os.listdir(download_dir) if f.endswith('.mp3'))
+    lrc_count = sum(1 for f in os.listdir(download_dir) if f.endswith('.lrc'))
+    own_rss, child_rss = peak_rss_mb()
+    summary = downloader.tracer.summary()
+
+    result = {
+        "songs": songs,
+        "workers": workers,
+        "latency": latency,
+        "conversion_delay": conversion_delay,
+        "failure_rate": failure_rate,
+        "file_size": file_size,
+        "elapsed": elapsed,
+        "mp3_ok": mp3_count,
+        "lrc_ok": lrc_count,
+        "songs_per_minute": mp3_count * 60.0 / elapsed if elapsed > 0 else 0.0,
+        "stages": summary["stages"],
+        "peak_rss_mb": own_rss,
+        "peak_child_rss_mb": child_rss,
+        "requests": dict(sites.stats),
+        "work_dir": work_dir if keep else None,
+    }
+
+    if not keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return result
+
+
+def format_result(result):
+    """生成便于阅读的报告"""
+    lines = [
+        f"{'='*60}",
+        f"歌曲 {result['songs']} 首, 浏览器 {result['workers']} 个, "
+        f"延迟 {result['latency']}s, 转换 {result['conversion_delay']}s, "
+        f"失败率 {result['failure_rate']:.0%}, 文件 {result['file_size'] / 1024 / 1024:.1f}MB",
+        f"总耗时 {result['elapsed']:.1f}s, MP3成功 {result['mp3_ok']}, 歌词成功 {result['lrc_ok']}",
+        f"吞吐量 {result['songs_per_minute']:.2f} 首/分钟",
+        f"峰值内存 本进程 {result['peak_rss_mb']:.1f}MB, 子进程(Chrome) {result['peak_child_rss_mb']:.1f}MB",
+        f"{'阶段':<14}{'次数':>6}{'失败':>6}{'p50':>9}{'p90':>9}{'p99':>9}",
+    ]
+    for stage, s in sorted(result["stages"].items(), key=lambda kv: -kv[1]["total"]):
+        lines.append(f"{stage:<14}{s['count']:>6}{s['errors']:>6}"
+                     f"{s['p50']:>8.2f}s{s['p90']:>8.2f}s{s['p99']:>8.2f}s")
+    lines.append(f"请求数: {result['requests']}")
+    if result["work_dir"]:
+        lines.append(f"输出目录: {result['work_dir']}")
+    lines.append(f"{'='*60}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="马赫坡音乐下载吞吐量基准测试")
+    parser.add_argument("--songs", type=int, default=10, help="歌曲数量")
+    parser.add_argument("--workers", type=int, default=1, help="浏览器数量，>1 使用并行模式")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的额外延迟（秒）")
+    parser.add_argument("--conversion-delay", type=float, default=2.0, help="转换耗时（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="失败率 0~1")
+    parser.add_argument("--file-size", type=int, default=4 * 1024 * 1024, help="MP3文件大小（字节）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子（失败率）")
+    parser.add_argument("--keep", action="store_true", help="保留下载目录和追踪文件")
+    parser.add_argument("--json", help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        songs=args.songs,
+        workers=args.workers,
+        latency=args.latency,
+        conversion_delay=args.conversion_delay,
+        failure_rate=args.failure_rate,
+        file_size=args.file_size,
+        seed=args.seed,
+        keep=args.keep,
+    )
+
+    print(format_result(result))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+站点会话录制与回放
+- record：用真实站点跑一遍下载流程，通过Chrome性能日志和CDP记录所有请求、
+  响应内容和耗时，保存为类HAR格式的JSON夹具（fixture）
+- serve：按夹具确定性地回放这些响应，可选按录制时的速度回放
+- check：对回放站点重新跑一遍下载流程，检查功能是否仍然正常、
+  各阶段耗时是否相比录制时明显变慢（供CI使用，失败时退出码为1）
+
+示例：
+    python bench/session_replay.py record --song "起风了" --song "See You Again" -o bench/fixtures/today.har.json
+    python bench/session_replay.py serve bench/fixtures/today.har.json --realtime
+    python bench/session_replay.py check bench/fixtures/today.har.json --realtime
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import base64
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_sites import make_mp3_bytes
+from stage_tracer import StageTracer, percentile
+
+# 超过该大小的响应只记录大小，回放时生成同样大小的静音MP3/空内容
+MAX_BODY_SIZE = 512 * 1024
+TEXT_TYPES = ("text/", "application/json", "application/javascript",
+              "application/x-javascript", "application/xml", "image/svg+xml")
+HOST_PREFIX = "/__host__/"
+
+
+# ----------------------------------------------------------------------
+# 录制
+# ----------------------------------------------------------------------
+
+class NetworkRecorder:
+    """从Chrome性能日志中收集网络请求"""
+
+    def __init__(self, driver, max_body_size=MAX_BODY_SIZE):
+        self.driver = driver
+        self.max_body_size = max_body_size
+        self.entries = []
+        self._pending = {}
+        self._first_timestamp = None
+
+    def drain(self):
+        """处理已产生的性能日志；请求完成后立即取响应内容（页面跳转后就取不到了）"""
+        try:
+            logs = self.driver.get_log("performance")
+        except Exception:
+            return
+
+        for log in logs:
+            try:
+                message = json.loads(log["message"])["message"]
+            except Exception:
+                continue
+
+            method = message.get("method", "")
+            params = message.get("params", {})
+            request_id = params.get("requestId")
+
+            if method == "Network.requestWillBeSent":
+                request = params["request"]
+                if request["url"].startswith("data:"):
+                    continue
+                if self._first_timestamp is None:
+                    self._first_timestamp = params["timestamp"]
+                self._pending[request_id] = {
+                    "url": request["url"],
+                    "method": request["method"],
+                    "wall_time": params.get("wallTime", time.time()),
+                    "timestamp": params["timestamp"],
+                }
+            elif method == "Network.responseReceived" and request_id in self._pending:
+                response = params["response"]
+                self._pending[request_id].update({
+                    "status": response.get("status", 200),
+                    "mime_type": response.get("mimeType", ""),
+                    "headers": response.get("headers", {}),
+                    "response_timestamp": params["timestamp"],
+                })
+            elif method == "Network.loadingFinished" and request_id in self._pending:
+                item = self._pending.pop(request_id)
+                item["finished_timestamp"] = params["timestamp"]
+                item["size"] = int(params.get("encodedDataLength", 0))
+                self._finish(request_id, item)
+            elif method == "Network.loadingFailed" and request_id in self._pending:
+                self._pending.pop(request_id)
+
+    def _finish(self, request_id, item):
+        """生成一条类HAR记录"""
+        if "status" not in item:
+            return
+
+        content = {"mimeType": item["mime_type"], "size": item["size"]}
+        is_text = item["mime_type"].startswith(TEXT_TYPES)
+
+        if item["size"] <= self.max_body_size or is_text:
+            try:
+                body = self.driver.execute_cdp_cmd("Network.getResponseBody",
+                                                   {"requestId": request_id})
+                content["text"] = body.get("body", "")
+                if body.get("base64Encoded"):
+                    content["encoding"] = "base64"
+                content["size"] = len(content["text"])
+            except Exception:
+                # 浏览器下载的文件（如MP3）拿不到内容，回放时按大小合成
+                content["_synthetic"] = True
+        else:
+            content["_synthetic"] = True
+
+        wait = (item["response_timestamp"] - item["timestamp"]) * 1000
+        receive = (item["finished_timestamp"] - item["response_timestamp"]) * 1000
+        headers = [{"name": k, "value": v} for k, v in item["headers"].items()
+                   if k.lower() in ("content-type", "content-disposition", "location")]
+
+        self.entries.append({
+            "startedDateTime": datetime.fromtimestamp(item["wall_time"], timezone.utc).isoformat(),
+            "time": round(wait + receive, 3),
+            "request": {"method": item["method"], "url": item["url"]},
+            "response": {"status": item["status"], "headers": headers, "content": content},
+            "timings": {"wait": round(wait, 3), "receive": round(receive, 3)},
+            "_offset": round((item["timestamp"] - self._first_timestamp) * 1000, 3),
+        })
+
+
+class RecordingDriver:
+    """包装WebDriver：每次调用后收集网络日志，其余行为与原驱动一致"""
+
+    def __init__(self, driver, recorder):
+        self._driver = driver
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attr = getattr(self._driver, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            # 跳转前先收集，避免上一个页面的响应内容被丢弃
+            self._recorder.drain()
+            result = attr(*args, **kwargs)
+            self._recorder.drain()
+            return result
+
+        return wrapper
+
+
+def record_session(songs, output, max_body_size=MAX_BODY_SIZE):
+    """在真实站点上录制下载会话"""
+    from music_downloader_v2 import MusicDownloader
+
+    work_dir = tempfile.mkdtemp(prefix="mahepo-record-")
+    download_dir = os.path.join(work_dir, "download")
+    os.makedirs(download_dir)
+
+    downloader = MusicDownloader(download_dir=download_dir)
+    downloader.tracer = StageTracer(os.path.join(work_dir, "trace.jsonl"))
+    driver = downloader.create_driver(download_dir, performance_log=True)
+    recorder = NetworkRecorder(driver, max_body_size)
+    downloader.driver = RecordingDriver(driver, recorder)
+
+    results = {}
+    try:
+        for song in songs:
+            mp3_ok = downloader.download_mp3_from_mp3juice(song)
+            lrc_ok, _ = downloader.download_lrc_from_lrclib(song)
+            results[song] = {"mp3": bool(mp3_ok), "lrc": bool(lrc_ok)}
+        recorder.drain()
+    finally:
+        driver.quit()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    fixture = {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "MahepoMusic session_replay", "version": "1.0"},
+            "entries": recorder.entries,
+        },
+        "_session": {
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "mp3juice_url": downloader.mp3juice_url,
+            "lrclib_url": downloader.lrclib_url,
+            "songs": songs,
+            "results": results,
+            "stages": downloader.tracer.spans,
+        },
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, ensure_ascii=False)
+
+    print(f"已录制 {len(recorder.entries)} 个请求 -> {output}")
+    return fixture
+
+
+# ----------------------------------------------------------------------
+# 回放
+# ----------------------------------------------------------------------
+
+def load_fixture(path):
+    """读取夹具"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ReplayServer:
+    """按夹具回放响应
+
+    所有站点都由同一个本地端口提供，路径形如 /__host__/<域名>/<原路径>；
+    文本响应中指向已录制域名的绝对地址会被改写到本地，
+    以 / 开头的相对地址则根据 Referer 判断属于哪个域名。
+    同一个请求录制了多次时按录制顺序依次返回，用完后重复最后一次。
+    """
+
+    def __init__(self, fixture, realtime=False, speed=1.0, host="127.0.0.1"):
+        self.fixture = fixture
+        self.realtime = realtime
+        self.speed = speed
+        self.host = host
+        self.base_url = None
+        self.misses = []
+        self._server = None
+        self._lock = threading.Lock()
+        self._cursor = {}
+        self._by_key = {}
+        self._by_path = {}
+
+        for entry in fixture["log"]["entries"]:
+            url = urlparse(entry["request"]["url"])
+            path = url.path + ("?" + url.query if url.query else "")
+            key = (entry["request"]["method"], url.netloc, path)
+            self._by_key.setdefault(key, []).append(entry)
+            self._by_path.setdefault((entry["request"]["method"], path), []).append(entry)
+
+        hosts = sorted({key[1] for key in self._by_key}, key=len, reverse=True)
+        self._host_pattern = re.compile(
+            r"(?:https?:)?//(" + "|".join(re.escape(h) for h in hosts) + r")(?=[/\"'?#]|$)"
+        ) if hosts else None
+
+    def local_url(self, url):
+        """把录制时的绝对地址转换为回放地址"""
+        parsed = urlparse(url)
+        return f"{self.base_url}{HOST_PREFIX}{parsed.netloc}{parsed.path or '/'}"
+
+    def _rewrite(self, text):
+        """改写文本中的绝对地址"""
+        if not self._host_pattern:
+            return text
+        return self._host_pattern.sub(lambda m: f"{self.base_url}{HOST_PREFIX}{m.group(1)}", text)
+
+    def find_entry(self, method, path, referer):
+        """查找请求对应的录制记录"""
+        netloc = None
+        if path.startswith(HOST_PREFIX):
+            rest = path[len(HOST_PREFIX):]
+            netloc, _, tail = rest.partition("/")
+            path = "/" + tail
+        elif referer:
+            ref_path = urlparse(referer).path
+            if ref_path.startswith(HOST_PREFIX):
+                netloc = ref_path[len(HOST_PREFIX):].split("/", 1)[0]
+
+        candidates = self._by_key.get((method, netloc, path)) if netloc else None
+        if not candidates:
+            candidates = self._by_path.get((method, path))
+        if not candidates:
+            # 查询参数不同（如时间戳）时退回到只匹配路径
+            bare = path.split("?", 1)[0]
+            for (m, host, p), entries in self._by_key.items():
+                if m == method and p.split("?", 1)[0] == bare and (netloc is None or host == netloc):
+                    candidates = entries
+                    break
+        if not candidates:
+            return None
+
+        with self._lock:
+            key = id(candidates)
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+        return candidates[min(index, len(candidates) - 1)]
+
+    def body_of(self, entry):
+        """取出（或合成）响应内容"""
+        content = entry["response"]["content"]
+        if content.get("_synthetic"):
+            if "audio" in content.get("mimeType", "") or entry["request"]["url"].endswith(".mp3"):
+                return make_mp3_bytes(content.get("size", 0))
+            return b""
+
+        text = content.get("text", "")
+        if content.get("encoding") == "base64":
+            return base64.b64decode(text)
+        return self._rewrite(text).encode("utf-8")
+
+    def start(self):
+        """启动回放服务器，返回本地地址"""
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._replay("GET")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                self._replay("POST")
+
+            def _replay(self, method):
+                entry = replay.find_entry(method, self.path, self.headers.get("Referer"))
+                if entry is None:
+                    replay.misses.append(f"{method} {self.path}")
+                    body = b"not recorded"
+                    self.send_response(404)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                if replay.realtime:
+                    time.sleep(entry["timings"]["wait"] / 1000.0 / replay.speed)
+
+                body = replay.body_of(entry)
+                self.send_response(entry["response"]["status"])
+                for header in entry["response"]["headers"]:
+                    value = header["value"]
+                    if header["name"].lower() == "location":
+                        value = replay._rewrite(value)
+                    self.send_header(header["name"], value)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((self.host, 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://{self.host}:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        """停止回放服务器"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# ----------------------------------------------------------------------
+# 回归检查
+# ----------------------------------------------------------------------
+
+def stage_p50(spans):
+    """按阶段计算耗时中位数"""
+    by_stage = {}
+    for span in spans:
+        by_stage.setdefault(span["stage"], []).append(span["duration"])
+    return {stage: percentile(sorted(d), 50) for stage, d in by_stage.items()}
+
+
+def check_replay(fixture, realtime=False, speed=1.0, tolerance=1.5, slack=1.0):
+    """对回放站点重跑下载流程，返回 (是否通过, 报告行列表)"""
+    from music_downloader_v2 import MusicDownloader
+
+    session = fixture["_session"]
+    replay = ReplayServer(fixture, realtime=realtime, speed=speed)
+    replay.start()
+
+    work_dir = tempfile.mkdtemp(prefix="mahepo-replay-")
+    download_dir = os.path.join(work_dir, "download")
+    os.makedirs(download_dir)
+
+    downloader = MusicDownloader(download_dir=download_dir)
+    downloader.tracer = StageTracer(os.path.join(work_dir, "trace.jsonl"))
+    downloader.mp3juice_url = replay.local_url(session["mp3juice_url"])
+    downloader.lrclib_url = replay.local_url(session["lrclib_url"]).rstrip("/")
+    downloader.setup_driver()
+
+    report = []
+    passed = True
+    try:
+        for song in session["songs"]:
+            mp3_ok = bool(downloader.download_mp3_from_mp3juice(song))
+            lrc_ok = bool(downloader.download_lrc_from_lrclib(song)[0])
+            expected = session["results"].get(song, {})
+            if mp3_ok != expected.get("mp3") or lrc_ok != expected.get("lrc"):
+                passed = False
+                report.append(f"[功能] {song}: MP3 {expected.get('mp3')} -> {mp3_ok}, "
+                              f"歌词 {expected.get('lrc')} -> {lrc_ok}")
+    finally:
+        downloader.driver.quit()
+        replay.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # 只有按录制速度回放时，耗时才有可比性
+    if realtime:
+        baseline = stage_p50(session["stages"])
+        current = stage_p50(downloader.tracer.spans)
+        for stage, base in sorted(baseline.items()):
+            now = current.get(stage)
+            if now is None:
+                continue
+            limit = base * tolerance + slack
+            flag = "变慢" if now > limit else "正常"
+            if now > limit:
+                passed = False
+            report.append(f"[耗时] {stage:<12} 录制 {base:6.2f}s  回放 {now:6.2f}s  上限 {limit:6.2f}s  {flag}")
+
+    for miss in replay.misses[:20]:
+        report.append(f"[未录制] {miss}")
+
+    return passed, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="站点会话录制与回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="在真实站点上录制会话")
+    rec.add_argument("--song", action="append", required=True, help="歌曲名（可重复）")
+    rec.add_argument("-o", "--output", required=True, help="夹具输出路径")
+    rec.add_argument("--max-body", type=int, default=MAX_BODY_SIZE, help="保存响应内容的大小上限")
+
+    serve = sub.add_parser("serve", help="回放夹具")
+    serve.add_argument("fixture")
+    serve.add_argument("--realtime", action="store_true", help="按录制时的响应耗时回放")
+    serve.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+
+    check = sub.add_parser("check", help="对回放站点重跑下载并检查回归")
+    check.add_argument("fixture")
+    check.add_argument("--realtime", action="store_true", help="按录制时的响应耗时回放并比较阶段耗时")
+    check.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    check.add_argument("--tolerance", type=float, default=1.5, help="允许的耗时倍数")
+    check.add_argument("--slack", type=float, default=1.0, help="允许的额外秒数")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_session(args.song, args.output, args.max_body)
+    elif args.command == "serve":
+        fixture = load_fixture(args.fixture)
+        replay = ReplayServer(fixture, realtime=args.realtime, speed=args.speed)
+        replay.start()
+        session = fixture["_session"]
+        print(f"mp3juice: {replay.local_url(session['mp3juice_url'])}")
+        print(f"lrclib:   {replay.local_url(session['lrclib_url'])}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            replay.stop()
+    elif args.command == "check":
+        passed, report = check_replay(load_fixture(args.fixture), args.realtime,
+                                      args.speed, args.tolerance, args.slack)
+        for line in report:
+            print(line)
+        print("通过" if passed else "失败")
+        sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步下载调度器
+基于asyncio同时调度大量下载任务：
+- 浏览器操作（Selenium）放在有上限的线程池中执行，每个工作线程一个Chrome
+- 歌词（LRCLib API）和MP3文件通过异步HTTP获取
+- 每个任务带超时和取消，任务内的子步骤随任务一起结束
+- 提供线程安全的接口，Tk界面可以提交任务并轮询进度事件
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import shutil
+import asyncio
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+MP3JUICE_URL = "https://mp3juice.co/"
+LRCLIB_URL = "https://lrclib.net"
+USER_AGENT = "MahepoMusic/2.0 (+https://github.com/SinoDigify/MahepoMusic)"
+CHUNK_SIZE = 64 * 1024
+
+
+def sanitize_filename(name):
+    """清理文件名，移除非法字符"""
+    name = re.sub(r'[<>:"/\\|?*]', '_', name)
+    name = name.strip()
+    if len(name) > 200:
+        name = name[:200]
+    return name
+
+
+def mp3juice_browser_stage(driver, landing_dir, song_name, base_url=MP3JUICE_URL):
+    """在浏览器中完成MP3Juice的搜索和转换
+
+    返回 ("url", 下载地址) 由调用方通过HTTP下载；
+    下载链接不是普通地址时退回到浏览器点击下载，返回 ("file", 本地路径)；
+    失败返回 None。
+    """
+    # 延迟导入Selenium模块
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
+    driver.get(base_url)
+
+    search_box = WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, 'input[type="text"]'))
+    )
+    search_box.clear()
+    search_box.send_keys(song_name)
+
+    search_button = driver.find_element(By.XPATH, '//button[contains(text(), "Search")]')
+    search_button.click()
+
+    WebDriverWait(driver, 30).until(
+        EC.presence_of_element_located((By.XPATH, '//a[text()="MP3 Download"]'))
+    )
+
+    download_buttons = driver.find_elements(By.XPATH, '//a[text()="MP3 Download"]')
+    if not download_buttons:
+        return None
+
+    driver.execute_script("arguments[0].click();", download_buttons[0])
+
+    try:
+        download_link = WebDriverWait(driver, 90).until(
+            EC.presence_of_element_located((By.XPATH, '//a[text()="Download"]'))
+        )
+    except TimeoutException:
+        return None
+
+    href = download_link.get_attribute("href") or ""
+    if href.startswith("http://") or href.startswith("https://"):
+        return ("url", href)
+
+    # 链接由脚本生成，只能让浏览器下载到该工作线程独占的落地目录
+    before_files = set(f for f in os.listdir(landing_dir) if f.endswith('.mp3'))
+    driver.execute_script("arguments[0].click();", download_link)
+
+    for i in range(30):
+        time.sleep(1)
+        after_files = set(f for f in os.listdir(landing_dir) if f.endswith('.mp3'))
+        new_files = after_files - before_files
+        if new_files:
+            return ("file", os.path.join(landing_dir, list(new_files)[0]))
+
+    return None
+
+
+class TransferControl:
+    """在线程池中写入的下载：取消标记 + 正在执行的线程任务
+
+    取消后要等线程退出再删除 .part，否则线程可能继续写入或重新创建它。
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.response = None
+        self.future = None
+
+    def cancel(self):
+        """通知线程停止，并关闭响应让阻塞的读取尽快返回"""
+        self.cancelled.set()
+        response = self.response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+    async def wait_stopped(self):
+        """等待线程中的任务结束"""
+        if self.future is None:
+            return
+        if not self.future.done():
+            await asyncio.wait([self.future])
+        if not self.future.cancelled():
+            # 取消后的读写错误不需要处理
+            self.future.exception()
+
+
+class DownloadJob:
+    """单个下载任务"""
+
+    def __init__(self, job_id, song):
+        self.job_id = job_id
+        self.song = song
+        self.status = "queued"
+        self.mp3_success = False
+        self.lrc_success = False
+        self.error = None
+        self.future = None
+
+
+class DownloadOrchestrator:
+    """asyncio下载调度器
+
+    事件循环运行在独立的后台线程中。其他线程（如Tk主线程）通过
+    submit()/cancel()/shutdown() 操作任务，通过 events 队列接收进度：
+        {"job_id", "song", "status", "message", "bytes", "total", "path"}
+    status 取值：queued / started / browser / mp3_progress / mp3_done /
+    lrc_done / done / failed / timeout / cancelled
+    """
+
+    def __init__(self, download_dir, driver_factory, browser_workers=2,
+                 http_concurrency=16, job_timeout=300, browser_timeout=180,
+                 http_timeout=120, browser_stage=mp3juice_browser_stage,
+                 mp3juice_url=MP3JUICE_URL, lrclib_url=LRCLIB_URL, tracer=None):
+        self.download_dir = download_dir
+        self.driver_factory = driver_factory
+        self.browser_workers = browser_workers
+        self.http_concurrency = http_concurrency
+        self.job_timeout = job_timeout
+        self.browser_timeout = browser_timeout
+        self.http_timeout = http_timeout
+        self.browser_stage = browser_stage
+        self.mp3juice_url = mp3juice_url
+        self.lrclib_url = lrclib_url.rstrip("/")
+        self.tracer = tracer
+
+        self.events = queue.Queue()
+        self.jobs = {}
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._http_semaphore = None
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+        # 浏览器线程池大小即Chrome实例上限；urllib兜底时HTTP也走线程池
+        self._browser_pool = ThreadPoolExecutor(max_workers=browser_workers,
+                                                thread_name_prefix="browser")
+        self._io_pool = ThreadPoolExecutor(max_workers=http_concurrency,
+                                           thread_name_prefix="http")
+        self._local = threading.local()
+        self._drivers = []
+
+    # ------------------------------------------------------------------
+    # 线程安全接口
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """启动后台事件循环"""
+        if self._thread:
+            return
+
+        ready = threading.Event()
+
+        def run_loop():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._http_semaphore = asyncio.Semaphore(self.http_concurrency)
+            ready.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                # 结束前让被取消的任务走完清理逻辑
+                pending = asyncio.all_tasks(self._loop)
+                for task in pending:
+                    task.cancel()
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                self._loop.run_until_complete(self._close_session())
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run_loop, daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def submit(self, song):
+        """提交下载任务，返回 (job_id, concurrent.futures.Future)"""
+        if not self._thread:
+            self.start()
+
+        with self._lock:
+            job = DownloadJob(self._next_id, song)
+            self._next_id += 1
+            self.jobs[job.job_id] = job
+
+        self._emit(job, "queued")
+        job.future = asyncio.run_coroutine_threadsafe(self._run_job(job), self._loop)
+        return job.job_id, job.future
+
+    def cancel(self, job_id):
+        """取消单个任务"""
+        job = self.jobs.get(job_id)
+        if job and job.future:
+            job.future.cancel()
+
+    def cancel_all(self):
+        """取消所有未完成的任务"""
+        for job in list(self.jobs.values()):
+            if job.future and not job.future.done():
+                job.future.cancel()
+
+    def pending_count(self):
+        """未完成的任务数"""
+        return sum(1 for job in self.jobs.values() if job.future and not job.future.done())
+
+    def poll_events(self, max_events=200):
+        """取出已产生的进度事件（非阻塞）"""
+        events = []
+        while len(events) < max_events:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def shutdown(self, wait=True):
+        """取消所有任务，停止事件循环并关闭浏览器"""
+        self.cancel_all()
+
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if wait and self._thread:
+            self._thread.join(timeout=10)
+
+        self._browser_pool.shutdown(wait=wait)
+        self._io_pool.shutdown(wait=False)
+
+        drivers, self._drivers = self._drivers, []
+        if wait:
+            self._quit_drivers(drivers)
+        else:
+            # 关闭Chrome较慢，不阻塞调用方（通常是Tk主线程）
+            threading.Thread(target=self._quit_drivers, args=(drivers,), daemon=True).start()
+
+    def _quit_drivers(self, drivers):
+        """关闭浏览器"""
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # 事件循环内部
+    # ------------------------------------------------------------------
+
+    def _emit(self, job, status, message="", **extra):
+        """发送进度事件"""
+        if status not in ("mp3_progress",):
+            job.status = status
+        event = {"job_id": job.job_id, "song": job.song, "status": status,
+                 "message": message, "time": time.time()}
+        event.update(extra)
+        self.events.put(event)
+
+    def _span(self, job, stage, worker="asyncio"):
+        """阶段追踪（未设置tracer时为空操作）"""
+        if self.tracer is None:
+            return nullcontext()
+        return self.tracer.span(job.song, stage, worker)
+
+    async def _run_job(self, job):
+        """执行单个任务（带整体超时）"""
+        self._emit(job, "started")
+        try:
+            await asyncio.wait_for(self._run_stages(job), self.job_timeout)
+        except asyncio.CancelledError:
+            self._emit(job, "cancelled", "已取消")
+            raise
+        except asyncio.TimeoutError as e:
+            job.error = "timeout"
+            # 阶段超时带有各自的说明，整体超时没有
+            self._emit(job, "timeout", str(e) or f"超过 {self.job_timeout} 秒未完成")
+            return job
+        except Exception as e:
+            job.error = str(e)
+            self._emit(job, "failed", str(e))
+            return job
+
+        if job.mp3_success:
+            self._emit(job, "done")
+        else:
+            self._emit(job, "failed", job.error or "MP3下载失败")
+        return job
+
+    async def _run_stages(self, job):
+        """MP3和歌词并发获取，任一步骤异常时取消另一个"""
+        tasks = [asyncio.ensure_future(self._fetch_mp3(job)),
+                 asyncio.ensure_future(self._fetch_lyrics(job))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # 等待子任务真正结束后再返回
+            await asyncio.wait(tasks)
+
+    async def _fetch_mp3(self, job):
+        """浏览器转换 + HTTP下载MP3"""
+        loop = asyncio.get_running_loop()
+        self._emit(job, "browser", "正在搜索和转换")
+
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self._browser_pool, self._browser_call, job),
+                self.browser_timeout
+            )
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"搜索和转换超过 {self.browser_timeout} 秒未完成")
+        if not result:
+            job.error = "未找到可下载的MP3"
+            return False
+
+        kind, value = result
+        safe_name = sanitize_filename(job.song)
+        target_path = os.path.join(self.download_dir, f"{safe_name}.mp3")
+
+        if kind == "url":
+            part_path = target_path + ".part"
+            control = TransferControl()
+            try:
+                with self._span(job, "mp3_http"):
+                    await asyncio.wait_for(self._http_download(job, value, part_path, control),
+                                           self.http_timeout)
+            except asyncio.TimeoutError:
+                await self._discard_part(part_path, control)
+                raise asyncio.TimeoutError(f"MP3下载超过 {self.http_timeout} 秒未完成")
+            except BaseException:
+                # 失败或取消：不留下不完整的 .part
+                await self._discard_part(part_path, control)
+                raise
+            with self._span(job, "rename"):
+                os.replace(part_path, target_path)
+        else:
+            with self._span(job, "rename"):
+                if os.path.exists(target_path):
+                    os.remove(target_path)
+                shutil.move(value, target_path)
+
+        job.mp3_success = True
+        self._emit(job, "mp3_done", path=target_path)
+        return True
+
+    @staticmethod
+    async def _discard_part(part_path, control):
+        """停止写入线程，等它退出后删除下载失败留下的 .part 文件"""
+        control.cancel()
+        await control.wait_stopped()
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+
+    async def _fetch_lyrics(self, job):
+        """通过LRCLib API获取同步歌词"""
+        url = f"{self.lrclib_url}/api/search?q={quote(job.song)}"
+        with self._span(job, "lrc_api") as span:
+            try:
+                data = await asyncio.wait_for(self._http_get_json(url), self.http_timeout)
+            except asyncio.TimeoutError:
+                if span:
+                    span.fail("timeout")
+                return False
+            except Exception:
+                if span:
+                    span.fail("error")
+                return False
+
+        lyrics = None
+        for item in data or []:
+            if item.get("syncedLyrics"):
+                lyrics = item["syncedLyrics"]
+                break
+
+        if not lyrics:
+            return False
+
+        safe_name = sanitize_filename(job.song)
+        lrc_path = os.path.join(self.download_dir, f"{safe_name}.lrc")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._io_pool, self._write_text, lrc_path, lyrics)
+
+        job.lrc_success = True
+        self._emit(job, "lrc_done", path=lrc_path)
+        return True
+
+    def _browser_call(self, job):
+        """在浏览器线程中执行（每个线程复用自己的Chrome）"""
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            landing_dir = os.path.join(self.download_dir, ".landing",
+                                       threading.current_thread().name)
+            os.makedirs(landing_dir, exist_ok=True)
+            driver = self.driver_factory(landing_dir)
+            self._local.driver = driver
+            self._local.landing_dir = landing_dir
+            with self._lock:
+                self._drivers.append(driver)
+
+        worker = threading.current_thread().name
+        with self._span(job, "browser", worker) as span:
+            result = self.browser_stage(driver, self._local.landing_dir, job.song,
+                                        self.mp3juice_url)
+            if not result and span:
+                span.fail("not_found")
+        return result
+
+    async def _get_session(self):
+        """懒创建aiohttp会话（必须在事件循环线程中创建）"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers={"User-Agent": USER_AGENT})
+        return self._session
+
+    async def _close_session(self):
+        """关闭aiohttp会话"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _http_get_json(self, url):
+        """异步GET并解析JSON"""
+        async with self._http_semaphore:
+            if AIOHTTP_AVAILABLE:
+                session = await self._get_session()
+                async with session.get(url) as resp:
+                    resp.raise_for_status()
+                    return await resp.json(content_type=None)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._io_pool, self._urllib_get_json, url)
+
+    async def _http_download(self, job, url, path, control):
+        """异步下载文件到path，下载过程中发送进度事件"""
+        async with self._http_semaphore:
+            if AIOHTTP_AVAILABLE:
+                session = await self._get_session()
+                async with session.get(url) as resp:
+                    resp.raise_for_status()
+                    total = resp.content_length or 0
+                    received = 0
+                    loop = asyncio.get_running_loop()
+                    with open(path, 'wb') as f:
+                        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                            # 写文件放到线程池，不阻塞事件循环；
+                            # 先落盘再发进度，边下边播按磁盘上的字节数读取
+                            control.future = loop.run_in_executor(self._io_pool, self._write_chunk, f, chunk)
+                            await control.future
+                            received += len(chunk)
+                            self._emit(job, "mp3_progress", bytes=received, total=total, path=path)
+                return
+
+            loop = asyncio.get_running_loop()
+            control.future = loop.run_in_executor(self._io_pool, self._urllib_download, job, url, path, control)
+            await control.future
+
+    @staticmethod
+    def _write_chunk(f, chunk):
+        """写入并落盘（线程池中执行）"""
+        f.write(chunk)
+        f.flush()
+
+    @staticmethod
+    def _write_text(path, text):
+        """写文本文件（线程池中执行）"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def _urllib_get_json(self, url):
+        """urllib兜底：GET并解析JSON"""
+        request = Request(url, headers={"User-Agent": USER_AGENT})
+        with urlopen(request, timeout=self.http_timeout) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+
+    def _urllib_download(self, job, url, path, control):
+        """urllib兜底：流式下载文件；control 被取消后不再写入"""
+        request = Request(url, headers={"User-Agent": USER_AGENT})
+        with urlopen(request, timeout=self.http_timeout) as resp:
+            control.response = resp
+            if control.cancelled.is_set():
+                return
+            total = int(resp.headers.get("Content-Length") or 0)
+            received = 0
+            with open(path, 'wb') as f:
+                while not control.cancelled.is_set():
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk or control.cancelled.is_set():
+                        break
+                    f.write(chunk)
+                    f.flush()
+                    received += len(chunk)
+                    self._emit(job, "mp3_progress", bytes=received, total=total, path=path)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件变更监听
+Linux下使用inotify（通过ctypes调用libc，无需额外依赖），其他平台轮询兜底
+- FileChangeWaiter：等待单个文件变化（待下载列表）
+- DirectoryWatcher：监听目录中文件的增删改名（曲库）
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+
+# inotify事件掩码
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """inotify的最小封装"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+
+    def add_watch(self, path, mask):
+        """添加监听，返回watch描述符"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch 失败: {path}")
+        return wd
+
+    def rm_watch(self, wd):
+        """移除监听"""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout=None):
+        """读取事件，返回 [(wd, mask, cookie, name), ...]，超时返回空列表"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        """关闭inotify描述符"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def inotify_available():
+    """当前平台是否可用inotify"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        Inotify().close()
+        return True
+    except Exception:
+        return False
+
+
+def _stat_signature(path):
+    """文件的变更签名（inode, 大小, 修改时间），文件不存在返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class FileChangeWaiter:
+    """等待单个文件发生变化
+
+    监听文件所在目录而不是文件本身，这样文件被删除重建、
+    或被其他工具整体替换（先写临时文件再重命名）时也能感知。
+    """
+
+    def __init__(self, path, poll_interval=1.0, use_inotify=True):
+        self.path = os.path.abspath(path)
+        self.poll_interval = poll_interval
+        self._name = os.path.basename(self.path)
+        self._inotify = None
+        self._last_signature = _stat_signature(self.path)
+
+        if use_inotify and inotify_available():
+            try:
+                self._inotify = Inotify()
+                self._inotify.add_watch(
+                    os.path.dirname(self.path),
+                    IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_DELETE |
+                    IN_MOVED_FROM | IN_MOVED_TO | IN_ATTRIB
+                )
+            except Exception:
+                self.close()
+
+    @property
+    def mode(self):
+        """当前监听方式"""
+        return "inotify" if self._inotify else "polling"
+
+    def wait(self, timeout=None):
+        """阻塞直到文件变化或超时，返回是否检测到变化"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+
+            if self._inotify:
+                events = self._inotify.read_events(remaining)
+                changed = any(
+                    name == self._name or mask & IN_Q_OVERFLOW
+                    for _, mask, _, name in events
+                )
+            else:
+                step = self.poll_interval if remaining is None else min(self.poll_interval, remaining)
+                time.sleep(step)
+                changed = False
+
+            signature = _stat_signature(self.path)
+            if changed or signature != self._last_signature:
+                self._last_signature = signature
+                return True
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        """释放资源"""
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+
+class DirectoryWatcher:
+    """监听目录中的文件增删改名（后台线程），合并短时间内的事件后回调
+
+    callback(changed, renames, overflow) 在监听线程中调用：
+    changed 为新增/删除/修改的文件名集合，renames 为 [(旧文件名, 新文件名), ...]，
+    overflow 为True时表示事件丢失，需要整体重新扫描。
+    inotify不可用时轮询目录的修改时间（增删改名都会改变它），有变化才列目录，按每个文件的 (大小, 修改时间) 比较；
+    原地覆盖写入不改变目录的修改时间，另外每隔 full_scan_interval 秒完整比较一次。
+    """
+
+    def __init__(self, path, callback, suffixes=(".mp3", ".lrc"), debounce=0.3, max_delay=1.0,
+                 poll_interval=0.5, full_scan_interval=10.0, use_inotify=True):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.suffixes = tuple(suffixes)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.full_scan_interval = full_scan_interval
+        self._use_inotify = use_inotify
+        self._inotify = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def mode(self):
+        """当前监听方式"""
+        return "inotify" if self._inotify else "polling"
+
+    def _wanted(self, name):
+        return name.endswith(self.suffixes)
+
+    def start(self):
+        """开始监听"""
+        if self._running:
+            return
+        if self._use_inotify and inotify_available():
+            try:
+                self._inotify = Inotify()
+                self._inotify.add_watch(
+                    self.path,
+                    IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO |
+                    IN_DELETE_SELF | IN_MOVE_SELF
+                )
+            except Exception:
+                if self._inotify:
+                    self._inotify.close()
+                self._inotify = None
+
+        self._running = True
+        target = self._run_inotify if self._inotify else self._run_polling
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监听"""
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def _emit(self, changed, renames, overflow=False):
+        if not (changed or renames or overflow):
+            return
+        try:
+            self.callback(changed, renames, overflow)
+        except Exception as e:
+            print(f"DirectoryWatcher callback error: {e}")
+
+    def _run_inotify(self):
+        changed = set()
+        renames = []
+        moved_from = {}   # cookie -> 文件名
+        overflow = False
+        first = last = None
+
+        while self._running:
+            if first is None:
+                timeout = 0.5
+            else:
+                now = time.monotonic()
+                timeout = max(0.0, min(last + self.debounce, first + self.max_delay) - now)
+
+            try:
+                events = self._inotify.read_events(timeout)
+            except Exception:
+                break
+
+            for _, mask, cookie, name in events:
+                if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF):
+                    overflow = True
+                elif mask & IN_ISDIR or not name:
+                    continue
+                elif mask & IN_MOVED_FROM:
+                    if self._wanted(name):
+                        moved_from[cookie] = name
+                elif mask & IN_MOVED_TO:
+                    old = moved_from.pop(cookie, None)
+                    if old is not None and self._wanted(name):
+                        renames.append((old, name))
+                    elif old is not None:
+                        changed.add(old)
+                    elif self._wanted(name):
+                        changed.add(name)
+                elif self._wanted(name):
+                    changed.add(name)
+
+                now = time.monotonic()
+                if first is None:
+                    first = now
+                last = now
+
+            now = time.monotonic()
+            if first is not None and (now >= last + self.debounce or now >= first + self.max_delay):
+                # 没有配对的移出视为删除（移到了目录外）
+                changed.update(moved_from.values())
+                self._emit(changed, renames, overflow)
+                changed, renames, moved_from, overflow = set(), [], {}, False
+                first = last = None
+
+    def _snapshot(self):
+        """目录中关注的文件 -> (大小, 修改时间)"""
+        entries = {}
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if self._wanted(entry.name):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entries[entry.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+        return entries
+
+    def _dir_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run_polling(self):
+        dir_mtime = self._dir_mtime()
+        snapshot = self._snapshot()   # 上次回调时的状态
+        last = snapshot               # 上次列目录时的状态
+        pending_since = None
+        next_full_scan = time.monotonic() + self.full_scan_interval
+
+        while self._running:
+            time.sleep(self.poll_interval)
+            current = self._dir_mtime()
+            now = time.monotonic()
+            # 目录没变、没有等待中的变化、也没到完整比较的时间：不列目录
+            if current == dir_mtime and pending_since is None and now < next_full_scan:
+                continue
+            dir_mtime = current
+            next_full_scan = now + self.full_scan_interval
+
+            new_snapshot = self._snapshot()
+            if new_snapshot == snapshot:
+                last = new_snapshot
+                pending_since = None
+                continue
+            if pending_since is None:
+                pending_since = time.monotonic()
+            # 还在变化（如文件正在写入）时等它平息，最长等待 max_delay
+            if new_snapshot != last and time.monotonic() - pending_since < self.max_delay:
+                last = new_snapshot
+                continue
+
+            last = new_snapshot
+            pending_since = None
+            removed = [name for name in snapshot if name not in new_snapshot]
+            added = [name for name in new_snapshot if name not in snapshot]
+            changed = set(name for name in new_snapshot
+                          if name in snapshot and new_snapshot[name] != snapshot[name])
+
+            # 大小和修改时间相同的 删除+新增 视为改名
+            renames = []
+            by_signature = {}
+            for name in removed:
+                by_signature.setdefault((os.path.splitext(name)[1], snapshot[name]), []).append(name)
+            for name in added:
+                olds = by_signature.get((os.path.splitext(name)[1], new_snapshot[name]))
+                if olds:
+                    renames.append((olds.pop(), name))
+                else:
+                    changed.add(name)
+            changed.update(name for names in by_signature.values() for name in names)
+
+            snapshot = new_snapshot
+            self._emit(changed, renames)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+声学指纹与重复歌曲检测
+mp3juice的搜索结果不稳定，同一录音常以不同名字下载多次（"See You Again" 和 "See You Again (feat. Charlie Puth)"）。
+每首歌解码中间一段（默认第10秒起30秒），按 Haitsma-Kalker 方法计算指纹：
+每帧把300~2000Hz分成33个对数频带，相邻频带能量差随时间的变化取符号，得到一个32位的子指纹。
+重新编码、不同比特率的同一录音，子指纹大部分位相同；不同歌曲约一半的位不同。
+
+查找时按子指纹的值建倒排表（只收录低4位为0的值，和位置无关，开头多几秒也能对上），
+命中的歌曲按帧偏移对齐后计算误码率，低于阈值即为重复。指纹在进程池中计算，结果按 大小+修改时间 增量保存在曲库索引中。
+计算指纹需要NumPy；比较只用纯Python。
+"""
+
+import io
+import os
+import time
+import threading
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from waveform import decode_pcm
+from integrity import parse_header, _audio_range, _find_sync, SYNC_SEARCH
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 指纹用采样率（单声道）和截取的片段
+FINGERPRINT_RATE = 11025
+WINDOW_START_S = 10
+WINDOW_S = 30
+# 帧长约186ms，帧移为帧长的1/4
+FRAME_MS = 186
+BANDS = 33
+LOW_HZ = 300.0
+HIGH_HZ = 2000.0
+
+# 倒排表只收录 值 & SAMPLE_MASK == 0 的子指纹；太常见的值（静音等）不收录
+SAMPLE_MASK = 0xF
+MAX_POSTING = 256
+# 每首歌最多核对的候选
+MAX_CANDIDATES = 20
+# 误码率阈值和最少重叠帧数
+MAX_BIT_ERROR_RATE = 0.30
+MIN_OVERLAP = 100
+# 只解码开头这么长的音频（取指纹的片段在其中）；按最高比特率320kbps估算要读取的字节数
+DECODE_S = WINDOW_START_S + WINDOW_S
+MAX_BYTES_PER_S = 320 * 1000 // 8
+
+
+def compute_fingerprint(pcm, rate):
+    """16位单声道PCM -> 子指纹 array('I')（片段太短返回空数组）"""
+    samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16)
+    start = WINDOW_START_S * rate
+    if len(samples) < start + WINDOW_S * rate:
+        # 短歌曲取中间一段
+        start = max(0, len(samples) - WINDOW_S * rate) // 2
+    window = samples[start:start + WINDOW_S * rate].astype(np.float32)
+
+    frame = rate * FRAME_MS // 1000
+    hop = frame // 4
+    count = 1 + (len(window) - frame) // hop if len(window) >= frame else 0
+    if count < 2:
+        return array('I')
+
+    positions = np.arange(count)[:, None] * hop + np.arange(frame)[None, :]
+    spectrum = np.abs(np.fft.rfft(window[positions] * np.hanning(frame).astype(np.float32), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frame, 1.0 / rate)
+    edges = np.geomspace(LOW_HZ, HIGH_HZ, BANDS + 1)
+    energy = np.stack([spectrum[:, (freqs >= lo) & (freqs < hi)].sum(axis=1)
+                       for lo, hi in zip(edges[:-1], edges[1:])], axis=1)
+
+    # 频带间能量差随时间的变化
+    diff = energy[:, :-1] - energy[:, 1:]
+    bits = (diff[1:] - diff[:-1]) > 0
+    values = (bits.astype(np.uint64) << np.arange(BANDS - 1, dtype=np.uint64)).sum(axis=1)
+    return array('I', values.astype(np.uint32).tolist())
+
+
+def read_head(path, seconds=DECODE_S):
+    """读取MP3开头 seconds 秒的音频帧（跳过ID3v2，按帧截断）；无法按帧截断时返回读到的全部数据"""
+    with open(path, 'rb') as f:
+        data = f.read(10)
+        tag = 0
+        if data[:3] == b"ID3" and len(data) == 10:
+            tag = 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9])
+        data += f.read(tag + SYNC_SEARCH + seconds * MAX_BYTES_PER_S)
+
+    start, end = _audio_range(data)
+    first = _find_sync(data, start, min(end, start + SYNC_SEARCH))
+    if first is None:
+        return data
+    header = parse_header(data, first)
+    target = seconds * header[2]
+    pos = first
+    samples = 0
+    while samples < target:
+        h = parse_header(data, pos)
+        if h is None or h[2:4] != header[2:4] or pos + h[0] > end:
+            break
+        samples += h[1]
+        pos += h[0]
+    if samples < target and pos + 4 <= end:
+        # 中途有损坏的帧：交给解码器处理
+        return data
+    return data[first:pos]
+
+
+def fingerprint_file(path):
+    """工作进程入口：返回指纹 bytes（只解码开头 DECODE_S 秒）"""
+    pcm = decode_pcm(io.BytesIO(read_head(path)), FINGERPRINT_RATE)
+    import pygame
+    rate = pygame.mixer.get_init()[0]
+    return compute_fingerprint(pcm, rate).tobytes()
+
+
+def bit_error_rate(a, b, offset):
+    """a[i] 和 b[i - offset] 对齐比较，返回 (误码率, 重叠帧数)"""
+    first = max(0, offset)
+    last = min(len(a), len(b) + offset)
+    if last <= first:
+        return 1.0, 0
+    errors = 0
+    for i in range(first, last):
+        errors += bin(a[i] ^ b[i - offset]).count('1')
+    count = last - first
+    return errors / (32.0 * count), count
+
+
+def find_duplicates(fingerprints, progress=None):
+    """fingerprints: {歌曲ID: 指纹bytes} -> 重复分组 [[歌曲ID, ...], ...]
+
+    progress(已比较, 总数) 定期调用。
+    """
+    ids = []
+    prints = []
+    for track_id, data in fingerprints.items():
+        fp = array('I')
+        fp.frombytes(data)
+        if len(fp) >= MIN_OVERLAP:
+            ids.append(track_id)
+            prints.append(fp)
+
+    index = {}     # 子指纹 -> array('q') (歌曲序号 << 16 | 帧号)
+    parent = list(range(len(ids)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for t, fp in enumerate(prints):
+        # 和已收录的歌曲比较：统计 (歌曲, 帧偏移) 的命中次数
+        hits = Counter()
+        keys = [(frame, value) for frame, value in enumerate(fp)
+                if not value & SAMPLE_MASK and value and value != 0xFFFFFFFF]
+        for frame, value in keys:
+            posting = index.get(value)
+            if posting is None or len(posting) > MAX_POSTING:
+                continue
+            for entry in posting:
+                hits[(entry >> 16, frame - (entry & 0xFFFF))] += 1
+
+        checked = set()
+        for (other, offset), _ in hits.most_common(MAX_CANDIDATES):
+            if other in checked or find(other) == find(t):
+                continue
+            checked.add(other)
+            rate, overlap = bit_error_rate(fp, prints[other], offset)
+            if overlap >= MIN_OVERLAP and rate <= MAX_BIT_ERROR_RATE:
+                parent[find(t)] = find(other)
+
+        for frame, value in keys:
+            posting = index.get(value)
+            if posting is None:
+                index[value] = array('q', ((t << 16) | frame,))
+            else:
+                posting.append((t << 16) | frame)
+
+        if progress and ((t + 1) % 200 == 0 or t + 1 == len(prints)):
+            progress(t + 1, len(prints))
+
+    groups = {}
+    for t, track_id in enumerate(ids):
+        groups.setdefault(find(t), []).append(track_id)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class FingerprintScanner:
+    """曲库指纹计算（进程池，增量）；store 需提供 fingerprint_current / put_fingerprint / save"""
+
+    def __init__(self, store, workers=None):
+        self.store = store
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.running = False
+
+    def pending(self, paths):
+        """需要计算指纹的文件（新增或修改过）"""
+        result = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if not self.store.fingerprint_current(path, st):
+                result.append((path, st))
+        return result
+
+    def scan(self, paths, progress=None):
+        """计算指纹并返回统计；progress(已完成, 总数) 在工作线程中调用"""
+        todo = self.pending(paths)
+        summary = {"total": len(paths), "analyzed": 0, "skipped": len(paths) - len(todo),
+                   "failed": 0, "elapsed": 0.0}
+        if not todo:
+            return summary
+
+        start = time.perf_counter()
+        done = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(fingerprint_file, path): (path, st) for path, st in todo}
+            for future in as_completed(futures):
+                path, st = futures[future]
+                try:
+                    self.store.put_fingerprint(path, st, future.result())
+                    summary["analyzed"] += 1
+                except Exception as e:
+                    print(f"Fingerprint error: {path} - {e}")
+                    summary["failed"] += 1
+                done += 1
+                if progress:
+                    progress(done, len(todo))
+                if done % 20 == 0:
+                    self.store.save()
+
+        self.store.save()
+        summary["elapsed"] = time.perf_counter() - start
+        return summary
+
+    def start(self, paths, progress=None, finished=None):
+        """后台线程中计算指纹，完成后调用 finished(summary)"""
+        if self.running:
+            return False
+        self.running = True
+
+        def worker():
+            try:
+                summary = self.scan(paths, progress)
+            except Exception as e:
+                summary = {"error": str(e)}
+            finally:
+                self.running = False
+            if finished:
+                finished(summary)
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MP3完整性检查
+下载中断的文件也会被改名放进下载文件夹，大小看起来正常，播放时才会出错或提前结束。
+逐帧检查MP3：
+- 帧头：从第一帧开始按帧长逐帧跳，每一帧的帧头都要有效，且版本/层/采样率和第一帧一致
+- 尾帧：最后一帧不能超出文件末尾（去掉ID3v1/APE标签后）
+- 时长：帧数换算的实际时长，和Xing/VBRI头中编码器写入的帧数/字节数比较
+- 歌词：歌词最后一行的时间比音频晚很多时只提示（LRCLib按歌名匹配，可能是别的版本的歌词），不算损坏
+检查在进程池中进行，结果按 大小+修改时间 保存在曲库索引中，只检查新增或修改过的文件。
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lrc_parser import parse_lrc_text
+from playback import _MP3_BITRATES
+
+# 检查结果
+STATUS_OK = "ok"
+STATUS_TRUNCATED = "truncated"
+STATUS_CORRUPT = "corrupt"
+STATUS_MISMATCH = "mismatch"    # 帧数据完整，但时长和歌词对不上（只提示，不重新下载）
+
+# 需要重新下载的结果
+BROKEN_STATUSES = (STATUS_TRUNCATED, STATUS_CORRUPT)
+# 同一首歌因检查结果重新下载的最多次数（重新下载后仍然损坏，多半是源文件本身的问题）
+MAX_REQUEUE = 2
+
+# 采样率表：版本位 -> 采样率索引
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),   # MPEG1
+    2: (22050, 24000, 16000),   # MPEG2
+    0: (11025, 12000, 8000),    # MPEG2.5
+}
+
+# 实际长度短于Xing/VBRI声明的比例
+MIN_DECLARED_RATIO = 0.98
+# 歌词最后一行比音频晚多少算不完整（歌词版本和音频版本可能不同，留足余量）
+LYRICS_MARGIN_MS = 15000
+# 失步（帧头无效后重新同步）次数超过 帧数/ERROR_RATIO 时算损坏
+ERROR_RATIO = 100
+MIN_ERRORS = 3
+# 末尾无法解码的数据超过这么多帧的长度时算不完整
+TAIL_GARBAGE_FRAMES = 4
+# 找第一帧的范围（ID3v2之后）
+SYNC_SEARCH = 64 * 1024
+
+
+def parse_header(data, pos):
+    """解析 pos 处的 Layer III 帧头，返回 (帧长, 每帧采样数, 采样率, 版本位, 声道模式)，无效返回None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = _MP3_BITRATES["1" if version == 3 else "2"][bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    if version == 3:
+        return 144000 * bitrate // sample_rate + padding, 1152, sample_rate, version, b3 >> 6
+    return 72000 * bitrate // sample_rate + padding, 576, sample_rate, version, b3 >> 6
+
+
+def _audio_range(data):
+    """音频数据的 (起始, 结束)：去掉开头的ID3v2和末尾的ID3v1/APE标签"""
+    start = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        start = 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9])
+        if data[5] & 0x10:
+            start += 10
+
+    end = len(data)
+    if end - 128 >= start and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    if end - 32 >= start and data[end - 32:end - 24] == b"APETAGEX":
+        size = int.from_bytes(data[end - 20:end - 16], "little")
+        flags = int.from_bytes(data[end - 12:end - 8], "little")
+        end -= size + (32 if flags & 0x80000000 else 0)
+    return start, max(start, end)
+
+
+def _find_sync(data, pos, end, header=None):
+    """从 pos 开始找下一个有效帧头（后面紧跟另一个有效帧头，避免误认），header 给出时版本和采样率需一致"""
+    while True:
+        pos = data.find(b"\xff", pos, end - 3)
+        if pos < 0:
+            return None
+        h = parse_header(data, pos)
+        if h is not None and (header is None or h[2:4] == header[2:4]):
+            following = parse_header(data, pos + h[0])
+            if (following is not None and following[2:4] == h[2:4]) or pos + h[0] == end:
+                return pos
+        pos += 1
+
+
+def _declared(data, pos, header):
+    """第一帧中的Xing/Info或VBRI头：返回 (帧数, 字节数)，没有时为 (None, None)"""
+    frame_len, _, _, version, mode = header
+    if version == 3:
+        side = 17 if mode == 3 else 32
+    else:
+        side = 9 if mode == 3 else 17
+    xing = pos + 4 + side
+    tag = data[xing:xing + 4]
+    if tag in (b"Xing", b"Info"):
+        flags = int.from_bytes(data[xing + 4:xing + 8], "big")
+        offset = xing + 8
+        frames = size = None
+        if flags & 0x01:
+            frames = int.from_bytes(data[offset:offset + 4], "big")
+            offset += 4
+        if flags & 0x02:
+            size = int.from_bytes(data[offset:offset + 4], "big")
+        return frames, size
+    vbri = pos + 4 + 32
+    if data[vbri:vbri + 4] == b"VBRI":
+        return int.from_bytes(data[vbri + 14:vbri + 18], "big"), int.from_bytes(data[vbri + 10:vbri + 14], "big")
+    return None, None
+
+
+def lyrics_end_ms(lrc_path):
+    """歌词的结束时间（[length:]标签或最后一行的时间，毫秒），没有歌词返回None"""
+    try:
+        with open(lrc_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+            doc = parse_lrc_text(f.read())
+    except OSError:
+        return None
+    length = doc.tags.get("length")
+    if length:
+        try:
+            minutes, _, seconds = length.strip().partition(":")
+            return int((int(minutes) * 60 + float(seconds)) * 1000)
+        except ValueError:
+            pass
+    return doc.times[-1] if doc else None
+
+
+def check_data(data, expected_ms=None):
+    """检查MP3数据，返回 {"status", "detail", "duration_ms"}"""
+    start, end = _audio_range(data)
+    first = _find_sync(data, start, min(end, start + SYNC_SEARCH))
+    if first is None:
+        return {"status": STATUS_CORRUPT, "detail": "没有有效的MP3帧", "duration_ms": None}
+
+    header = parse_header(data, first)
+    declared_frames, declared_bytes = _declared(data, first, header)
+    sample_rate = header[2]
+
+    pos = first
+    frames = samples = errors = garbage = 0
+    truncated_tail = False
+    # Xing/VBRI头所在的帧不是音频
+    if declared_frames is not None or declared_bytes is not None:
+        pos += header[0]
+
+    while pos + 4 <= end:
+        h = parse_header(data, pos)
+        if h is None or h[2:4] != header[2:4]:
+            errors += 1
+            resync = _find_sync(data, pos + 1, end, header)
+            if resync is None:
+                # 之后再没有有效帧（如下载中断时预分配的空白部分）
+                garbage = end - pos
+                break
+            pos = resync
+            continue
+        if pos + h[0] > end:
+            truncated_tail = True
+            break
+        frames += 1
+        samples += h[1]
+        pos += h[0]
+
+    duration_ms = samples * 1000 // sample_rate
+    result = {"status": STATUS_OK, "detail": "", "duration_ms": duration_ms}
+
+    if frames == 0:
+        result.update(status=STATUS_CORRUPT, detail="没有有效的MP3帧", duration_ms=None)
+    elif truncated_tail:
+        result.update(status=STATUS_TRUNCATED, detail="最后一帧不完整")
+    elif garbage > TAIL_GARBAGE_FRAMES * header[0]:
+        result.update(status=STATUS_TRUNCATED, detail=f"末尾 {garbage // 1024} KB 不是音频数据")
+    elif declared_bytes and end - first < declared_bytes * MIN_DECLARED_RATIO:
+        result.update(status=STATUS_TRUNCATED,
+                      detail=f"只有声明长度的 {(end - first) * 100 // declared_bytes}%")
+    elif declared_frames and frames < declared_frames * MIN_DECLARED_RATIO:
+        result.update(status=STATUS_TRUNCATED,
+                      detail=f"只有声明帧数的 {frames * 100 // declared_frames}%")
+    elif errors > max(MIN_ERRORS, frames // ERROR_RATIO):
+        result.update(status=STATUS_CORRUPT, detail=f"{errors} 处数据损坏")
+    elif expected_ms and expected_ms > duration_ms + LYRICS_MARGIN_MS:
+        result.update(status=STATUS_MISMATCH,
+                      detail=f"时长 {duration_ms // 1000}s，歌词到 {expected_ms // 1000}s")
+    elif errors:
+        result["detail"] = f"{errors} 处轻微损坏"
+    return result
+
+
+def check_file(path):
+    """工作进程入口：检查MP3文件（同名歌词用于核对时长）"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return check_data(data, lyrics_end_ms(path[:-4] + ".lrc"))
+
+
+class IntegrityScanner:
+    """曲库完整性检查（进程池，增量）；store 需提供 check_current / put_check / save"""
+
+    def __init__(self, store, workers=None):
+        self.store = store
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.running = False
+
+    def pending(self, paths):
+        """需要检查的文件（新增或修改过）"""
+        result = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if not self.store.check_current(path, st):
+                result.append((path, st))
+        return result
+
+    def scan(self, paths, progress=None):
+        """检查并返回统计，summary["broken"] 为本次发现的损坏文件 [(路径, 结果), ...]，
+        summary["warnings"] 为时长和歌词对不上的文件；progress(已完成, 总数) 在工作线程中调用"""
+        todo = self.pending(paths)
+        summary = {"total": len(paths), "checked": 0, "skipped": len(paths) - len(todo),
+                   "failed": 0, "broken": [], "warnings": [], "elapsed": 0.0}
+        if not todo:
+            return summary
+
+        start = time.perf_counter()
+        done = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(check_file, path): (path, st) for path, st in todo}
+            for future in as_completed(futures):
+                path, st = futures[future]
+                try:
+                    result = future.result()
+                    self.store.put_check(path, st, result)
+                    summary["checked"] += 1
+                    if result["status"] in BROKEN_STATUSES:
+                        summary["broken"].append((path, result))
+                    elif result["status"] != STATUS_OK:
+                        summary["warnings"].append((path, result))
+                except Exception as e:
+                    print(f"Integrity check error: {path} - {e}")
+                    summary["failed"] += 1
+                done += 1
+                if progress:
+                    progress(done, len(todo))
+                if done % 50 == 0:
+                    self.store.save()
+
+        self.store.save()
+        summary["elapsed"] = time.perf_counter() - start
+        return summary
+
+    def start(self, paths, progress=None, finished=None):
+        """后台线程中检查，完成后调用 finished(summary)"""
+        if self.running:
+            return False
+        self.running = True
+
+        def worker():
+            try:
+                summary = self.scan(paths, progress)
+            except Exception as e:
+                summary = {"error": str(e)}
+            finally:
+                self.running = False
+            if finished:
+                finished(summary)
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+桌面歌词卡拉OK渲染
+底层Canvas显示整行文字（未唱颜色），上面叠一个只有"已唱宽度"那么宽的子Canvas显示同一行（高亮颜色），
+进度推进时只调整子Canvas的宽度，Tk只重绘被裁剪区域变化的部分。
+每行文字宽度用字体度量一次算好并缓存，逐字时间来自增强LRC，字与字之间按时间线性插值。
+"""
+
+from bisect import bisect_right
+from tkinter import Canvas
+from tkinter import font as tkfont
+
+
+class KaraokeRenderer:
+    """卡拉OK歌词：底层文字 + 按进度裁剪的高亮层"""
+
+    def __init__(self, parent, family="Microsoft YaHei UI", sizes=(20, 18, 16, 14),
+                 bg="#1a1a1a", fg="white", highlight="#ec4141", padding=20):
+        self.family = family
+        self.sizes = sizes
+        self.padding = padding
+
+        self.canvas = Canvas(parent, bg=bg, highlightthickness=0)
+        self.overlay = Canvas(self.canvas, bg=bg, highlightthickness=0)
+        self.base_item = self.canvas.create_text(0, 0, text="", fill=fg, anchor="w")
+        self.top_item = self.overlay.create_text(0, 0, text="", fill=highlight, anchor="w")
+        self.canvas.bind('<Configure>', self._on_resize)
+
+        self._fonts = {}    # 字号 -> Font
+        self._widths = {}   # (字号, 文本) -> 像素宽度
+
+        self.line_key = None
+        self.text = ""
+        self.words = []
+        self.start = None
+        self.end = None
+        self.times = []     # 每段开始时间
+        self.ends = []      # 每段结束时间
+        self.edges = [0]    # 每段的起止X（相对行首）
+        self.x0 = 0
+        self.sweep_px = 0
+        self.last_pos = 0
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def bind(self, sequence, func):
+        """事件同时绑定到底层和高亮层"""
+        self.canvas.bind(sequence, func)
+        self.overlay.bind(sequence, func)
+
+    # ------------------------------------------------------------------
+    # 字体度量
+    # ------------------------------------------------------------------
+
+    def _font(self, size):
+        font = self._fonts.get(size)
+        if font is None:
+            font = tkfont.Font(family=self.family, size=size, weight="bold")
+            self._fonts[size] = font
+        return font
+
+    def measure(self, text, size):
+        """文字像素宽度（缓存）"""
+        key = (size, text)
+        width = self._widths.get(key)
+        if width is None:
+            width = self._font(size).measure(text)
+            self._widths[key] = width
+        return width
+
+    def _choose_size(self, text, width):
+        """选择能放下整行的最大字号"""
+        for size in self.sizes:
+            if self.measure(text, size) <= width - 2 * self.padding:
+                return size
+        return self.sizes[-1]
+
+    # ------------------------------------------------------------------
+    # 内容
+    # ------------------------------------------------------------------
+
+    def set_text(self, text):
+        """显示提示文字（无进度）"""
+        self.set_line(text, [], None, None)
+
+    def set_line(self, text, words, start, end):
+        """切换到一行歌词；words 为 [(毫秒, 文字), ...]，没有逐字时间时整行按 start~end 推进"""
+        key = (text, start)
+        if key == self.line_key:
+            return
+        self.line_key = key
+        self.text = text
+        self.words = words
+        self.start = start
+        self.end = end
+        self._layout()
+
+    def _layout(self):
+        """按当前窗口大小排版并计算每段的X范围"""
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        if width <= 1:
+            return
+
+        size = self._choose_size(self.text, width)
+        font = self._font(size)
+        total = self.measure(self.text, size)
+        self.x0 = max(self.padding, (width - total) // 2)
+        y = height // 2
+
+        self.canvas.itemconfig(self.base_item, text=self.text, font=font)
+        self.canvas.coords(self.base_item, self.x0, y)
+        self.overlay.itemconfig(self.top_item, text=self.text, font=font)
+        self.overlay.coords(self.top_item, 0, y)
+
+        if self.start is None:
+            self.times, self.ends, self.edges = [], [], [0]
+        elif self.words:
+            self.times = [t for t, _ in self.words]
+            self.ends = self.times[1:] + [self.end]
+            self.edges = [0]
+            prefix = ""
+            for _, word in self.words:
+                prefix += word
+                self.edges.append(self.measure(prefix.lstrip(), size))
+        else:
+            self.times = [self.start]
+            self.ends = [self.end]
+            self.edges = [0, total]
+
+        self.sweep_px = -1
+        self._apply_sweep(self.sweep_at(self.last_pos))
+
+    def _on_resize(self, event):
+        if self.line_key is not None:
+            self._layout()
+
+    # ------------------------------------------------------------------
+    # 进度
+    # ------------------------------------------------------------------
+
+    def _sweep_exact(self, pos):
+        """(已唱宽度, 所在段)；还没开始时段为-1"""
+        k = bisect_right(self.times, pos) - 1
+        if k < 0:
+            return 0.0, -1
+        t0, t1 = self.times[k], self.ends[k]
+        x0, x1 = self.edges[k], self.edges[k + 1]
+        if t1 <= t0 or pos >= t1:
+            return float(x1), k
+        return x0 + (x1 - x0) * (pos - t0) / (t1 - t0), k
+
+    def sweep_at(self, pos):
+        """播放位置对应的已唱宽度（像素）"""
+        if not self.times:
+            return 0
+        return int(self._sweep_exact(pos)[0])
+
+    def update(self, pos):
+        """按播放位置推进高亮，宽度没变时不操作控件"""
+        self.last_pos = pos
+        self._apply_sweep(self.sweep_at(pos))
+
+    def _apply_sweep(self, px):
+        if px == self.sweep_px:
+            return
+        self.sweep_px = px
+        if px <= 0:
+            self.overlay.place_forget()
+        else:
+            self.overlay.place(x=self.x0, y=0, width=px, height=self.canvas.winfo_height())
+
+    def next_change(self, pos):
+        """距离高亮宽度再增加1像素的毫秒数，本行已唱完返回None"""
+        if not self.times:
+            return None
+
+        exact, k = self._sweep_exact(pos)
+        if k < 0:
+            return self.times[0] - pos
+
+        t0, t1 = self.times[k], self.ends[k]
+        x0, x1 = self.edges[k], self.edges[k + 1]
+        if pos < t1 and t1 > t0 and x1 > x0:
+            speed = (x1 - x0) / (t1 - t0)
+            return max(1, int((int(exact) + 1 - exact) / speed) + 1)
+
+        if k + 1 < len(self.times):
+            return max(1, self.times[k + 1] - pos)
+        return None
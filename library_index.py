@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+曲库索引（SQLite）
+保存每首歌的 大小、修改时间、时长、比特率、标签、是否有歌词 以及响度分析结果。
+刷新时用 os.scandir 一次遍历目录，按 大小+修改时间 比较，只重新解析新增或变化的MP3；
+列表、播放、复制、响度扫描等都从索引读取，不再逐个访问文件系统。
+
+曲库可以有多个文件夹（root），每首歌按 (文件夹编号, 文件名) 区分。
+歌曲ID：下载文件夹中的歌曲就是文件名（下载、边下边播、上次播放记录都按文件名），
+其他文件夹为 "文件夹编号/文件名"（文件名中不会有 /），文件夹编号保存在索引中，不随配置顺序变化。
+多个文件夹由 LibraryScanner 并行扫描，同一设备上的文件夹共用一个线程。
+"""
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from playback import mp3_stream_info
+
+try:
+    from mutagen.mp3 import MP3
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+# 表结构版本（版本1的索引直接重建，索引只是缓存；之后的版本只增加列）
+SCHEMA_VERSION = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    root        INTEGER NOT NULL,
+    name        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime       INTEGER NOT NULL,
+    duration_ms INTEGER,
+    bitrate     INTEGER,
+    title       TEXT,
+    artist      TEXT,
+    album       TEXT,
+    has_lrc     INTEGER NOT NULL DEFAULT 0,
+    lrc_mtime   INTEGER,
+    loudness    REAL,
+    peak        REAL,
+    gain        REAL,
+    gain_size   INTEGER,
+    gain_mtime  INTEGER,
+    fingerprint BLOB,
+    fp_size     INTEGER,
+    fp_mtime    INTEGER,
+    check_status TEXT,
+    check_detail TEXT,
+    check_size  INTEGER,
+    check_mtime INTEGER,
+    requeue_count INTEGER,
+    PRIMARY KEY (root, name)
+);
+"""
+
+UPSERT_SQL = (
+    "INSERT INTO tracks (root, name, size, mtime, duration_ms, bitrate, title, artist, album, has_lrc, lrc_mtime) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(root, name) DO UPDATE SET size=excluded.size, mtime=excluded.mtime, "
+    "duration_ms=excluded.duration_ms, bitrate=excluded.bitrate, title=excluded.title, "
+    "artist=excluded.artist, album=excluded.album, has_lrc=excluded.has_lrc, lrc_mtime=excluded.lrc_mtime"
+)
+
+# 各版本增加的列
+MIGRATIONS = {
+    3: ("fingerprint BLOB", "fp_size INTEGER", "fp_mtime INTEGER"),
+    4: ("check_status TEXT", "check_detail TEXT", "check_size INTEGER", "check_mtime INTEGER"),
+    5: ("requeue_count INTEGER",),
+}
+
+# 完整性检查结果有效且为不完整/损坏（文件变化后需重新检查；时长和歌词对不上的不算）
+BROKEN_SQL = "(check_status IN ('truncated', 'corrupt') AND check_size = size AND check_mtime = mtime)"
+
+# 列表显示需要的列
+TRACK_COLUMNS = ("root", "name", "size", "mtime", "duration_ms", "bitrate", "title", "artist", "album", "has_lrc")
+
+# 刷新进度的报告间隔（解析的文件数）
+PROGRESS_STEP = 50
+
+
+def probe_mp3(path, size):
+    """读取时长（毫秒）、比特率（kbps）和标签"""
+    info = {"duration_ms": None, "bitrate": None, "title": None, "artist": None, "album": None}
+
+    if MUTAGEN_AVAILABLE:
+        try:
+            audio = MP3(path)
+            info["duration_ms"] = int(audio.info.length * 1000)
+            info["bitrate"] = int(audio.info.bitrate // 1000) or None
+            tags = audio.tags
+            if tags is not None:
+                for key, frame in (("title", "TIT2"), ("artist", "TPE1"), ("album", "TALB")):
+                    if frame in tags:
+                        info[key] = str(tags[frame].text[0])
+            return info
+        except Exception:
+            pass
+
+    # 没有mutagen时按首帧比特率估算时长
+    stream = mp3_stream_info(path)
+    if stream and stream[1]:
+        offset, kbps = stream
+        info["bitrate"] = kbps
+        info["duration_ms"] = int((size - offset) * 8 / kbps)
+    return info
+
+
+def _upsert_params(root, name, st, info, has_lrc, lrc_mtime):
+    return (root, name, st.st_size, st.st_mtime_ns, info["duration_ms"], info["bitrate"],
+            info["title"], info["artist"], info["album"], has_lrc, lrc_mtime)
+
+
+def normalize_root(path):
+    """文件夹路径的统一形式（绝对路径，Windows下不区分大小写）"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def device_of(path):
+    """文件夹所在设备：Windows用盘符（不访问磁盘），其他系统用st_dev，无法访问时按路径区分"""
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive:
+        return drive.upper()
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return path
+
+
+class LibraryIndex:
+    """曲库索引（线程安全，单个连接 + 锁）"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._root_ids = {}     # 统一形式的路径 -> 编号
+        self._root_paths = {}   # 编号 -> 路径
+        self.primary_root = None
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError:
+                pass
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 2:
+                self._conn.execute("DROP TABLE IF EXISTS tracks")
+            elif version < SCHEMA_VERSION:
+                for added in range(version + 1, SCHEMA_VERSION + 1):
+                    for column in MIGRATIONS.get(added, ()):
+                        self._conn.execute(f"ALTER TABLE tracks ADD COLUMN {column}")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+            for row in self._conn.execute("SELECT id, path FROM roots"):
+                self._root_ids[normalize_root(row["path"])] = row["id"]
+                self._root_paths[row["id"]] = row["path"]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 文件夹与歌曲ID
+    # ------------------------------------------------------------------
+
+    def root_id(self, path, create=True):
+        """文件夹编号（不存在时创建），create=False且不存在时返回None"""
+        key = normalize_root(path)
+        with self._lock:
+            root = self._root_ids.get(key)
+            if root is None and create:
+                cursor = self._conn.execute("INSERT INTO roots (path) VALUES (?)", (os.path.abspath(path),))
+                self._conn.commit()
+                root = cursor.lastrowid
+                self._root_ids[key] = root
+                self._root_paths[root] = os.path.abspath(path)
+            return root
+
+    def root_path(self, root):
+        return self._root_paths.get(root)
+
+    def set_primary(self, path):
+        """设置下载文件夹（其中歌曲的ID就是文件名）"""
+        self.primary_root = self.root_id(path)
+
+    def remove_root(self, path):
+        """从曲库移除文件夹（不删除文件）"""
+        root = self.root_id(path, create=False)
+        if root is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM tracks WHERE root = ?", (root,))
+            self._conn.execute("DELETE FROM roots WHERE id = ?", (root,))
+            self._conn.commit()
+            self._root_ids.pop(normalize_root(path), None)
+            self._root_paths.pop(root, None)
+
+    def track_id(self, root, name):
+        """歌曲ID"""
+        if root == self.primary_root:
+            return name
+        return f"{root}/{name}"
+
+    def parse_id(self, track_id):
+        """歌曲ID -> (文件夹编号, 文件名)"""
+        prefix, sep, name = track_id.partition("/")
+        if sep and prefix.isdigit():
+            return int(prefix), name
+        return self.primary_root, track_id
+
+    def path_of(self, track_id, ext=".mp3"):
+        """歌曲文件路径，文件夹未知时返回None"""
+        root, name = self.parse_id(track_id)
+        directory = self._root_paths.get(root)
+        if directory is None:
+            return None
+        return os.path.join(directory, name + ext)
+
+    def _locate(self, path):
+        """文件路径 -> (文件夹编号, 文件名)，文件夹不在曲库中时编号为None"""
+        return self.root_id(os.path.dirname(path), create=False), os.path.basename(path)[:-4]
+
+    # ------------------------------------------------------------------
+    # 刷新
+    # ------------------------------------------------------------------
+
+    def refresh(self, directory, progress=None):
+        """增量刷新一个文件夹，返回 {"added", "updated", "removed", "unchanged", "lyrics"}，不可访问时返回None
+
+        progress(已解析, 需解析) 在解析变化的文件时定期调用。
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "lyrics": 0}
+
+        mp3_entries = {}
+        lrc_mtimes = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.endswith('.mp3') and entry.is_file():
+                        mp3_entries[name[:-4]] = entry.stat()
+                    elif name.endswith('.lrc') and entry.is_file():
+                        lrc_mtimes[name[:-4]] = entry.stat().st_mtime_ns
+        except OSError:
+            # 文件夹不可访问（如U盘拔出）时保留原有记录
+            return None
+
+        root = self.root_id(directory)
+        with self._lock:
+            known = {row["name"]: row for row in self._conn.execute(
+                "SELECT name, size, mtime, has_lrc, lrc_mtime FROM tracks WHERE root = ?", (root,))}
+
+        # 解析新增/变化的文件（不持有锁，播放等读取不被阻塞）
+        todo = [name for name, st in mp3_entries.items()
+                if name not in known or known[name]["size"] != st.st_size
+                or known[name]["mtime"] != st.st_mtime_ns]
+        probed = {}
+        for done, name in enumerate(todo, 1):
+            probed[name] = probe_mp3(os.path.join(directory, f"{name}.mp3"), mp3_entries[name].st_size)
+            if progress and (done % PROGRESS_STEP == 0 or done == len(todo)):
+                progress(done, len(todo))
+
+        with self._lock:
+            conn = self._conn
+            for name, st in mp3_entries.items():
+                row = known.get(name)
+                lrc_mtime = lrc_mtimes.get(name)
+                has_lrc = 1 if lrc_mtime is not None else 0
+
+                if name in probed:
+                    conn.execute(UPSERT_SQL, _upsert_params(root, name, st, probed[name], has_lrc, lrc_mtime))
+                    stats["updated" if row is not None else "added"] += 1
+                    continue
+
+                stats["unchanged"] += 1
+                if row["has_lrc"] != has_lrc or row["lrc_mtime"] != lrc_mtime:
+                    conn.execute("UPDATE tracks SET has_lrc = ?, lrc_mtime = ? WHERE root = ? AND name = ?",
+                                 (has_lrc, lrc_mtime, root, name))
+                    stats["lyrics"] += 1
+
+            removed = [name for name in known if name not in mp3_entries]
+            conn.executemany("DELETE FROM tracks WHERE root = ? AND name = ?", [(root, name) for name in removed])
+            stats["removed"] = len(removed)
+            conn.commit()
+
+        return stats
+
+    def update_files(self, directory, names):
+        """只刷新文件夹中指定的歌曲（不带扩展名），用于文件监听；返回统计同 refresh"""
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "lyrics": 0}
+        root = self.root_id(directory)
+        for name in set(names):
+            mp3_path = os.path.join(directory, f"{name}.mp3")
+            try:
+                st = os.stat(mp3_path)
+            except OSError:
+                st = None
+            try:
+                lrc_mtime = os.stat(os.path.join(directory, f"{name}.lrc")).st_mtime_ns
+            except OSError:
+                lrc_mtime = None
+            has_lrc = 1 if lrc_mtime is not None else 0
+
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT size, mtime, has_lrc, lrc_mtime FROM tracks WHERE root = ? AND name = ?",
+                    (root, name)).fetchone()
+            if st is None:
+                if row is not None:
+                    with self._lock:
+                        self._conn.execute("DELETE FROM tracks WHERE root = ? AND name = ?", (root, name))
+                    stats["removed"] += 1
+                continue
+
+            if row is not None and row["size"] == st.st_size and row["mtime"] == st.st_mtime_ns:
+                stats["unchanged"] += 1
+                if row["has_lrc"] != has_lrc or row["lrc_mtime"] != lrc_mtime:
+                    with self._lock:
+                        self._conn.execute(
+                            "UPDATE tracks SET has_lrc = ?, lrc_mtime = ? WHERE root = ? AND name = ?",
+                            (has_lrc, lrc_mtime, root, name))
+                    stats["lyrics"] += 1
+                continue
+
+            info = probe_mp3(mp3_path, st.st_size)
+            with self._lock:
+                self._conn.execute(UPSERT_SQL, _upsert_params(root, name, st, info, has_lrc, lrc_mtime))
+            stats["updated" if row is not None else "added"] += 1
+
+        with self._lock:
+            self._conn.commit()
+        return stats
+
+    def rename(self, directory, old_name, new_name):
+        """歌曲改名：保留已解析的信息和响度结果，返回是否改动"""
+        root = self.root_id(directory)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM tracks WHERE root = ? AND name = ?",
+                                  (root, new_name)).fetchone():
+                return False
+            cursor = self._conn.execute("UPDATE tracks SET name = ? WHERE root = ? AND name = ?",
+                                        (new_name, root, old_name))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def tracks(self):
+        """全部歌曲（按名称排序），每项额外带歌曲ID(id)和MP3路径(path)"""
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(
+                f"SELECT {', '.join(TRACK_COLUMNS)} FROM tracks ORDER BY name COLLATE NOCASE, root")]
+        for row in rows:
+            row["id"] = self.track_id(row["root"], row["name"])
+            row["path"] = os.path.join(self._root_paths.get(row["root"], ""), row["name"] + ".mp3")
+        return rows
+
+    def rows(self):
+        """全部歌曲的元组（按名称排序），字段顺序同 TrackStore.from_rows"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT root, name, size, mtime, duration_ms, bitrate, has_lrc, artist, album, "
+                f"IFNULL({BROKEN_SQL}, 0) FROM tracks ORDER BY name COLLATE NOCASE, root")
+            cursor.row_factory = None
+            rows = cursor.fetchall()
+        track_id = self.track_id
+        return [(track_id(row[0], row[1]),) + row[1:9] + (row[0], row[9]) for row in rows]
+
+    def paths(self):
+        """全部歌曲的MP3路径"""
+        return [track["path"] for track in self.tracks()]
+
+    def get(self, track_id):
+        """单首歌曲，不存在返回None"""
+        root, name = self.parse_id(track_id)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(TRACK_COLUMNS)} FROM tracks WHERE root = ? AND name = ?",
+                (root, name)).fetchone()
+        return dict(row) if row else None
+
+    def duration(self, track_id):
+        """时长（毫秒），未知返回None"""
+        root, name = self.parse_id(track_id)
+        with self._lock:
+            row = self._conn.execute("SELECT duration_ms FROM tracks WHERE root = ? AND name = ?",
+                                     (root, name)).fetchone()
+        return row[0] if row else None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # 响度（供 LoudnessScanner 使用）
+    # ------------------------------------------------------------------
+
+    def is_current(self, path, st):
+        """响度结果是否对应文件当前的 大小+修改时间"""
+        root, name = self._locate(path)
+        with self._lock:
+            row = self._conn.execute("SELECT gain_size, gain_mtime FROM tracks WHERE root = ? AND name = ?",
+                                     (root, name)).fetchone()
+        return bool(row) and row[0] == st.st_size and row[1] == st.st_mtime_ns
+
+    def put(self, path, st, result):
+        """保存响度结果（歌曲尚未入索引时忽略，下次刷新后再扫描）"""
+        root, name = self._locate(path)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tracks SET loudness = ?, peak = ?, gain = ?, gain_size = ?, gain_mtime = ? "
+                "WHERE root = ? AND name = ?",
+                (result.get("loudness"), result.get("peak"), result.get("gain"),
+                 st.st_size, st.st_mtime_ns, root, name)
+            )
+
+    def save(self):
+        with self._lock:
+            self._conn.commit()
+
+    def gain_for(self, path):
+        """已分析的增益（dB），未分析或文件已变化返回None"""
+        root, name = self._locate(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT gain, gain_size, gain_mtime, size, mtime FROM tracks WHERE root = ? AND name = ?",
+                (root, name)).fetchone()
+        if not row or row["gain"] is None:
+            return None
+        # 索引中的大小/修改时间在刷新时更新，和分析时的一致才有效
+        if row["gain_size"] != row["size"] or row["gain_mtime"] != row["mtime"]:
+            return None
+        return row["gain"]
+
+    # ------------------------------------------------------------------
+    # 声学指纹（供 fingerprint.FingerprintScanner 使用）
+    # ------------------------------------------------------------------
+
+    def fingerprint_current(self, path, st):
+        """指纹是否对应文件当前的 大小+修改时间"""
+        root, name = self._locate(path)
+        with self._lock:
+            row = self._conn.execute("SELECT fp_size, fp_mtime FROM tracks WHERE root = ? AND name = ?",
+                                     (root, name)).fetchone()
+        return bool(row) and row[0] == st.st_size and row[1] == st.st_mtime_ns
+
+    def put_fingerprint(self, path, st, fingerprint):
+        """保存指纹（歌曲尚未入索引时忽略）"""
+        root, name = self._locate(path)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tracks SET fingerprint = ?, fp_size = ?, fp_mtime = ? WHERE root = ? AND name = ?",
+                (sqlite3.Binary(fingerprint), st.st_size, st.st_mtime_ns, root, name)
+            )
+
+    def fingerprints(self):
+        """{歌曲ID: 指纹bytes}，只包括和索引中 大小+修改时间 一致的指纹"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT root, name, fingerprint FROM tracks "
+                "WHERE fingerprint IS NOT NULL AND fp_size = size AND fp_mtime = mtime")
+            cursor.row_factory = None
+            rows = cursor.fetchall()
+        return {self.track_id(root, name): bytes(data) for root, name, data in rows}
+
+    # ------------------------------------------------------------------
+    # 完整性检查（供 integrity.IntegrityScanner 使用）
+    # ------------------------------------------------------------------
+
+    def check_current(self, path, st):
+        """完整性检查结果是否对应文件当前的 大小+修改时间"""
+        root, name = self._locate(path)
+        with self._lock:
+            row = self._conn.execute("SELECT check_size, check_mtime FROM tracks WHERE root = ? AND name = ?",
+                                     (root, name)).fetchone()
+        return bool(row) and row[0] == st.st_size and row[1] == st.st_mtime_ns
+
+    def put_check(self, path, st, result):
+        """保存检查结果；逐帧统计的时长比标签/估算的准确，同时更新时长"""
+        root, name = self._locate(path)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tracks SET check_status = ?, check_detail = ?, check_size = ?, check_mtime = ?, "
+                "duration_ms = IFNULL(?, duration_ms) WHERE root = ? AND name = ?",
+                (result["status"], result.get("detail"), st.st_size, st.st_mtime_ns,
+                 result.get("duration_ms"), root, name)
+            )
+
+    def is_broken(self, track_id):
+        """歌曲是否已检查出不完整或损坏（文件之后变化过的不算）"""
+        root, name = self.parse_id(track_id)
+        with self._lock:
+            row = self._conn.execute(f"SELECT {BROKEN_SQL} FROM tracks WHERE root = ? AND name = ?",
+                                     (root, name)).fetchone()
+        return bool(row and row[0])
+
+    def add_requeue(self, path):
+        """记录一次因检查结果重新下载，返回之前已重新下载的次数"""
+        root, name = self._locate(path)
+        with self._lock:
+            row = self._conn.execute("SELECT requeue_count FROM tracks WHERE root = ? AND name = ?",
+                                     (root, name)).fetchone()
+            count = (row[0] or 0) if row else 0
+            self._conn.execute("UPDATE tracks SET requeue_count = ? WHERE root = ? AND name = ?",
+                               (count + 1, root, name))
+            self._conn.commit()
+        return count
+
+
+class LibraryScanner:
+    """多个曲库文件夹并行刷新：按设备分组，每个设备一个线程，慢的或离线的设备不影响其他设备"""
+
+    def __init__(self, index):
+        self.index = index
+        self.running = False
+
+    def scan(self, paths, progress=None):
+        """刷新所有文件夹，返回 {路径: 统计或None(不可访问)}
+
+        progress(路径, 状态, 数据) 在工作线程中调用：
+        状态为 "progress"（数据为 (已解析, 需解析)）、"done"（数据为统计）或 "offline"。
+        """
+        groups = {}
+        for path in paths:
+            groups.setdefault(device_of(path), []).append(path)
+
+        results = {}
+
+        def scan_device(device_paths):
+            for path in device_paths:
+                def report(done, total, path=path):
+                    if progress:
+                        progress(path, "progress", (done, total))
+
+                stats = self.index.refresh(path, report) if os.path.isdir(path) else None
+                results[path] = stats
+                if progress:
+                    progress(path, "done" if stats is not None else "offline", stats)
+
+        if groups:
+            with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+                for future in [pool.submit(scan_device, group) for group in groups.values()]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Library scan error: {e}")
+        return results
+
+    def start(self, paths, progress=None, finished=None):
+        """后台线程中扫描，完成后调用 finished(results)"""
+        if self.running:
+            return False
+        self.running = True
+
+        def worker():
+            try:
+                results = self.scan(paths, progress)
+            finally:
+                self.running = False
+            if finished:
+                finished(results)
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表视图模型
+记住Treeview中每一行当前显示的 值+标签（行ID为歌曲名），
+刷新时和期望的行比较，只对新增/删除/变化/移动的行操作控件，没变化的行不碰。
+虚拟列表在此基础上只把可见的几行放进Treeview。
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+class _Subset:
+    """序列中按下标挑出的部分（只读，不复制元素）"""
+
+    def __init__(self, seq, picked):
+        self.seq = seq
+        self.picked = picked
+
+    def __len__(self):
+        return len(self.picked)
+
+    def __getitem__(self, index):
+        return self.seq[self.picked[index]]
+
+
+class TreeRows:
+    """Treeview 行的差量更新"""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.order = []   # 当前显示的行ID（按顺序）
+        self.rows = {}    # 行ID -> (values, tags)
+
+    def __contains__(self, iid):
+        return iid in self.rows
+
+    def sync(self, rows):
+        """显示 rows = [(行ID, values, tags), ...]，返回实际改动的行数"""
+        tree = self.tree
+        wanted = {iid: (tuple(values), tuple(tags)) for iid, values, tags in rows}
+        changed = 0
+
+        for iid in self.order:
+            if iid not in wanted:
+                tree.delete(iid)
+                del self.rows[iid]
+                changed += 1
+
+        order = [iid for iid, _, _ in rows]
+        current = [iid for iid in self.order if iid in wanted]
+        reorder = current != [iid for iid in order if iid in self.rows]
+
+        for index, iid in enumerate(order):
+            row = wanted[iid]
+            old = self.rows.get(iid)
+            if old is None:
+                tree.insert("", index, iid=iid, values=row[0], tags=row[1])
+                changed += 1
+            else:
+                if old != row:
+                    tree.item(iid, values=row[0], tags=row[1])
+                    changed += 1
+                if reorder:
+                    tree.move(iid, "", index)
+            self.rows[iid] = row
+
+        self.order = order
+        return changed
+
+    def update(self, iid, values, tags=()):
+        """更新单行（不在当前显示中时忽略），返回是否改动"""
+        old = self.rows.get(iid)
+        row = (tuple(values), tuple(tags))
+        if old is None or old == row:
+            return False
+        self.tree.item(iid, values=row[0], tags=row[1])
+        self.rows[iid] = row
+        return True
+
+    def clear(self):
+        for iid in self.order:
+            self.tree.delete(iid)
+        self.order = []
+        self.rows = {}
+
+
+class VirtualList:
+    """虚拟列表：数据全部在内存中，Treeview里只放当前可见的那几行
+
+    滚动条和鼠标滚轮改变的是"第一行显示第几首"，每次只按差量替换进出可见区域的行，
+    所以曲库有多大，滚动和排序后刷新的开销都只和可见行数有关。
+    """
+
+    def __init__(self, tree, scrollbar, row_builder, item_id=None, sorter=None,
+                 row_height=25, header_height=28):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_builder = row_builder    # item -> (行ID, values, tags)
+        self.item_id = item_id or (lambda item: item)
+        # sorter(列, items或None) -> (排好序的items, 排序键序列)；None时按 sort_keys 排序
+        self.sorter = sorter
+        self.row_height = row_height
+        self.header_height = header_height
+        self.rows = TreeRows(tree)
+
+        self.items = []
+        self._by_id = None      # 行ID -> item（过滤时按需建立）
+        self.sort_keys = {}     # 列 -> item -> 排序键
+        self._sorted = {}       # 列 -> (排好序的items, 对应的排序键)
+        self.filter = None      # 只显示这些行ID（None为全部）
+        self._filtered = None   # (列, 过滤后的items, 对应的排序键)
+        self._positions = None  # (列, 行ID -> 当前视图中的位置)，按非当前排序列查找时使用
+        self.sort_column = None
+        self.sort_reverse = False
+        self.first = 0
+        self.visible_count = 15
+        self.visible = {}       # 行ID -> item
+
+        scrollbar.configure(command=self.on_scrollbar)
+        tree.bind('<Configure>', self._on_resize)
+        tree.bind('<MouseWheel>', self._on_wheel)
+        tree.bind('<Button-4>', lambda e: self.scroll(-3) or "break")
+        tree.bind('<Button-5>', lambda e: self.scroll(3) or "break")
+        tree.bind('<Prior>', lambda e: self.scroll(-self.visible_count) or "break")
+        tree.bind('<Next>', lambda e: self.scroll(self.visible_count) or "break")
+        tree.bind('<Home>', lambda e: self.scroll_to(0) or "break")
+        tree.bind('<End>', lambda e: self.scroll_to(len(self)) or "break")
+
+    def __len__(self):
+        return len(self._view()[0])
+
+    # ------------------------------------------------------------------
+    # 数据
+    # ------------------------------------------------------------------
+
+    def set_items(self, items):
+        """更换数据（保持排序方式和滚动位置）"""
+        self.items = list(items)
+        self._by_id = None
+        self._sorted = {}
+        self._filtered = None
+        self._positions = None
+        self.render()
+
+    def set_filter(self, ids):
+        """只显示行ID在ids中的项（None为全部），回到顶部"""
+        self.filter = ids
+        self._filtered = None
+        self._positions = None
+        self.first = 0
+        self.render()
+
+    def _sort(self, items=None, column=None):
+        column = column or self.sort_column
+        if self.sorter is not None:
+            return self.sorter(column, items)
+        if items is None:
+            items = self.items
+        key = self.sort_keys[column]
+        keyed = sorted(((key(item), i) for i, item in enumerate(items)))
+        return [items[i] for _, i in keyed], [k for k, _ in keyed]
+
+    def _full_view(self):
+        """全部数据的 (items, 排序键)；同一列只排序一次，倒序时反向取"""
+        if self.sort_column is None:
+            return self.items, None
+        return self._column_view(self.sort_column)
+
+    def _column_view(self, column):
+        """全部数据按某列排序的 (items, 排序键)，缓存到数据变化为止"""
+        view = self._sorted.get(column)
+        if view is None:
+            view = self._sort(column=column)
+            self._sorted[column] = view
+        return view
+
+    def _view_positions(self):
+        """行ID -> 当前视图（正序）中的位置，缓存到数据、过滤或排序列变化为止"""
+        if self._positions is None or self._positions[0] != self.sort_column:
+            items, item_id = self._view()[0], self.item_id
+            self._positions = (self.sort_column, {item_id(items[i]): i for i in range(len(items))})
+        return self._positions[1]
+
+    def _view(self):
+        """当前过滤和排序下的 (items, 排序键)"""
+        if self.filter is None:
+            return self._full_view()
+        if self._filtered is not None and self._filtered[0] == self.sort_column:
+            return self._filtered[1:]
+
+        ids, item_id = self.filter, self.item_id
+        if self.sort_column is not None and len(ids) * 8 < len(self.items):
+            # 结果少：直接取出结果排序，不扫描全部数据
+            if self._by_id is None:
+                self._by_id = {item_id(item): item for item in self.items}
+            by_id = self._by_id
+            view = self._sort([by_id[i] for i in ids if i in by_id])
+        else:
+            items, keys = self._full_view()
+            picked = [i for i, item in enumerate(items) if item_id(item) in ids]
+            view = (_Subset(items, picked), _Subset(keys, picked) if keys is not None else None)
+        self._filtered = (self.sort_column,) + view
+        return view
+
+    def item_at(self, index):
+        items = self._view()[0]
+        if self.sort_reverse:
+            return items[len(items) - 1 - index]
+        return items[index]
+
+    def sort(self, column, reverse=None):
+        """按列排序；reverse为None时再次点击同一列切换升降序"""
+        if reverse is None:
+            reverse = not self.sort_reverse if column == self.sort_column else False
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self.render()
+
+    def find(self, key, prefix):
+        """第一个排序键以prefix开头的位置，没有返回None
+
+        按该列排序时在当前视图中二分查找；否则在按该列排序的全部数据中二分找出匹配的一段，
+        再按 行ID -> 位置 的索引取其中最靠前的一行。
+        """
+        if self.sort_column == key:
+            items, keys = self._view()
+            if self.sort_reverse:
+                # 倒序时找最后一个不大于前缀上界的位置
+                upper = bisect_right(keys, prefix + "\uffff")
+                if upper > 0 and keys[upper - 1].startswith(prefix):
+                    return len(items) - upper
+                return None
+            index = bisect_left(keys, prefix)
+            if index < len(keys) and keys[index].startswith(prefix):
+                return index
+            return None
+
+        items, keys = self._column_view(key)
+        lower = bisect_left(keys, prefix)
+        upper = bisect_right(keys, prefix + "\uffff", lower)
+        if lower >= upper:
+            return None
+        positions, item_id = self._view_positions(), self.item_id
+        found = [positions[i] for i in (item_id(items[j]) for j in range(lower, upper)) if i in positions]
+        if not found:
+            return None
+        if self.sort_reverse:
+            return len(positions) - 1 - max(found)
+        return min(found)
+
+    # ------------------------------------------------------------------
+    # 滚动
+    # ------------------------------------------------------------------
+
+    def _max_first(self):
+        return max(0, len(self) - self.visible_count)
+
+    def scroll_to(self, first):
+        first = max(0, min(int(first), self._max_first()))
+        if first != self.first:
+            self.first = first
+            self.render()
+        else:
+            self._update_scrollbar()
+
+    def scroll(self, rows):
+        self.scroll_to(self.first + rows)
+
+    def show_index(self, index):
+        """滚动到能看到第index行"""
+        if index < self.first:
+            self.scroll_to(index)
+        elif index >= self.first + self.visible_count:
+            self.scroll_to(index - self.visible_count + 1)
+
+    def on_scrollbar(self, *args):
+        """滚动条回调：("moveto", 比例) 或 ("scroll", 数量, "units"/"pages")"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * len(self)))
+        elif args[0] == "scroll":
+            count = int(args[1])
+            if len(args) > 2 and args[2] == "pages":
+                count *= self.visible_count
+            self.scroll(count)
+
+    def _on_wheel(self, event):
+        steps = -int(event.delta / 120) if abs(event.delta) >= 120 else (-1 if event.delta > 0 else 1)
+        self.scroll(steps * 3)
+        return "break"
+
+    def _on_resize(self, event):
+        count = max(1, (event.height - self.header_height) // self.row_height)
+        if count != self.visible_count:
+            self.visible_count = count
+            self.first = min(self.first, self._max_first())
+            self.render()
+
+    def _update_scrollbar(self):
+        total = len(self)
+        if total <= self.visible_count:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.first / total, (self.first + self.visible_count) / total)
+
+    # ------------------------------------------------------------------
+    # 显示
+    # ------------------------------------------------------------------
+
+    def render(self):
+        """显示当前可见的行"""
+        self.first = max(0, min(self.first, self._max_first()))
+        end = min(len(self), self.first + self.visible_count)
+        rows = []
+        self.visible = {}
+        for index in range(self.first, end):
+            item = self.item_at(index)
+            row = self.row_builder(item)
+            self.visible[row[0]] = item
+            rows.append(row)
+        self.rows.sync(rows)
+        self._update_scrollbar()
+
+    def refresh_rows(self, iids):
+        """只重新生成指定的可见行"""
+        for iid in iids:
+            item = self.visible.get(iid)
+            if item is not None:
+                _, values, tags = self.row_builder(item)
+                self.rows.update(iid, values, tags)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响度分析与音量均衡
+按 ITU-R BS.1770 / EBU R128 的门限方法计算整曲响度（400ms块、75%重叠、-70 LUFS绝对门限、-10 LU相对门限），
+以 ReplayGain 2.0 的 -18 LUFS 为目标得到每首歌的增益。
+曲库扫描在进程池中进行，只分析新增或修改过的文件；播放时直接查结果，不做任何分析。
+有NumPy时在频域施加K计权；没有时（打包版）用audioop计算未计权的均方值。
+"""
+
+import os
+import math
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from waveform import decode_pcm
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import audioop
+    AUDIOOP_AVAILABLE = True
+except ImportError:
+    AUDIOOP_AVAILABLE = False
+
+# 目标响度（ReplayGain 2.0）
+TARGET_LUFS = -18.0
+# 分析用采样率（单声道）
+ANALYSIS_RATE = 22050
+# 100ms一段，4段组成一个400ms块
+SEGMENT_MS = 100
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# BS.1770 K计权两级双二阶滤波器（48kHz系数），用于计算频率响应
+_SHELF = ((1.53512485958697, -2.69169618940638, 1.19839281085285),
+          (1.0, -1.69065929318241, 0.73248077421585))
+_HIGHPASS = ((1.0, -2.0, 1.0),
+             (1.0, -1.99004745483398, 0.99007225036621))
+
+
+def _to_lufs(mean_square):
+    return -0.691 + 10 * math.log10(mean_square) if mean_square > 0 else float("-inf")
+
+
+def k_weight_power(freqs):
+    """K计权在各频率上的功率响应 |H(f)|²"""
+    w = 2 * np.pi * freqs / 48000.0
+    z1 = np.exp(-1j * w)
+    z2 = np.exp(-2j * w)
+    response = np.ones_like(w, dtype=np.float64)
+    for b, a in (_SHELF, _HIGHPASS):
+        h = (b[0] + b[1] * z1 + b[2] * z2) / (a[0] + a[1] * z1 + a[2] * z2)
+        response *= np.abs(h) ** 2
+    return response
+
+
+def segment_powers(pcm, rate):
+    """每100ms一段的均方值（满幅为1.0）"""
+    seg_len = max(1, rate * SEGMENT_MS // 1000)
+    count = len(pcm) // 2 // seg_len
+
+    if NUMPY_AVAILABLE:
+        samples = np.frombuffer(pcm[:count * seg_len * 2], dtype=np.int16)
+        weights = k_weight_power(np.fft.rfftfreq(seg_len, 1.0 / rate))
+        powers = []
+        # 分批做FFT，避免整首歌一次占用太多内存
+        for start in range(0, count, 256):
+            block = samples[start * seg_len:min(count, start + 256) * seg_len]
+            block = block.reshape(-1, seg_len).astype(np.float64) / 32768.0
+            spectrum = np.abs(np.fft.rfft(block, axis=1)) ** 2
+            # Parseval：频域能量换算回时域均方值（单边谱，非直流/奈奎斯特分量计两次）
+            spectrum[:, 1:] *= 2
+            if seg_len % 2 == 0:
+                spectrum[:, -1] /= 2
+            powers.extend((spectrum * weights).sum(axis=1) / (seg_len * seg_len))
+        return powers
+
+    powers = []
+    for i in range(count):
+        fragment = pcm[i * seg_len * 2:(i + 1) * seg_len * 2]
+        if AUDIOOP_AVAILABLE:
+            rms = audioop.rms(fragment, 2)
+        else:
+            from array import array
+            samples = array('h')
+            samples.frombytes(fragment)
+            rms = math.sqrt(sum(x * x for x in samples[::4]) / max(1, len(samples[::4])))
+        powers.append((rms / 32768.0) ** 2)
+    return powers
+
+
+def integrated_loudness(powers):
+    """门限积分响度（LUFS）"""
+    blocks = [sum(powers[i:i + 4]) / 4 for i in range(len(powers) - 3)]
+    if not blocks:
+        blocks = [sum(powers) / len(powers)] if powers else []
+
+    gated = [p for p in blocks if _to_lufs(p) > ABSOLUTE_GATE]
+    if not gated:
+        return float("-inf")
+
+    threshold = _to_lufs(sum(gated) / len(gated)) + RELATIVE_GATE
+    gated = [p for p in gated if _to_lufs(p) > threshold]
+    if not gated:
+        return float("-inf")
+    return _to_lufs(sum(gated) / len(gated))
+
+
+def peak_level(pcm):
+    """采样峰值（满幅为1.0）"""
+    if NUMPY_AVAILABLE:
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16)
+        return float(np.abs(samples.astype(np.int32)).max()) / 32768.0 if len(samples) else 0.0
+    if AUDIOOP_AVAILABLE:
+        return audioop.max(pcm[:len(pcm) // 2 * 2], 2) / 32768.0
+    return 1.0
+
+
+def analyze_file(path):
+    """工作进程入口：返回 {"loudness", "peak", "gain"}"""
+    pcm = decode_pcm(path, ANALYSIS_RATE)
+    import pygame
+    rate = pygame.mixer.get_init()[0]
+
+    loudness = integrated_loudness(segment_powers(pcm, rate))
+    peak = peak_level(pcm)
+    if loudness == float("-inf"):
+        gain = 0.0
+    else:
+        gain = TARGET_LUFS - loudness
+        # 增益后峰值不超过满幅
+        if peak > 0:
+            gain = min(gain, -20 * math.log10(peak))
+    return {"loudness": round(loudness, 2) if loudness != float("-inf") else None,
+            "peak": round(peak, 4), "gain": round(gain, 2)}
+
+
+class LoudnessScanner:
+    """曲库响度扫描（进程池，增量）；store 需提供 is_current / put / save"""
+
+    def __init__(self, store, workers=None):
+        self.store = store
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.running = False
+
+    def pending(self, paths):
+        """需要分析的文件（新增或修改过）"""
+        result = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if not self.store.is_current(path, st):
+                result.append((path, st))
+        return result
+
+    def scan(self, paths, progress=None):
+        """扫描并返回统计；progress(已完成, 总数, 首/秒) 在工作线程中调用"""
+        todo = self.pending(paths)
+        summary = {"total": len(paths), "analyzed": 0, "skipped": len(paths) - len(todo),
+                   "failed": 0, "elapsed": 0.0, "tracks_per_sec": 0.0}
+        if not todo:
+            return summary
+
+        start = time.perf_counter()
+        done = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(analyze_file, path): (path, st) for path, st in todo}
+            for future in as_completed(futures):
+                path, st = futures[future]
+                try:
+                    self.store.put(path, st, future.result())
+                    summary["analyzed"] += 1
+                except Exception as e:
+                    print(f"Loudness error: {path} - {e}")
+                    summary["failed"] += 1
+                done += 1
+                elapsed = time.perf_counter() - start
+                if progress:
+                    progress(done, len(todo), done / elapsed if elapsed > 0 else 0.0)
+                if done % 20 == 0:
+                    self.store.save()
+
+        self.store.save()
+        summary["elapsed"] = time.perf_counter() - start
+        summary["tracks_per_sec"] = summary["analyzed"] / summary["elapsed"] if summary["elapsed"] > 0 else 0.0
+        return summary
+
+    def start(self, paths, progress=None, finished=None):
+        """后台线程中扫描，完成后调用 finished(summary)"""
+        if self.running:
+            return False
+        self.running = True
+
+        def worker():
+            try:
+                summary = self.scan(paths, progress)
+            except Exception as e:
+                summary = {"error": str(e)}
+            finally:
+                self.running = False
+            if finished:
+                finished(summary)
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LRC歌词解析
+支持标准LRC和增强LRC：
+- 时间标签 [mm:ss]、[mm:ss.x]、[mm:ss.xx]、[mm:ss.xxx]、[mm:ss:xx]
+- 一行多个时间标签 [00:12.00][01:30.00]副歌
+- 元数据标签 [ti:] [ar:] [al:] [by:] [offset:]
+- 逐字时间标签 <mm:ss.xx>
+解析结果使用并行数组存储（时间数组 + 文本列表），并按 路径+修改时间 缓存。
+"""
+
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+_TIME_TAG = re.compile(r'\[(\d+):(\d{1,2})(?:[.:](\d{1,3}))?\]')
+_META_TAG = re.compile(r'\[([A-Za-z#]+):([^\]]*)\]')
+_WORD_TAG = re.compile(r'<(\d+):(\d{1,2})(?:[.:](\d{1,3}))?>')
+
+# 解析结果缓存上限（按最近使用淘汰）
+CACHE_SIZE = 64
+_cache = OrderedDict()
+# 预加载线程和界面线程都会读取缓存
+_cache_lock = threading.Lock()
+
+
+def _to_ms(minutes, seconds, fraction):
+    """时间标签转为毫秒，小数位数决定单位（1位=100ms，2位=10ms，3位=1ms）"""
+    ms = (int(minutes) * 60 + int(seconds)) * 1000
+    if fraction:
+        ms += int(fraction) * (10 ** (3 - len(fraction)))
+    return ms
+
+
+class LrcDocument:
+    """解析后的歌词
+
+    times[i] / texts[i] 为第i行的开始时间（毫秒，已应用offset）和文本；
+    第i行的逐字时间为 word_times/word_texts 中 [word_index[i], word_index[i+1]) 的部分。
+    迭代时产出 (时间, 文本) 元组，兼容旧的列表格式。
+    """
+
+    __slots__ = ("times", "texts", "word_index", "word_times", "word_texts", "tags", "offset")
+
+    def __init__(self):
+        self.times = array('l')
+        self.texts = []
+        self.word_index = array('l', [0])
+        self.word_times = array('l')
+        self.word_texts = []
+        self.tags = {}
+        self.offset = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def __bool__(self):
+        return len(self.times) > 0
+
+    def __getitem__(self, i):
+        return self.times[i], self.texts[i]
+
+    def __iter__(self):
+        return zip(self.times, self.texts)
+
+    def index_at(self, position_ms):
+        """二分查找当前播放位置对应的行号，还没到第一行时返回-1"""
+        return bisect_right(self.times, position_ms) - 1
+
+    def words(self, i):
+        """第i行的逐字时间 [(毫秒, 文字), ...]，没有逐字标签时返回空列表"""
+        start, end = self.word_index[i], self.word_index[i + 1]
+        return list(zip(self.word_times[start:end], self.word_texts[start:end]))
+
+    def has_word_timing(self):
+        """是否包含逐字时间"""
+        return len(self.word_times) > 0
+
+    def line_end(self, i, default_duration=5000):
+        """第i行的结束时间（下一行开始时间）"""
+        if i + 1 < len(self.times):
+            return self.times[i + 1]
+        return self.times[i] + default_duration
+
+
+def parse_lrc_text(content):
+    """单次遍历解析LRC文本，返回 LrcDocument"""
+    entries = []
+    tags = {}
+    seq = 0
+
+    for raw_line in content.splitlines():
+        line = raw_line.strip()
+        if not line or line[0] != '[':
+            continue
+
+        # 读取行首所有连续的时间标签
+        stamps = []
+        pos = 0
+        while True:
+            match = _TIME_TAG.match(line, pos)
+            if not match:
+                break
+            stamps.append(_to_ms(*match.groups()))
+            pos = match.end()
+
+        if not stamps:
+            meta = _META_TAG.match(line)
+            if meta:
+                tags[meta.group(1).lower()] = meta.group(2).strip()
+            continue
+
+        body = line[pos:]
+        words = []
+        if '<' in body:
+            parts = _WORD_TAG.split(body)
+            # split结果：[前缀, 分, 秒, 小数, 文字, 分, 秒, 小数, 文字, ...]
+            prefix = parts[0]
+            text_parts = [prefix]
+            if prefix.strip():
+                words.append((None, prefix))
+            for k in range(1, len(parts), 4):
+                word_ms = _to_ms(parts[k], parts[k + 1], parts[k + 2])
+                word = parts[k + 3]
+                text_parts.append(word)
+                if word:
+                    words.append((word_ms, word))
+            text = "".join(text_parts).strip()
+        else:
+            text = body.strip()
+
+        first = stamps[0]
+        for stamp in stamps:
+            # 一行多个时间标签时，逐字时间按该行首次出现的时间平移
+            shifted = [(stamp if t is None else t - first + stamp, w) for t, w in words]
+            entries.append((stamp, seq, text, shifted))
+            seq += 1
+
+    entries.sort(key=lambda e: (e[0], e[1]))
+
+    doc = LrcDocument()
+    doc.tags = tags
+    try:
+        doc.offset = int(tags.get("offset", "0").replace("+", ""))
+    except ValueError:
+        doc.offset = 0
+
+    # offset为正表示歌词提前显示
+    offset = doc.offset
+    for stamp, _, text, words in entries:
+        doc.times.append(max(0, stamp - offset))
+        doc.texts.append(text)
+        for word_ms, word in words:
+            doc.word_times.append(max(0, word_ms - offset))
+            doc.word_texts.append(word)
+        doc.word_index.append(len(doc.word_times))
+
+    return doc
+
+
+def load_lrc(path):
+    """读取并解析LRC文件（按 路径+修改时间+大小 缓存），文件不存在返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        with _cache_lock:
+            _cache.pop(path, None)
+        return None
+
+    key = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == key:
+            _cache.move_to_end(path)
+            return cached[1]
+
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        doc = parse_lrc_text(f.read())
+
+    with _cache_lock:
+        _cache[path] = (key, doc)
+        _cache.move_to_end(path)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return doc
+
+
+def clear_cache():
+    """清空解析缓存"""
+    with _cache_lock:
+        _cache.clear()
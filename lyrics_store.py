@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+歌词库（单个SQLite文件）
+每首歌一个 .lrc 文件时，曲库大了就是成千上万个小文件，列目录、复制到U盘、扫描都耗在逐个文件的开销上。
+歌词库按歌曲ID（见 LibraryIndex.track_id）保存歌词原文和解析结果，两者都用zlib压缩；
+播放时按主键读一行、解压解析结果即可，不再解析LRC文本。
+可以从同名 .lrc 文件导入，也可以导出为 .lrc 文件（其他播放器、车载设备使用）。
+"""
+
+import os
+import zlib
+import marshal
+import sqlite3
+import threading
+from array import array
+
+from lrc_parser import LrcDocument, parse_lrc_text
+
+# 解析结果的格式版本（LrcDocument 结构变化时递增，旧结果按原文重新解析）
+PARSED_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lyrics (
+    id          TEXT PRIMARY KEY,
+    raw         BLOB NOT NULL,
+    parsed      BLOB,
+    version     INTEGER
+);
+"""
+
+
+def pack_document(doc):
+    """LrcDocument -> 压缩的bytes"""
+    data = (list(doc.times), doc.texts, list(doc.word_index), list(doc.word_times),
+            doc.word_texts, doc.tags, doc.offset)
+    return zlib.compress(marshal.dumps(data))
+
+
+def unpack_document(blob):
+    """压缩的bytes -> LrcDocument"""
+    times, texts, word_index, word_times, word_texts, tags, offset = marshal.loads(zlib.decompress(blob))
+    doc = LrcDocument()
+    doc.times = array('l', times)
+    doc.texts = texts
+    doc.word_index = array('l', word_index)
+    doc.word_times = array('l', word_times)
+    doc.word_texts = word_texts
+    doc.tags = tags
+    doc.offset = offset
+    return doc
+
+
+def read_lrc_file(path):
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        return f.read()
+
+
+class LyricsStore:
+    """歌词库（线程安全，单个连接 + 锁）"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError:
+                pass
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        self._ids = None    # 有歌词的歌曲ID（第一次调用 ids() 时读取，之后随增删更新）
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM lyrics").fetchone()[0]
+
+    def put(self, track_id, text, commit=True):
+        """保存歌词原文（同时保存解析结果）"""
+        raw = zlib.compress(text.encode('utf-8'))
+        parsed = pack_document(parse_lrc_text(text))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lyrics (id, raw, parsed, version) VALUES (?, ?, ?, ?)",
+                (track_id, raw, parsed, PARSED_VERSION))
+            if self._ids is not None:
+                self._ids.add(track_id)
+            if commit:
+                self._conn.commit()
+
+    def get_text(self, track_id):
+        """歌词原文，没有返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT raw FROM lyrics WHERE id = ?", (track_id,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def load(self, track_id):
+        """解析好的歌词（LrcDocument），没有返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT parsed, version, raw FROM lyrics WHERE id = ?",
+                                     (track_id,)).fetchone()
+        if not row:
+            return None
+        parsed, version, raw = row
+        if parsed is not None and version == PARSED_VERSION:
+            try:
+                return unpack_document(parsed)
+            except Exception:
+                pass
+        # 解析结果是旧格式或已损坏：按原文重新解析并保存
+        text = zlib.decompress(raw).decode('utf-8')
+        self.put(track_id, text)
+        return parse_lrc_text(text)
+
+    def has(self, track_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM lyrics WHERE id = ?", (track_id,)).fetchone() is not None
+
+    def ids(self):
+        """有歌词的歌曲ID集合（内存中的副本，不再查询数据库）"""
+        with self._lock:
+            if self._ids is None:
+                self._ids = set(row[0] for row in self._conn.execute("SELECT id FROM lyrics"))
+            return frozenset(self._ids)
+
+    def delete(self, track_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM lyrics WHERE id = ?", (track_id,))
+            self._conn.commit()
+            if self._ids is not None:
+                self._ids.discard(track_id)
+
+    def rename(self, old_id, new_id):
+        """歌曲改名（新ID已有歌词时不覆盖），返回是否改动"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM lyrics WHERE id = ?", (new_id,)).fetchone():
+                return False
+            cursor = self._conn.execute("UPDATE lyrics SET id = ? WHERE id = ?", (new_id, old_id))
+            self._conn.commit()
+            if cursor.rowcount > 0 and self._ids is not None:
+                self._ids.discard(old_id)
+                self._ids.add(new_id)
+            return cursor.rowcount > 0
+
+    # ------------------------------------------------------------------
+    # 与 .lrc 文件互相转换
+    # ------------------------------------------------------------------
+
+    def import_files(self, items, remove=False):
+        """items: [(歌曲ID, lrc路径), ...]，不存在的文件跳过；remove为True时导入后删除 .lrc 文件，返回导入数"""
+        imported = []
+        for track_id, path in items:
+            try:
+                text = read_lrc_file(path)
+            except OSError:
+                continue
+            self.put(track_id, text, commit=False)
+            imported.append(path)
+        with self._lock:
+            self._conn.commit()
+        # 提交之后再删除文件：中途出错时歌词还在 .lrc 文件里
+        if remove:
+            for path in imported:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return len(imported)
+
+    def export_files(self, items):
+        """items: [(歌曲ID, lrc路径), ...]，把歌词库中有的写成 .lrc 文件，返回导出数"""
+        count = 0
+        for track_id, path in items:
+            text = self.get_text(track_id)
+            if text is None:
+                continue
+            try:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                count += 1
+            except OSError as e:
+                print(f"Lyrics export error: {path} - {e}")
+        return count
+
+    def backup(self, path):
+        """把歌词库复制为一个文件（复制到U盘等）"""
+        target = sqlite3.connect(path)
+        try:
+            with self._lock:
+                self._conn.backup(target)
+        finally:
+            target.close()
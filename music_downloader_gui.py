@@ -12,11 +12,32 @@ import sys
 import shutil
 import threading
 import subprocess
+import multiprocessing
 from datetime import datetime
 from tkinter import *
 from tkinter import ttk, scrolledtext, filedialog, messagebox
 from urllib.parse import quote
 
+from stage_tracer import StageTracer
+from file_watch import DirectoryWatcher
+from lrc_parser import load_lrc
+from playlist import Playlist
+from karaoke_canvas import KaraokeRenderer
+from waveform import WaveformService
+from loudness import LoudnessScanner
+from integrity import IntegrityScanner, MAX_REQUEUE
+from fingerprint import FingerprintScanner, find_duplicates, NUMPY_AVAILABLE as FINGERPRINT_AVAILABLE
+from library_index import LibraryIndex, LibraryScanner, normalize_root
+from list_view import VirtualList
+from search_index import SearchIndex
+from track_store import TrackStore, name_key, FLAG_LRC
+from lyrics_store import LyricsStore
+from playback import (
+    PlaybackPosition, PreparedTrack, GrowingFile, seek_music, prepare_track,
+    read_length, mp3_stream_info,
+    STREAM_START_BUFFER_MS, STREAM_LOW_BUFFER_MS, STREAM_RESUME_BUFFER_MS
+)
+
 try:
     import pygame
     PYGAME_AVAILABLE = True
@@ -97,22 +118,6 @@ def extract_bundled_chrome():
         return False
 
 
-def parse_lrc(lrc_content):
-    """解析LRC歌词文件"""
-    lines = []
-    for line in lrc_content.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-        # 匹配时间标签 [mm:ss.xx]
-        matches = re.findall(r'\[(\d{2}):(\d{2})\.(\d{2})\](.+)', line)
-        for match in matches:
-            minutes, seconds, centiseconds, text = match
-            total_ms = (int(minutes) * 60 + int(seconds)) * 1000 + int(centiseconds) * 10
-            lines.append((total_ms, text))
-    return sorted(lines, key=lambda x: x[0])
-
-
 class MusicDownloaderGUI:
     def __init__(self, root):
         self.root = root
@@ -135,6 +140,7 @@ class MusicDownloaderGUI:
 
         # 桌面歌词窗口
         self.desktop_lyric_window = None
+        self.desktop_lyric = None
         self.show_desktop_lyric = False
 
         # 配置
@@ -145,20 +151,89 @@ class MusicDownloaderGUI:
         self.success_file = os.path.join(exe_dir, "download-success.txt")
         self.error_file = os.path.join(exe_dir, "download-err.txt")
         self.config_file = os.path.join(exe_dir, "player_config.txt")
+        self.trace_file = os.path.join(exe_dir, "download-trace.jsonl")
+        self.tracer = StageTracer(self.trace_file)
+        self.cache_dir = os.path.join(exe_dir, ".cache")
+        # 曲库索引：大小/修改时间/时长/标签/有无歌词/响度，增量刷新
+        self.library = LibraryIndex(os.path.join(self.cache_dir, "library.db"))
+        self.library.set_primary(self.download_dir)
+        # 除下载文件夹外的曲库文件夹（配置中保存），按设备并行扫描
+        self.library_roots = []
+        self.library_scanner = LibraryScanner(self.library)
+        # 曲库文件夹监听：外部增删改名后自动更新索引和列表（文件夹 -> 监听器）
+        self.library_watchers = {}
+        self.mp3juice_url = "https://mp3juice.co/"
+        self.lrclib_url = "https://lrclib.net"
 
         # 状态变量
         self.is_downloading = False
         self.driver = None
         self.current_playing = None
         self.current_lrc = []
+        self.lrc_rendered = None
+        self.lrc_display_index = -1
         self.is_playing = False
-        self.play_thread = None
+        # 播放时钟：Tk事件循环上的单个after回调，暂停/停止时不安排
+        self.clock_job = None
+        self.position = PlaybackPosition()
+        self.seek_job = None
+        self.pending_seek_x = None
+        self.last_time_text = None
+        self.last_progress_x = None
+        # 无缝播放：预加载的下一首、已交给pygame排队的下一首、上次读到的get_pos
+        self.prepared_track = None
+        self.queued_track = None
+        self.last_raw_pos = None
+        # 交叉淡化时长（毫秒），0表示直接衔接
+        self.crossfade_ms = 0
+        self.music_volume = 1.0
+        # 响度均衡：扫描结果和当前歌曲的音量系数
+        self.normalize_volume = True
+        self.track_gain = 1.0
+        self.loudness_scanner = LoudnessScanner(self.library)
+        # 重复歌曲检测：声学指纹（进程池，增量保存在曲库索引中）
+        self.fingerprint_scanner = FingerprintScanner(self.library)
+        # 完整性检查：逐帧检查下载中断/损坏的MP3（进程池，按修改时间缓存），损坏的重新加入待下载列表
+        self.integrity_scanner = IntegrityScanner(self.library)
+        # 歌词库：按歌曲ID保存在一个文件中（压缩的原文+解析结果）；开启后新下载的歌词存入歌词库而不是 .lrc 文件
+        self.lyrics_store = LyricsStore(os.path.join(self.cache_dir, "lyrics.db"))
+        self.use_lyrics_store = False
+        self.fading_in = False
         self.music_length = 0
+        self.music_length_known = False
+        # 边下边播：正在播放的下载中文件、各歌曲的下载进度、是否等待第一首开始下载
+        self.stream = None
+        self.stream_song = None
+        self.stream_offset = 0
+        self.stream_bytes_per_ms = 16.0
+        self.stream_pending = False
+        self.buffering = False
+        self.download_progress = {}
+        # 进度条波形：后台进程计算峰值并缓存，界面只按播放进度改变分界处的柱子颜色
+        self.waveform = WaveformService(os.path.join(self.cache_dir, "waveform"))
+        self.wave_path = None
+        self.wave_peaks = None
+        self.wave_bars = []
+        self.wave_split = 0
         self.user_seeking = False
         self.loop_enabled = True
-        self.current_page = 0
-        self.page_size = 20
-        self.total_files = []
+        # 内存曲库（列式），列表中的每一项是它的下标
+        self.tracks = TrackStore()
+        # 列表中标为正在播放的歌曲、按首字母跳转时已输入的前缀
+        self.tree_playing = None
+        self.jump_prefix = ""
+        self.jump_time = 0
+        # 搜索：内存索引（后台增量更新）和输入防抖
+        self.search_index = SearchIndex()
+        self.search_lock = threading.Lock()
+        self.search_index_ids = None   # 搜索索引对应的歌曲ID列表（曲库没变时不更新索引）
+        self.search_job = None
+        # 播放列表（顺序/随机、插队队列），曲库刷新时同步
+        self.shuffle_enabled = False
+        self.playlist = Playlist()
+        # 并行下载的浏览器数量，1表示使用原来的单线程顺序下载
+        self.download_workers = 1
+        self.orchestrator = None
 
         # 延迟初始化pygame（仅在需要时初始化）
         self.pygame_initialized = False
@@ -178,6 +253,7 @@ class MusicDownloaderGUI:
 
         # 先加载配置
         self.load_config()
+        self.playlist.set_shuffle(self.shuffle_enabled)
 
         # 创建UI
         self.create_widgets()
@@ -188,7 +264,9 @@ class MusicDownloaderGUI:
     def _delayed_init(self):
         """延迟初始化，不阻塞UI启动"""
         self.load_todo_list()
-        self.refresh_local_music()
+        # 先按上次的索引显示，再在后台增量刷新（首次使用时需要解析全部歌曲）
+        self.render_local_music()
+        self.refresh_library_async()
 
         # 自动播放上次的歌曲
         if self.current_playing and PYGAME_AVAILABLE:
@@ -397,6 +475,20 @@ class MusicDownloaderGUI:
         )
         self.start_btn.pack(side=LEFT, fill=X, expand=True, padx=(0, 5))
 
+        self.stream_btn = Button(
+            control_frame,
+            text="🎧 边下边播",
+            font=("Microsoft YaHei UI", 12, "bold"),
+            bg="#3498db",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            height=2,
+            state=DISABLED,
+            command=self.request_stream_playback
+        )
+        self.stream_btn.pack(side=LEFT, fill=X, expand=True, padx=5)
+
         self.stop_btn = Button(
             control_frame,
             text="⏹️ 停止",
@@ -442,6 +534,28 @@ class MusicDownloaderGUI:
             command=self.open_download_folder
         ).pack(side=LEFT, padx=(0, 5))
 
+        Button(
+            toolbar,
+            text="📂 曲库文件夹",
+            font=("Microsoft YaHei UI", 10),
+            bg="#16a085",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            command=self.manage_library_roots
+        ).pack(side=LEFT, padx=(0, 5))
+
+        Button(
+            toolbar,
+            text="📜 歌词库",
+            font=("Microsoft YaHei UI", 10),
+            bg="#d35400",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            command=self.manage_lyrics_store
+        ).pack(side=LEFT, padx=(0, 5))
+
         Button(
             toolbar,
             text="💾 复制到U盘",
@@ -451,6 +565,39 @@ class MusicDownloaderGUI:
             relief=FLAT,
             cursor="hand2",
             command=self.copy_to_usb
+        ).pack(side=LEFT, padx=(0, 5))
+
+        Button(
+            toolbar,
+            text="🔊 响度扫描",
+            font=("Microsoft YaHei UI", 10),
+            bg="#16a085",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            command=self.start_loudness_scan
+        ).pack(side=LEFT, padx=(0, 5))
+
+        Button(
+            toolbar,
+            text="🧬 查找重复",
+            font=("Microsoft YaHei UI", 10),
+            bg="#8e44ad",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            command=self.start_duplicate_scan
+        ).pack(side=LEFT, padx=(0, 5))
+
+        Button(
+            toolbar,
+            text="🩺 完整性检查",
+            font=("Microsoft YaHei UI", 10),
+            bg="#2980b9",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            command=self.start_integrity_scan
         ).pack(side=LEFT)
 
         # 右侧播放控制按钮
@@ -466,50 +613,77 @@ class MusicDownloaderGUI:
         )
         self.loop_btn.pack(side=RIGHT, padx=(5, 0))
 
-        Button(
+        self.shuffle_btn = Button(
             toolbar,
-            text="⏹️ 停止",
+            text="🔀 随机",
             font=("Microsoft YaHei UI", 10),
-            bg=self.error_color,
+            bg="#9b59b6" if self.shuffle_enabled else "#95a5a6",
             fg="white",
             relief=FLAT,
             cursor="hand2",
-            command=self.stop_music
-        ).pack(side=RIGHT, padx=(5, 0))
-
-        # 分页控制
-        self.page_label = Label(
-            toolbar,
-            text="1/1",
-            font=("Microsoft YaHei UI", 9),
-            bg=self.bg_color,
-            fg="#7f8c8d"
+            command=self.toggle_shuffle
         )
-        self.page_label.pack(side=RIGHT, padx=(10, 5))
+        self.shuffle_btn.pack(side=RIGHT, padx=(5, 0))
 
         Button(
             toolbar,
-            text="▶",
+            text="⏭️",
             font=("Microsoft YaHei UI", 10),
             bg="#95a5a6",
             fg="white",
             relief=FLAT,
             cursor="hand2",
-            width=2,
-            command=self.next_page
-        ).pack(side=RIGHT, padx=(2, 0))
+            command=self.play_next_song
+        ).pack(side=RIGHT, padx=(5, 0))
 
         Button(
             toolbar,
-            text="◀",
+            text="⏮️",
             font=("Microsoft YaHei UI", 10),
             bg="#95a5a6",
             fg="white",
             relief=FLAT,
             cursor="hand2",
-            width=2,
-            command=self.prev_page
-        ).pack(side=RIGHT, padx=(5, 2))
+            command=self.play_previous_song
+        ).pack(side=RIGHT, padx=(5, 0))
+
+        Button(
+            toolbar,
+            text="⏹️ 停止",
+            font=("Microsoft YaHei UI", 10),
+            bg=self.error_color,
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            command=self.stop_music
+        ).pack(side=RIGHT, padx=(5, 0))
+
+        # 歌曲数量
+        self.track_count_label = Label(
+            toolbar,
+            text="0 首",
+            font=("Microsoft YaHei UI", 9),
+            bg=self.bg_color,
+            fg="#7f8c8d"
+        )
+        self.track_count_label.pack(side=RIGHT, padx=(10, 5))
+
+        # 搜索框（歌名、拼音、首字母）
+        search_frame = Frame(local_frame, bg=self.bg_color)
+        search_frame.pack(fill=X, padx=10, pady=(0, 8))
+
+        Label(
+            search_frame,
+            text="🔍",
+            font=("Microsoft YaHei UI", 10),
+            bg=self.bg_color
+        ).pack(side=LEFT)
+
+        self.search_var = StringVar()
+        self.search_var.trace_add("write", lambda *args: self.schedule_search())
+        search_entry = Entry(search_frame, textvariable=self.search_var, font=("Microsoft YaHei UI", 10))
+        search_entry.pack(side=LEFT, fill=X, expand=True, padx=(5, 0))
+        search_entry.bind('<Escape>', lambda e: self.search_var.set(""))
 
         # 音乐列表区域
         list_container = Frame(local_frame, bg=self.bg_color)
@@ -518,9 +692,10 @@ class MusicDownloaderGUI:
         # 创建Treeview显示音乐列表
         columns = ("name", "status", "size", "action", "delete")
         self.music_tree = ttk.Treeview(list_container, columns=columns, show="headings", height=15)
-        self.music_tree.heading("name", text="歌曲名称")
-        self.music_tree.heading("status", text="状态")
-        self.music_tree.heading("size", text="文件大小")
+        # 点击表头排序
+        self.music_tree.heading("name", text="歌曲名称", command=lambda: self.sort_music_list("name"))
+        self.music_tree.heading("status", text="状态", command=lambda: self.sort_music_list("status"))
+        self.music_tree.heading("size", text="文件大小", command=lambda: self.sort_music_list("size"))
         self.music_tree.heading("action", text="操作")
         self.music_tree.heading("delete", text="删除")
 
@@ -535,15 +710,24 @@ class MusicDownloaderGUI:
         style.configure("Treeview", rowheight=25)
         self.music_tree.tag_configure('playing', background='#d4edda', foreground='#155724')
 
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(list_container, orient=VERTICAL, command=self.music_tree.yview)
-        self.music_tree.configure(yscrollcommand=scrollbar.set)
+        # 添加滚动条（虚拟列表：Treeview中只有可见的行，滚动条由列表自己控制）
+        scrollbar = ttk.Scrollbar(list_container, orient=VERTICAL)
+        self.music_list = VirtualList(self.music_tree, scrollbar,
+                                      lambda i: (self.tracks.ids[i],) + self.track_row(self.tracks.record(i)),
+                                      item_id=lambda i: self.tracks.ids[i],
+                                      sorter=self.sort_tracks)
+        self.music_list.sort_keys = {"name": lambda i: name_key(self.tracks.names[i])}
+        self.music_list.sort_column = "name"
 
         self.music_tree.pack(side=LEFT, fill=BOTH, expand=True)
         scrollbar.pack(side=RIGHT, fill=Y)
 
         # 绑定单击事件到操作列
         self.music_tree.bind('<Button-1>', self.on_tree_click)
+        # 右键菜单：插队
+        self.music_tree.bind('<Button-3>', self.show_tree_menu)
+        # 输入字母跳转
+        self.music_tree.bind('<Key>', self.on_tree_key)
 
         # 播放器控制区域（网易云风格）
         player_frame = Frame(local_frame, bg=self.player_bg, height=450)
@@ -592,27 +776,30 @@ class MusicDownloaderGUI:
         self.time_label.pack(side=LEFT, padx=(0, 15))
 
         # 使用Canvas创建自定义进度条
+        # 高度留给波形，进度线在垂直居中位置
         progress_canvas = Canvas(
             progress_container,
-            height=10,
+            height=36,
             bg=self.player_bg,
             highlightthickness=0
         )
         progress_canvas.pack(side=LEFT, fill=X, expand=True)
+        self.progress_mid = 18
 
         # 创建进度条背景和进度线（网易云风格）
+        mid = self.progress_mid
         self.progress_bg = progress_canvas.create_rectangle(
-            0, 2, 400, 7,
+            0, mid - 2, 400, mid + 2,
             fill="#e0e0e0",
             outline=""
         )
         self.progress_fill = progress_canvas.create_rectangle(
-            0, 2, 0, 7,
+            0, mid - 2, 0, mid + 2,
             fill=self.primary_color,
             outline=""
         )
         self.progress_handle = progress_canvas.create_oval(
-            -6, 0, 6, 10,
+            -6, mid - 6, 6, mid + 6,
             fill=self.primary_color,
             outline="white",
             width=2
@@ -621,10 +808,10 @@ class MusicDownloaderGUI:
         self.progress_canvas = progress_canvas
         self.progress_dragging = False
 
-        # 移除拖动事件绑定（禁用拖动）
-        # progress_canvas.bind('<Button-1>', self.on_progress_press)
-        # progress_canvas.bind('<B1-Motion>', self.on_progress_drag)
-        # progress_canvas.bind('<ButtonRelease-1>', self.on_progress_release)
+        # 拖动进度条跳转（在已加载的流内跳转，不重新加载文件）
+        progress_canvas.bind('<Button-1>', self.on_progress_press)
+        progress_canvas.bind('<B1-Motion>', self.on_progress_drag)
+        progress_canvas.bind('<ButtonRelease-1>', self.on_progress_release)
         progress_canvas.bind('<Configure>', self.on_progress_resize)
 
         self.total_time_label = Label(
@@ -667,12 +854,15 @@ class MusicDownloaderGUI:
     def on_progress_resize(self, event):
         """进度条窗口大小改变"""
         width = event.width
-        self.progress_canvas.coords(self.progress_bg, 0, 1, width, 5)
+        mid = self.progress_mid
+        self.progress_canvas.coords(self.progress_bg, 0, mid - 2, width, mid + 2)
+        self.draw_waveform()
         # 重新计算当前进度位置
         if self.music_length > 0 and self.current_playing:
             try:
-                pos = pygame.mixer.music.get_pos()
+                pos = self.current_position()
                 progress = (pos / self.music_length)
+                self.last_progress_x = None
                 self.update_progress_ui(progress)
             except:
                 pass
@@ -684,52 +874,80 @@ class MusicDownloaderGUI:
         self.seek_to_position(event.x)
 
     def on_progress_drag(self, event):
-        """进度条拖动"""
-        if self.progress_dragging:
-            self.seek_to_position(event.x)
+        """进度条拖动：界面立即跟随，音频跳转合并到空闲时执行"""
+        if not self.progress_dragging:
+            return
+        self.preview_seek(event.x)
+        self.pending_seek_x = event.x
+        if self.seek_job is None:
+            self.seek_job = self.root.after_idle(self.apply_pending_seek)
+
+    def apply_pending_seek(self):
+        """执行拖动过程中最后一次的跳转"""
+        self.seek_job = None
+        if self.pending_seek_x is not None:
+            x, self.pending_seek_x = self.pending_seek_x, None
+            self.seek_to_position(x)
 
     def on_progress_release(self, event):
         """进度条释放"""
         self.progress_dragging = False
+        if self.seek_job is not None:
+            self.root.after_cancel(self.seek_job)
+            self.seek_job = None
+        self.pending_seek_x = None
         self.seek_to_position(event.x)
-        # 延迟恢复更新，避免立即被覆盖
-        self.root.after(200, lambda: setattr(self, 'user_seeking', False))
+        # 位置模型已经是跳转后的位置，可以立即恢复时钟更新
+        self.user_seeking = False
+        self.schedule_clock()
 
-    def seek_to_position(self, x):
-        """根据X坐标跳转到指定位置"""
+    def x_to_position(self, x):
+        """进度条X坐标转为歌曲位置（毫秒），无法计算时返回None"""
         if not PYGAME_AVAILABLE or not self.current_playing or self.music_length == 0:
-            return
+            return None
 
         width = self.progress_canvas.winfo_width()
         if width <= 0:
-            return
+            return None
 
-        # 计算进度百分比
-        progress = max(0, min(1, x / width))
-        seek_pos = int(progress * self.music_length)
+        pos = int(max(0, min(1, x / width)) * self.music_length)
 
-        try:
-            # 重新加载并播放到指定位置
-            mp3_path = os.path.join(self.download_dir, f"{self.current_playing}.mp3")
-            pygame.mixer.music.load(mp3_path)
-            pygame.mixer.music.play(start=seek_pos / 1000.0, loops=-1 if self.loop_enabled else 0)
+        # 边下边播时只能跳转到已下载的部分
+        if self.stream is not None and not self.stream.finished:
+            limit = self.stream_buffered_ms(0) - STREAM_LOW_BUFFER_MS
+            pos = max(0, min(pos, int(limit)))
+        return pos
 
-            if not self.is_playing:
-                pygame.mixer.music.pause()
+    def preview_seek(self, x):
+        """只更新进度条、时间和歌词，不操作音频"""
+        seek_pos = self.x_to_position(x)
+        if seek_pos is None:
+            return None
 
-            # 立即更新UI
-            self.update_progress_ui(progress)
+        self.update_progress_ui(seek_pos / self.music_length)
+        self.time_label.config(text=self.format_time(seek_pos))
+        self.total_time_label.config(text=self.format_time(self.music_length))
+        self.last_progress_x = None
+        self.last_time_text = None
 
-            # 更新时间标签
-            current_time = self.format_time(seek_pos)
-            total_time = self.format_time(self.music_length)
-            self.time_label.config(text=current_time)
-            self.total_time_label.config(text=total_time)
+        if self.current_lrc:
+            self.update_lyrics_display(seek_pos)
+        return seek_pos
 
-            # 立即更新歌词显示
-            if self.current_lrc:
-                self.update_lyrics_display(seek_pos)
+    def seek_to_position(self, x):
+        """根据X坐标跳转到指定位置"""
+        seek_pos = self.preview_seek(x)
+        if seek_pos is None:
+            return
 
+        try:
+            seek_music(seek_pos, paused=not self.is_playing)
+            self.position.seek(seek_pos)
+            # play(start=)方式跳转会让get_pos归零，也可能丢掉排队
+            self.last_raw_pos = None
+            self.fading_in = False
+            if self.queued_track:
+                pygame.mixer.music.queue(self.queued_track.mp3_path)
         except Exception as e:
             print(f"Seek error: {e}")
 
@@ -740,8 +958,87 @@ class MusicDownloaderGUI:
             return
 
         x = progress * width
-        self.progress_canvas.coords(self.progress_fill, 0, 1, x, 5)
-        self.progress_canvas.coords(self.progress_handle, x - 6, -2, x + 6, 10)
+        mid = self.progress_mid
+        self.progress_canvas.coords(self.progress_fill, 0, mid - 2, x, mid + 2)
+        self.progress_canvas.coords(self.progress_handle, x - 6, mid - 6, x + 6, mid + 6)
+        self.update_waveform_split(x)
+
+    def load_waveform(self, mp3_path):
+        """显示歌曲波形：有缓存立即绘制，否则后台计算完成后绘制"""
+        self.wave_path = mp3_path
+        self.wave_peaks = None
+        self.draw_waveform()
+        if mp3_path is None:
+            return
+
+        peaks = self.waveform.request(
+            mp3_path,
+            lambda path, result: self.root.after(0, lambda: self.on_waveform_ready(path, result))
+        )
+        if peaks is not None:
+            self.on_waveform_ready(mp3_path, peaks)
+
+    def on_waveform_ready(self, path, peaks):
+        """波形峰值就绪（Tk线程）"""
+        if path != self.wave_path or peaks is None:
+            return
+        self.wave_peaks = peaks
+        self.draw_waveform()
+
+    def draw_waveform(self):
+        """按当前宽度重画全部波形柱（换歌或改变窗口大小时）"""
+        canvas = self.progress_canvas
+        for bar in self.wave_bars:
+            canvas.delete(bar)
+        self.wave_bars = []
+        self.wave_split = 0
+
+        peaks = self.wave_peaks
+        width = canvas.winfo_width()
+        has_wave = bool(peaks) and width > 3
+        line_state = HIDDEN if has_wave else NORMAL
+        canvas.itemconfig(self.progress_bg, state=line_state)
+        canvas.itemconfig(self.progress_fill, state=line_state)
+        if not has_wave:
+            return
+
+        # 每根柱子宽2像素、间隔1像素，取对应区间内的最小/最大值
+        buckets = len(peaks) // 2
+        count = width // 3
+        mid = self.progress_mid
+        scale = (mid - 2) / 128.0
+        for i in range(count):
+            start = i * buckets // count
+            end = max(start + 1, (i + 1) * buckets // count)
+            low = min(peaks[2 * j] for j in range(start, end))
+            high = max(peaks[2 * j + 1] for j in range(start, end))
+            x = i * 3
+            bar = canvas.create_rectangle(
+                x, mid - max(1, high * scale), x + 2, mid - min(-1, low * scale),
+                fill="#d0d0d0", outline=""
+            )
+            self.wave_bars.append(bar)
+        canvas.tag_raise(self.progress_handle)
+
+        # 恢复已播放部分的颜色
+        if self.music_length > 0 and self.current_playing:
+            self.update_waveform_split(self.position.position() / self.music_length * width)
+
+    def update_waveform_split(self, x):
+        """只修改已播放/未播放分界处变化的柱子"""
+        if not self.wave_bars:
+            return
+        split = max(0, min(len(self.wave_bars), int(x // 3)))
+        if split == self.wave_split:
+            return
+        canvas = self.progress_canvas
+        if split > self.wave_split:
+            for bar in self.wave_bars[self.wave_split:split]:
+                canvas.itemconfig(bar, fill=self.primary_color)
+        else:
+            for bar in self.wave_bars[split:self.wave_split]:
+                canvas.itemconfig(bar, fill="#d0d0d0")
+        self.wave_split = split
 
     def on_progress_change(self, value):
         """进度条拖动事件（旧的，已废弃）"""
@@ -754,56 +1051,63 @@ class MusicDownloaderGUI:
         secs = seconds % 60
         return f"{mins:02d}:{secs:02d}"
 
+    def render_lyrics(self):
+        """把整首歌词一次性写入歌词区域，之后播放过程中只调整标签"""
+        self.lrc_text.config(state=NORMAL)
+        self.lrc_text.delete(1.0, END)
+        self.lrc_text.insert(END, "\n".join(self.current_lrc.texts), "future")
+        self.lrc_text.config(state=DISABLED)
+        self.lrc_text.yview("1.0")
+
+        self.lrc_rendered = self.current_lrc
+        self.lrc_display_index = -1
+
+    def clear_lyrics_display(self, text=""):
+        """清空歌词区域（可显示一行提示）"""
+        self.lrc_text.config(state=NORMAL)
+        self.lrc_text.delete(1.0, END)
+        if text:
+            self.lrc_text.insert(END, text, "future")
+        self.lrc_text.config(state=DISABLED)
+        self.lrc_rendered = None
+        self.lrc_display_index = -1
+
     def update_lyrics_display(self, current_pos):
-        """更新歌词显示"""
+        """更新歌词显示（只有当前行变化时才操作文本控件）"""
         if not self.current_lrc:
             return
 
-        # 找到当前歌词的索引
-        current_index = -1
-        for i, (time_ms, text) in enumerate(self.current_lrc):
-            if current_pos >= time_ms:
-                current_index = i
-            else:
-                break
+        if self.lrc_rendered is not self.current_lrc:
+            self.render_lyrics()
+            self.update_desktop_lyric("♪ 即将开始 ♪")
 
-        # 清空歌词文本
-        self.lrc_text.config(state=NORMAL)
-        self.lrc_text.delete(1.0, END)
+        # 二分查找当前歌词的索引
+        current_index = self.current_lrc.index_at(current_pos)
+        if current_index == self.lrc_display_index:
+            return
+        self.lrc_display_index = current_index
 
-        # 显示前后各行歌词（总共10行）
-        start_index = max(0, current_index - 3)
-        end_index = min(len(self.current_lrc), current_index + 7)
-
-        current_lyric_text = ""
-        for i in range(start_index, end_index):
-            time_ms, text = self.current_lrc[i]
-
-            if i < current_index:
-                # 已播放的歌词
-                self.lrc_text.insert(END, text + "\n", "past")
-            elif i == current_index:
-                # 当前播放的歌词
-                self.lrc_text.insert(END, text + "\n", "current")
-                current_lyric_text = text
-            else:
-                # 未播放的歌词
-                self.lrc_text.insert(END, text + "\n", "future")
+        # 重新标记 已播放/当前/未播放 三段，不重建文本
+        text = self.lrc_text
+        for tag in ("past", "current", "future"):
+            text.tag_remove(tag, "1.0", END)
+
+        if current_index < 0:
+            text.tag_add("future", "1.0", END)
+            text.yview("1.0")
+            self.update_desktop_lyric("♪ 即将开始 ♪")
+            return
 
-        # 滚动到当前歌词位置（让当前歌词显示在中间）
-        if current_index >= 0 and current_index >= start_index:
-            line_num = current_index - start_index + 1
-            self.lrc_text.see(f"{line_num}.0")
-            # 使用mark_set确保当前行居中
-            self.lrc_text.mark_set("insert", f"{line_num}.0")
+        line_num = current_index + 1
+        text.tag_add("past", "1.0", f"{line_num}.0")
+        text.tag_add("current", f"{line_num}.0", f"{line_num + 1}.0")
+        text.tag_add("future", f"{line_num + 1}.0", END)
 
-        self.lrc_text.config(state=DISABLED)
+        # 当前歌词上方保留3行，与原来的10行窗口一致
+        text.yview(f"{max(1, line_num - 3)}.0")
 
         # 更新桌面歌词
-        if current_lyric_text:
-            self.update_desktop_lyric(current_lyric_text)
-        elif current_index == -1 and self.current_lrc:
-            self.update_desktop_lyric("♪ 即将开始 ♪")
+        self.show_desktop_line(current_index)
 
     def get_downloaded_songs(self):
         """获取已下载的歌曲列表"""
@@ -822,85 +1126,421 @@ class MusicDownloaderGUI:
         return name
 
     def is_song_downloaded(self, song_name):
-        """检查歌曲是否已下载"""
+        """检查歌曲是否已下载（检查出不完整或损坏的不算，需要重新下载）"""
         safe_name = self.sanitize_filename(song_name)
         mp3_path = os.path.join(self.download_dir, f"{safe_name}.mp3")
-        return os.path.exists(mp3_path)
+        return os.path.exists(mp3_path) and not self.library.is_broken(safe_name)
+
+    def song_paths(self, song):
+        """歌曲ID -> (MP3路径, LRC路径)；文件夹已从曲库移除时按下载文件夹处理"""
+        mp3_path = self.library.path_of(song)
+        if mp3_path is None:
+            mp3_path = os.path.join(self.download_dir, f"{song}.mp3")
+        return mp3_path, mp3_path[:-4] + ".lrc"
+
+    def load_lyrics(self, song, lrc_path):
+        """歌曲的歌词：先查歌词库（按主键读一行），没有时读 .lrc 文件"""
+        try:
+            doc = self.lyrics_store.load(song)
+        except Exception as e:
+            print(f"Lyrics store error: {e}")
+            doc = None
+        if doc is not None:
+            return doc
+        return load_lrc(lrc_path)
+
+    def store_lyrics(self, song, lrc_path):
+        """开启歌词库时：把刚下载的 .lrc 文件存入歌词库并删除文件"""
+        if self.use_lyrics_store:
+            self.lyrics_store.import_files([(song, lrc_path)], remove=True)
+
+    def song_title(self, song):
+        """歌曲ID -> 显示的歌曲名"""
+        return self.library.parse_id(song)[1]
+
+    def all_roots(self):
+        """所有曲库文件夹（下载文件夹在前）"""
+        roots = [self.download_dir]
+        for path in self.library_roots:
+            if normalize_root(path) not in (normalize_root(p) for p in roots):
+                roots.append(path)
+        return roots
 
     def refresh_local_music(self):
-        """刷新本地音乐列表（支持分页）"""
-        # 清空列表
-        for item in self.music_tree.get_children():
-            self.music_tree.delete(item)
+        """增量刷新曲库索引并刷新本地音乐列表（在后台按文件夹并行刷新）"""
+        if not self.refresh_library_async(render=True):
+            self.render_local_music()
+
+    def refresh_library_async(self, render=False):
+        """后台并行刷新所有曲库文件夹（每个设备一个线程），每个文件夹的进度写入日志，完成后刷新列表
+
+        不可访问的文件夹（如拔出的U盘）保留原有记录，不影响其他文件夹。返回是否已开始刷新。
+        """
+        os.makedirs(self.download_dir, exist_ok=True)
+        roots = self.all_roots()
+        self.start_library_watcher()
+
+        def progress(path, state, data):
+            name = os.path.basename(path.rstrip("\\/")) or path
+            if state == "progress":
+                done, total = data
+                self.root.after(0, lambda: self.log(f"曲库扫描 {name} [{done}/{total}]", "INFO"))
+            elif state == "offline":
+                self.root.after(0, lambda: self.log(f"曲库文件夹不可访问，保留原有记录: {path}", "WARNING"))
+            elif data["added"] or data["updated"] or data["removed"]:
+                self.root.after(0, lambda: self.log(
+                    f"曲库扫描 {name}：新增 {data['added']} 首, 更新 {data['updated']} 首, "
+                    f"移除 {data['removed']} 首", "INFO"))
+
+        def finished(results):
+            changed = any(stats and (stats["added"] or stats["updated"] or stats["removed"] or stats["lyrics"])
+                          for stats in results.values())
+            if changed or render:
+                self.root.after(0, self.render_local_music)
+            # 两个扫描都是增量的，只处理索引中新增或修改过的文件
+            self.root.after(0, lambda: self.start_loudness_scan(quiet=True))
+            self.root.after(0, lambda: self.start_integrity_scan(quiet=True))
+
+        return self.library_scanner.start(roots, progress, finished)
+
+    def start_library_watcher(self):
+        """开始监听曲库文件夹（每个文件夹只启动一次，不存在的文件夹跳过）"""
+        for path in self.all_roots():
+            if path in self.library_watchers or not os.path.isdir(path):
+                continue
+            # 其他文件夹（U盘、网络文件夹）轮询时间隔更长，少访问磁盘
+            primary = normalize_root(path) == normalize_root(self.download_dir)
+            watcher = DirectoryWatcher(
+                path, lambda changed, renames, overflow, path=path:
+                    self.on_library_files_changed(path, changed, renames, overflow),
+                poll_interval=0.5 if primary else 2.0,
+                full_scan_interval=10.0 if primary else 60.0)
+            watcher.start()
+            self.library_watchers[path] = watcher
+
+    def stop_library_watcher(self, path):
+        watcher = self.library_watchers.pop(path, None)
+        if watcher is not None:
+            watcher.stop()
+
+    def on_library_files_changed(self, directory, changed, renames, overflow):
+        """曲库文件夹有变化（监听线程）：只更新涉及的歌曲，再刷新列表"""
+        try:
+            if overflow:
+                self.library.refresh(directory)
+            else:
+                names = set(os.path.splitext(f)[0] for f in changed)
+                for old, new in renames:
+                    old_name, old_ext = os.path.splitext(old)
+                    new_name, new_ext = os.path.splitext(new)
+                    # MP3改名时保留已解析的信息，再按新名字核对（歌词是否跟着改名）
+                    if old_ext == new_ext == ".mp3" and self.library.rename(directory, old_name, new_name):
+                        names.add(new_name)
+                        # 歌词库中的歌词跟着改名
+                        root = self.library.root_id(directory)
+                        self.lyrics_store.rename(self.library.track_id(root, old_name),
+                                                 self.library.track_id(root, new_name))
+                    else:
+                        names.update((old_name, new_name))
+                self.library.update_files(directory, names)
+        except Exception as e:
+            print(f"Library watch error: {e}")
+            return
+        self.root.after(0, self.render_local_music)
+
+    def render_local_music(self):
+        """按曲库索引显示本地音乐列表（虚拟列表，只显示可见的行）"""
+        # 所有文件夹的歌曲合并为一个列表（索引中已按名称排序），行ID为歌曲ID
+        self.tracks = TrackStore.from_rows(self.library.rows())
+        self.tracks.set_flag(self.lyrics_store.ids(), FLAG_LRC)
+        self.playlist.set_songs(self.tracks.ids)
+
+        self.track_count_label.config(text=f"{len(self.tracks)} 首")
+        self.tree_playing = self.current_playing
+        self.music_list.set_items(range(len(self.tracks)))
+        if self.tracks.ids != self.search_index_ids:
+            self.search_index_ids = self.tracks.ids
+            self.update_search_index(dict(zip(self.tracks.ids, self.tracks.names)))
+
+    def sort_tracks(self, column, items):
+        """虚拟列表的排序：表头列对应曲库的列"""
+        columns = {"name": "name", "status": "lyrics", "size": "size"}
+        return self.tracks.sort(columns[column], items)
+
+    def update_search_index(self, names):
+        """后台按曲库增删搜索索引（names: 歌曲ID -> 歌曲名，只处理变化的歌曲），完成后重新应用当前搜索"""
+        def worker():
+            with self.search_lock:
+                added, removed = self.search_index.update(names)
+            if added or removed:
+                self.root.after(0, self.on_search_index_updated)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_search_index_updated(self):
+        """搜索索引更新完成（Tk线程）：正在搜索时刷新结果"""
+        if self.search_var.get().strip():
+            self.apply_search()
+
+    def schedule_search(self, delay=50):
+        """输入变化后稍等再搜索，连续输入只搜索一次"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(delay, self.apply_search)
+
+    def apply_search(self):
+        """按搜索框过滤列表"""
+        self.search_job = None
+        # 索引正在后台更新时稍后再试
+        if not self.search_lock.acquire(blocking=False):
+            self.schedule_search(100)
+            return
+        try:
+            result = self.search_index.search(self.search_var.get())
+        finally:
+            self.search_lock.release()
 
-        if not os.path.exists(self.download_dir):
+        self.music_list.set_filter(result)
+        if result is None:
+            self.track_count_label.config(text=f"{len(self.tracks)} 首")
+        else:
+            self.track_count_label.config(text=f"{len(result)}/{len(self.tracks)} 首")
+
+    def sort_music_list(self, column):
+        """按列排序（再次点击切换升降序）"""
+        self.music_list.sort(column)
+        titles = {"name": "歌曲名称", "status": "状态", "size": "文件大小"}
+        for col, title in titles.items():
+            if col == column:
+                title += " ▼" if self.music_list.sort_reverse else " ▲"
+            self.music_tree.heading(col, text=title)
+
+    def on_tree_key(self, event):
+        """输入字母跳转到该字母开头的歌曲（1秒内连续输入按前缀匹配）"""
+        char = event.char
+        if not char or not char.isprintable() or char.isspace():
             return
 
-        # 获取所有MP3文件
-        self.total_files = sorted([f for f in os.listdir(self.download_dir) if f.endswith('.mp3')])
+        now = time.time()
+        if now - self.jump_time > 1.0:
+            self.jump_prefix = ""
+        self.jump_time = now
+        self.jump_prefix += char.lower()
+
+        index = self.music_list.find("name", self.jump_prefix)
+        if index is None:
+            return "break"
+
+        self.music_list.show_index(index)
+        song = self.tracks.ids[self.music_list.item_at(index)]
+        self.music_tree.selection_set(song)
+        self.music_tree.focus(song)
+        return "break"
+
+    def track_row(self, track):
+        """一首歌（Track记录）在列表中的 (values, tags)"""
+        name = track.name
+        song = track.id
+
+        # 检查是否有歌词（文件不完整时优先提示）
+        if track.broken:
+            status = "⚠ 文件不完整"
+        else:
+            status = "✓ 有歌词" if track.has_lrc else "✗ 无歌词"
+
+        # 文件大小
+        size_str = f"{track.size / 1024 / 1024:.2f} MB"
+
+        # 判断是否正在播放
+        if self.current_playing == song and self.is_playing:
+            # 正在播放,不可删除；添加标签突出显示
+            return (name, status, size_str, "⏸️ 暂停", "🚫 禁止"), ('playing',)
+        if self.current_playing == song:
+            # 暂停状态,不可删除
+            return (name, status, size_str, "▶️ 继续", "🚫 禁止"), ('playing',)
+        return (name, status, size_str, "▶️ 播放", "🗑️ 删除"), ()
+
+    def refresh_play_state(self):
+        """播放状态变化：只更新原来和现在正在播放的两行"""
+        self.music_list.refresh_rows({self.tree_playing, self.current_playing})
+        self.tree_playing = self.current_playing
+
+    def open_download_folder(self):
+        """打开下载文件夹"""
+        if os.path.exists(self.download_dir):
+            subprocess.Popen(f'explorer "{self.download_dir}"')
+        else:
+            messagebox.showinfo("提示", "下载文件夹不存在")
+
+    def manage_lyrics_store(self):
+        """歌词库：开关、从 .lrc 文件导入、导出为 .lrc 文件"""
+        dialog = Toplevel(self.root)
+        dialog.title("歌词库")
+        dialog.geometry("420x240")
+        dialog.resizable(False, False)
+        dialog.configure(bg=self.bg_color)
+        dialog.transient(self.root)
+
+        count_label = Label(
+            dialog,
+            text=f"歌词库中有 {len(self.lyrics_store)} 首歌词",
+            font=("Microsoft YaHei UI", 11, "bold"),
+            bg=self.bg_color
+        )
+        count_label.pack(pady=(20, 10))
+
+        enabled = BooleanVar(value=self.use_lyrics_store)
+
+        def toggle():
+            self.use_lyrics_store = enabled.get()
+            self.save_config()
 
-        # 计算总页数
-        total_pages = max(1, (len(self.total_files) + self.page_size - 1) // self.page_size)
+        Checkbutton(
+            dialog,
+            text="新下载的歌词存入歌词库（不再生成 .lrc 文件）",
+            variable=enabled,
+            command=toggle,
+            font=("Microsoft YaHei UI", 10),
+            bg=self.bg_color,
+            activebackground=self.bg_color
+        ).pack(pady=5)
 
-        # 确保当前页在有效范围内
-        self.current_page = max(0, min(self.current_page, total_pages - 1))
+        def lrc_items(only_existing):
+            items = []
+            for track in self.library.tracks():
+                if only_existing and not track["has_lrc"]:
+                    continue
+                items.append((track["id"], track["path"][:-4] + ".lrc"))
+            return items
 
-        # 更新分页标签
-        self.page_label.config(text=f"{self.current_page + 1}/{total_pages}")
+        def run(action, message):
+            # 后台导入/导出，完成后刷新列表
+            def worker():
+                try:
+                    count = action()
+                except Exception as e:
+                    self.root.after(0, lambda error=e: self.log(f"歌词库操作失败: {error}", "ERROR"))
+                    return
+                self.root.after(0, lambda: self.log(message.format(count), "SUCCESS"))
+                self.root.after(0, self.render_local_music)
+                self.root.after(0, update_count)
 
-        # 计算当前页的文件范围
-        start_idx = self.current_page * self.page_size
-        end_idx = min(start_idx + self.page_size, len(self.total_files))
+            threading.Thread(target=worker, daemon=True).start()
 
-        files = self.total_files[start_idx:end_idx]
+        def update_count():
+            if dialog.winfo_exists():
+                count_label.config(text=f"歌词库中有 {len(self.lyrics_store)} 首歌词")
 
-        for file in files:
-            name = file[:-4]  # 去掉.mp3扩展名
-            lrc_file = os.path.join(self.download_dir, f"{name}.lrc")
+        def import_files():
+            remove = messagebox.askyesno("导入歌词", "导入后删除原来的 .lrc 文件吗？", parent=dialog)
+            items = lrc_items(True)
+            run(lambda: self.lyrics_store.import_files(items, remove), "已导入 {} 首歌词到歌词库")
 
-            # 检查是否有歌词
-            status = "✓ 有歌词" if os.path.exists(lrc_file) else "✗ 无歌词"
+        def export_files():
+            items = lrc_items(False)
+            run(lambda: self.lyrics_store.export_files(items), "已导出 {} 个 .lrc 文件")
 
-            # 获取文件大小
-            file_path = os.path.join(self.download_dir, file)
-            size = os.path.getsize(file_path)
-            size_str = f"{size / 1024 / 1024:.2f} MB"
+        btn_frame = Frame(dialog, bg=self.bg_color)
+        btn_frame.pack(pady=20)
 
-            # 判断是否正在播放
-            if self.current_playing == name and self.is_playing:
-                action = "⏸️ 暂停"
-                delete_action = "🚫 禁止"  # 正在播放,不可删除
-                # 添加标签突出显示正在播放的歌曲
-                self.music_tree.insert("", END, values=(name, status, size_str, action, delete_action), tags=('playing',))
-            elif self.current_playing == name and not self.is_playing:
-                action = "▶️ 继续"
-                delete_action = "🚫 禁止"  # 暂停状态,不可删除
-                # 添加标签突出显示暂停的歌曲
-                self.music_tree.insert("", END, values=(name, status, size_str, action, delete_action), tags=('playing',))
-            else:
-                action = "▶️ 播放"
-                delete_action = "🗑️ 删除"
-                self.music_tree.insert("", END, values=(name, status, size_str, action, delete_action))
-
-    def prev_page(self):
-        """上一页"""
-        if self.current_page > 0:
-            self.current_page -= 1
-            self.refresh_local_music()
+        Button(
+            btn_frame,
+            text="导入 .lrc 文件",
+            font=("Microsoft YaHei UI", 10),
+            bg=self.primary_color,
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            width=14,
+            command=import_files
+        ).pack(side=LEFT, padx=5)
+
+        Button(
+            btn_frame,
+            text="导出为 .lrc 文件",
+            font=("Microsoft YaHei UI", 10),
+            bg="#3498db",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            width=14,
+            command=export_files
+        ).pack(side=LEFT, padx=5)
+
+    def manage_library_roots(self):
+        """管理曲库文件夹：下载文件夹之外，可以添加其他文件夹（如移动硬盘、网络盘）"""
+        dialog = Toplevel(self.root)
+        dialog.title("曲库文件夹")
+        dialog.geometry("520x320")
+        dialog.configure(bg=self.bg_color)
+        dialog.transient(self.root)
 
-    def next_page(self):
-        """下一页"""
-        total_pages = max(1, (len(self.total_files) + self.page_size - 1) // self.page_size)
-        if self.current_page < total_pages - 1:
-            self.current_page += 1
+        Label(
+            dialog,
+            text=f"下载文件夹: {self.download_dir}",
+            font=("Microsoft YaHei UI", 9),
+            bg=self.bg_color,
+            fg=self.text_secondary,
+            anchor=W
+        ).pack(fill=X, padx=15, pady=(15, 5))
+
+        listbox = Listbox(dialog, font=("Microsoft YaHei UI", 10), relief=FLAT)
+        listbox.pack(fill=BOTH, expand=True, padx=15)
+        for path in self.library_roots:
+            listbox.insert(END, path)
+
+        def add_root():
+            path = filedialog.askdirectory(parent=dialog, title="添加曲库文件夹")
+            if not path:
+                return
+            path = os.path.abspath(path)
+            if normalize_root(path) in (normalize_root(p) for p in self.all_roots()):
+                messagebox.showinfo("提示", "该文件夹已在曲库中", parent=dialog)
+                return
+            self.library_roots.append(path)
+            listbox.insert(END, path)
+            self.save_config()
+            self.log(f"添加曲库文件夹: {path}", "INFO")
             self.refresh_local_music()
 
-    def open_download_folder(self):
-        """打开下载文件夹"""
-        if os.path.exists(self.download_dir):
-            subprocess.Popen(f'explorer "{self.download_dir}"')
-        else:
-            messagebox.showinfo("提示", "下载文件夹不存在")
+        def remove_root():
+            selection = listbox.curselection()
+            if not selection:
+                return
+            path = self.library_roots.pop(selection[0])
+            listbox.delete(selection[0])
+            self.save_config()
+            self.stop_library_watcher(path)
+            self.library.remove_root(path)
+            self.log(f"移除曲库文件夹: {path}", "INFO")
+            self.render_local_music()
+
+        btn_frame = Frame(dialog, bg=self.bg_color)
+        btn_frame.pack(pady=10)
+
+        Button(
+            btn_frame,
+            text="添加",
+            font=("Microsoft YaHei UI", 10),
+            bg=self.primary_color,
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            width=10,
+            command=add_root
+        ).pack(side=LEFT, padx=5)
+
+        Button(
+            btn_frame,
+            text="移除",
+            font=("Microsoft YaHei UI", 10),
+            bg="#95a5a6",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            width=10,
+            command=remove_root
+        ).pack(side=LEFT, padx=5)
 
     def get_usb_drives(self):
         """检测所有U盘驱动器"""
@@ -1007,9 +1647,27 @@ class MusicDownloaderGUI:
         target_dir = os.path.join(target_drive, "马赫破音乐")
         os.makedirs(target_dir, exist_ok=True)
 
-        # 复制所有音乐文件
-        files = [f for f in os.listdir(self.download_dir)
-                if f.endswith('.mp3') or f.endswith('.lrc')]
+        # 复制所有曲库文件夹中的音乐文件（按当前的曲库索引，文件监听和后台扫描会保持它最新）
+        # 都复制到同一个文件夹：不同文件夹中的同名歌曲只复制一首（下载文件夹优先），其余计为跳过
+        download_dir = normalize_root(self.download_dir)
+        tracks = sorted(self.library.tracks(),
+                        key=lambda t: normalize_root(os.path.dirname(t["path"])) != download_dir)
+        files = []
+        names = set()
+        skipped = 0
+        for track in tracks:
+            key = track["name"].lower()
+            if key in names:
+                skipped += 1
+                continue
+            names.add(key)
+            files.append(track["path"])
+            if track["has_lrc"]:
+                files.append(track["path"][:-4] + ".lrc")
+
+        # 歌词库中的歌词作为一个文件复制
+        if len(self.lyrics_store):
+            files.append(self.lyrics_store.db_path)
 
         if not files:
             messagebox.showinfo("提示", "没有音乐文件可复制")
@@ -1052,13 +1710,17 @@ class MusicDownloaderGUI:
             copied = 0
             errors = 0
 
-            for i, file in enumerate(files):
+            for i, src in enumerate(files):
+                file = os.path.basename(src)
                 try:
-                    src = os.path.join(self.download_dir, file)
                     dst = os.path.join(target_dir, file)
 
-                    # 如果目标文件存在,覆盖
-                    shutil.copy2(src, dst)
+                    if src == self.lyrics_store.db_path:
+                        # 歌词库可能正在使用，按SQLite备份方式复制
+                        self.lyrics_store.backup(dst)
+                    else:
+                        # 如果目标文件存在,覆盖
+                        shutil.copy2(src, dst)
                     copied += 1
 
                     # 更新进度
@@ -1075,7 +1737,8 @@ class MusicDownloaderGUI:
             self.root.after(0, lambda c=copied, e=errors:
                 messagebox.showinfo("复制完成",
                     f"成功复制 {c} 个文件\n"
-                    f"失败 {e} 个文件\n\n"
+                    f"失败 {e} 个文件\n"
+                    f"跳过同名歌曲 {skipped} 首\n\n"
                     f"目标位置: {target_dir}"))
 
         thread = threading.Thread(target=copy_thread)
@@ -1095,7 +1758,7 @@ class MusicDownloaderGUI:
             return
 
         item = self.music_tree.item(row_id)
-        song_name = item['values'][0]
+        song_name = row_id
 
         # 检查是否点击了操作列（第4列）
         if column == "#4":
@@ -1144,7 +1807,7 @@ class MusicDownloaderGUI:
 
         Label(
             dialog,
-            text=f"确定要删除以下歌曲吗?\n\n{song_name}",
+            text=f"确定要删除以下歌曲吗?\n\n{self.song_title(song_name)}",
             font=("Microsoft YaHei UI", 10),
             bg=self.bg_color,
             justify=CENTER
@@ -1170,18 +1833,18 @@ class MusicDownloaderGUI:
                 time.sleep(0.3)
 
             # 删除MP3和LRC文件
-            mp3_path = os.path.join(self.download_dir, f"{song_name}.mp3")
-            lrc_path = os.path.join(self.download_dir, f"{song_name}.lrc")
+            mp3_path, lrc_path = self.song_paths(song_name)
 
             try:
                 if os.path.exists(mp3_path):
                     os.remove(mp3_path)
                 if os.path.exists(lrc_path):
                     os.remove(lrc_path)
+                self.lyrics_store.delete(song_name)
 
                 dialog.destroy()
                 self.refresh_local_music()
-                messagebox.showinfo("删除成功", f"已删除: {song_name}")
+                messagebox.showinfo("删除成功", f"已删除: {self.song_title(song_name)}")
             except PermissionError:
                 dialog.destroy()
                 messagebox.showerror("删除失败",
@@ -1235,28 +1898,60 @@ class MusicDownloaderGUI:
         if not selection:
             return
 
-        item = self.music_tree.item(selection[0])
-        song_name = item['values'][0]
-
-        self.play_music(song_name)
+        self.play_music(selection[0])
 
     def get_next_song(self):
-        """获取下一首歌曲"""
-        if not self.current_playing or not self.total_files:
+        """获取下一首歌曲（插队队列优先，其次按顺序/随机顺序）"""
+        if not self.current_playing:
             return None
+        return self.playlist.peek_next()
+
+    def play_next_song(self):
+        """下一首"""
+        next_song = self.playlist.advance()
+        if next_song:
+            self.play_music(next_song)
+
+    def play_previous_song(self):
+        """上一首"""
+        prev_song = self.playlist.previous()
+        if prev_song:
+            self.play_music(prev_song)
+
+    def queue_play_next(self, song_name):
+        """下一首播放"""
+        self.playlist.play_next(song_name)
+        self.log(f"下一首播放: {song_name}", "INFO")
+        self.requeue_next_track()
+
+    def queue_add(self, song_name):
+        """添加到播放队列"""
+        self.playlist.add_to_queue(song_name)
+        self.log(f"已添加到播放队列: {song_name}", "INFO")
+        self.requeue_next_track()
+
+    def requeue_next_track(self):
+        """下一首变化后重新预加载并排队"""
+        if self.current_playing and self.stream is None:
+            next_song = self.get_next_song()
+            if not self.queued_track or self.queued_track.song != next_song:
+                self.prepare_next_track()
+
+    def show_tree_menu(self, event):
+        """右键菜单：下一首播放 / 添加到播放队列"""
+        row_id = self.music_tree.identify_row(event.y)
+        if not row_id:
+            return
 
+        song_name = row_id
+        menu = Menu(self.root, tearoff=0)
+        menu.add_command(label="▶️ 播放", command=lambda: self.play_music(song_name))
+        menu.add_command(label="⏭️ 下一首播放", command=lambda: self.queue_play_next(song_name))
+        menu.add_command(label="➕ 添加到播放队列", command=lambda: self.queue_add(song_name))
         try:
-            # 找到当前歌曲在总列表中的索引
-            current_file = f"{self.current_playing}.mp3"
-            current_index = self.total_files.index(current_file)
-
-            # 获取下一首
-            next_index = (current_index + 1) % len(self.total_files)
-            next_file = self.total_files[next_index]
-
-            return next_file[:-4]  # 去掉.mp3扩展名
-        except (ValueError, IndexError):
-            return None
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
 
     def play_music(self, song_name):
         """播放音乐"""
@@ -1267,8 +1962,7 @@ class MusicDownloaderGUI:
         # 确保pygame已初始化
         self._init_pygame()
 
-        mp3_path = os.path.join(self.download_dir, f"{song_name}.mp3")
-        lrc_path = os.path.join(self.download_dir, f"{song_name}.lrc")
+        mp3_path, lrc_path = self.song_paths(song_name)
 
         if not os.path.exists(mp3_path):
             messagebox.showerror("错误", "音乐文件不存在")
@@ -1276,69 +1970,482 @@ class MusicDownloaderGUI:
 
         try:
             # 停止当前播放的音乐（如果有）
+            # 先唤醒可能在等待下载数据的音频线程，再停止
+            self.end_stream()
             if self.current_playing:
                 pygame.mixer.music.stop()
+            self.queued_track = None
 
             # 清除歌词显示
-            self.lrc_text.config(state=NORMAL)
-            self.lrc_text.delete(1.0, END)
-            self.lrc_text.insert(END, "加载中...", "future")
-            self.lrc_text.config(state=DISABLED)
+            self.clear_lyrics_display("加载中...")
+
+            self.playlist.set_current(song_name)
 
-            # 更新桌面歌词
-            self.update_desktop_lyric(f"正在播放: {song_name}")
+            # 已预加载的下一首直接使用，否则现场读取时长和歌词
+            track = self.prepared_track
+            if track is None or track.song != song_name:
+                track = prepare_track(song_name, mp3_path, lrc_path, preread=False,
+                                      length=self.library.duration(song_name),
+                                      load_lyrics=lambda path: self.load_lyrics(song_name, path))
+            self.prepared_track = None
 
             # 加载音乐
             pygame.mixer.music.load(mp3_path)
+            self.fading_in = False
+            self.set_music_volume(1.0)
+            pygame.mixer.music.play()
 
-            # 获取音乐长度（使用mutagen或pygame.mixer.Sound）
-            try:
-                from mutagen.mp3 import MP3
-                audio = MP3(mp3_path)
-                self.music_length = int(audio.info.length * 1000)  # 转换为毫秒
-            except:
-                # 如果mutagen不可用，使用估算值
-                self.music_length = 180000  # 默认3分钟
+            self.activate_track(track, 0)
 
-            pygame.mixer.music.play()
+        except Exception as e:
+            messagebox.showerror("错误", f"播放失败: {str(e)}")
 
-            self.current_playing = song_name
-            self.is_playing = True
-            self.now_playing_label.config(text=f"正在播放: {song_name}")
+    def activate_track(self, track, start_ms):
+        """切换界面和状态到指定歌曲（音频已经在播放）"""
+        # 更新桌面歌词
+        self.update_desktop_lyric(f"正在播放: {self.song_title(track.song)}")
 
-            # 重置进度条UI
-            self.update_progress_ui(0)
+        # 如果mutagen不可用，使用估算值（默认3分钟）
+        self.music_length = track.length or 180000
+        self.music_length_known = track.length is not None
 
-            # 加载歌词
-            if os.path.exists(lrc_path):
-                with open(lrc_path, 'r', encoding='utf-8') as f:
-                    lrc_content = f.read()
-                self.current_lrc = parse_lrc(lrc_content)
-            else:
-                self.current_lrc = []
-                self.lrc_text.config(state=NORMAL)
-                self.lrc_text.delete(1.0, END)
-                self.lrc_text.insert(END, "暂无歌词", "future")
-                self.lrc_text.config(state=DISABLED)
-                # 桌面歌词也显示暂无歌词
-                self.update_desktop_lyric("暂无歌词")
-
-            # 启动歌词同步线程
-            if self.play_thread and self.play_thread.is_alive():
-                pass
-            else:
-                self.play_thread = threading.Thread(target=self.update_lyrics)
-                self.play_thread.daemon = True
-                self.play_thread.start()
+        # 响度均衡（扫描时已算好，这里只查表）
+        self.track_gain = self.track_gain_for(track.mp3_path)
+        self.apply_volume()
+        self.position.start(start_ms)
 
-            # 刷新列表显示，更新按钮状态
-            self.refresh_local_music()
+        self.current_playing = track.song
+        self.is_playing = True
+        self.now_playing_label.config(text=f"正在播放: {self.song_title(track.song)}")
 
-            # 保存配置
-            self.save_config()
+        # 重置进度条UI，显示波形（边下边播的文件还不完整，不计算波形）
+        self.load_waveform(None if self.stream else track.mp3_path)
+        self.update_progress_ui(0)
+
+        # 歌词：预加载时已在后台解析好的直接使用，否则现场读取（歌词库按主键读取，.lrc 按修改时间缓存）
+        if track.lrc_loaded:
+            lrc_doc = track.lrc
+        else:
+            lrc_doc = self.load_lyrics(track.song, track.lrc_path)
+        if lrc_doc is not None:
+            self.current_lrc = lrc_doc
+            self.update_lyrics_display(start_ms)
+        else:
+            self.current_lrc = []
+            self.clear_lyrics_display("暂无歌词")
+            # 桌面歌词也显示暂无歌词
+            self.update_desktop_lyric("暂无歌词")
+
+        # 启动播放时钟
+        self.last_time_text = None
+        self.last_progress_x = None
+        self.last_raw_pos = None
+        self.schedule_clock()
+
+        # 更新列表中正在播放的行
+        self.refresh_play_state()
+
+        # 保存配置
+        self.save_config()
+
+        # 预加载下一首
+        self.prepare_next_track()
+
+    def prepare_next_track(self):
+        """后台预加载下一首（文件页、时长、歌词），完成后交给pygame排队"""
+        if not self.loop_enabled:
+            return
+
+        next_song = self.get_next_song()
+        if not next_song:
+            return
+
+        mp3_path, lrc_path = self.song_paths(next_song)
+        current = self.current_playing
+        length = self.library.duration(next_song)
 
+        def worker():
+            track = prepare_track(next_song, mp3_path, lrc_path, length=length,
+                                  load_lyrics=lambda path: self.load_lyrics(next_song, path))
+            self.root.after(0, lambda: self.on_track_prepared(track, current))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_track_prepared(self, track, for_song):
+        """下一首准备完成：排队到当前歌曲之后"""
+        if self.current_playing != for_song or not self.loop_enabled:
+            return
+        # 准备期间下一首已变化（插队、切换随机）
+        if track.song != self.get_next_song():
+            return
+
+        self.prepared_track = track
+        # 顺便提前计算下一首的波形
+        self.waveform.request(track.mp3_path)
+        try:
+            pygame.mixer.music.queue(track.mp3_path)
+            self.queued_track = track
         except Exception as e:
-            messagebox.showerror("错误", f"播放失败: {str(e)}")
+            print(f"Queue error: {e}")
+
+    def advance_to_queued(self, raw_pos):
+        """pygame已经无缝切换到排队的下一首，同步界面"""
+        track = self.queued_track
+        self.queued_track = None
+        self.prepared_track = None
+
+        if not self.loop_enabled:
+            # 排队后关闭了循环：停在这里
+            self.stop_music()
+            return
+
+        self.fading_in = self.crossfade_ms > 0
+        self.playlist.advance(track.song)
+        self.activate_track(track, raw_pos)
+
+    def set_music_volume(self, volume):
+        """设置音量包络0~1（变化很小时不调用pygame），实际音量再乘以响度均衡系数"""
+        if volume in (0.0, 1.0) or abs(volume - self.music_volume) >= 0.01:
+            if volume != self.music_volume:
+                self.music_volume = volume
+                self.apply_volume()
+
+    def apply_volume(self):
+        """把 包络 × 响度均衡系数 设置到pygame"""
+        try:
+            pygame.mixer.music.set_volume(self.music_volume * self.track_gain)
+        except Exception:
+            pass
+
+    def track_gain_for(self, mp3_path):
+        """当前歌曲的音量系数：查扫描结果，没有结果时为1.0（pygame音量不能大于1，只会降低过响的歌曲）"""
+        if not self.normalize_volume:
+            return 1.0
+        gain_db = self.library.gain_for(mp3_path)
+        if gain_db is None:
+            return 1.0
+        return min(1.0, 10 ** (gain_db / 20.0))
+
+    def start_loudness_scan(self, quiet=False):
+        """扫描曲库响度（只分析新增或修改过的歌曲）"""
+        if self.loudness_scanner.running:
+            if not quiet:
+                messagebox.showinfo("提示", "响度扫描正在进行")
+            return
+        if not os.path.exists(self.download_dir):
+            return
+
+        # 按当前索引扫描（新下载的歌曲由后台曲库扫描加入索引，扫描完成后会再次调用这里）
+        paths = self.library.paths()
+        state = {"reported": 0}
+
+        def progress(done, total, rate):
+            # 每10%报告一次
+            step = max(1, total // 10)
+            if done == total or done - state["reported"] >= step:
+                state["reported"] = done
+                self.root.after(0, lambda: self.log(
+                    f"响度扫描 [{done}/{total}] {rate:.2f} 首/秒", "INFO"))
+
+        def finished(summary):
+            self.root.after(0, lambda: self.on_loudness_scan_finished(summary, quiet))
+
+        if not quiet:
+            self.log("开始响度扫描...", "INFO")
+        self.loudness_scanner.start(paths, progress, finished)
+
+    def on_loudness_scan_finished(self, summary, quiet):
+        """响度扫描完成（Tk线程）"""
+        if "error" in summary:
+            self.log(f"响度扫描失败: {summary['error']}", "ERROR")
+            return
+        if summary["analyzed"] or summary["failed"] or not quiet:
+            self.log(f"响度扫描完成：分析 {summary['analyzed']} 首, 跳过 {summary['skipped']} 首, "
+                     f"失败 {summary['failed']} 首, 耗时 {summary['elapsed']:.1f}s, "
+                     f"{summary['tracks_per_sec']:.2f} 首/秒", "SUCCESS")
+
+        # 当前歌曲刚分析完时立即应用
+        if self.current_playing and self.stream is None:
+            mp3_path = self.song_paths(self.current_playing)[0]
+            self.track_gain = self.track_gain_for(mp3_path)
+            self.apply_volume()
+
+    def start_integrity_scan(self, quiet=False):
+        """检查曲库中的MP3是否完整（只检查新增或修改过的文件）"""
+        if self.integrity_scanner.running:
+            if not quiet:
+                messagebox.showinfo("提示", "完整性检查正在进行")
+            return
+
+        paths = self.library.paths()
+        state = {"reported": 0}
+
+        def progress(done, total):
+            # 每10%报告一次
+            step = max(1, total // 10)
+            if done == total or done - state["reported"] >= step:
+                state["reported"] = done
+                self.root.after(0, lambda: self.log(f"完整性检查 [{done}/{total}]", "INFO"))
+
+        def finished(summary):
+            self.root.after(0, lambda: self.on_integrity_scan_finished(summary, quiet))
+
+        if not quiet:
+            self.log("开始完整性检查...", "INFO")
+        self.integrity_scanner.start(paths, progress, finished)
+
+    def on_integrity_scan_finished(self, summary, quiet):
+        """完整性检查完成（Tk线程）：记录损坏的歌曲，下载文件夹中的重新加入待下载列表；
+        时长和歌词对不上的只提示"""
+        if "error" in summary:
+            self.log(f"完整性检查失败: {summary['error']}", "ERROR")
+            return
+        broken = summary["broken"]
+        if summary["checked"] or summary["failed"] or not quiet:
+            self.log(f"完整性检查完成：检查 {summary['checked']} 首, 跳过 {summary['skipped']} 首, "
+                     f"损坏 {len(broken)} 首, 失败 {summary['failed']} 首, 耗时 {summary['elapsed']:.1f}s",
+                     "WARNING" if broken else "SUCCESS")
+        for path, result in summary.get("warnings", ()):
+            self.log(f"提示: {os.path.basename(path)[:-4]} - {result['detail']}（歌词可能是其他版本）", "INFO")
+        if not broken:
+            return
+
+        requeue = []
+        download_dir = normalize_root(self.download_dir)
+        for path, result in broken:
+            name = os.path.basename(path)[:-4]
+            self.log(f"⚠ {name} - {result['detail']}", "WARNING")
+            if normalize_root(os.path.dirname(path)) != download_dir:
+                continue
+            if self.library.add_requeue(path) >= MAX_REQUEUE:
+                self.log(f"{name} 已重新下载 {MAX_REQUEUE} 次仍不完整，不再自动加入待下载列表", "WARNING")
+                continue
+            requeue.append(name)
+        self.requeue_downloads(requeue)
+        self.render_local_music()
+
+    def requeue_downloads(self, songs):
+        """把歌曲重新加入待下载列表（已在列表中的去掉[已下载]标记）"""
+        if not songs:
+            return
+        if self.is_downloading:
+            # 下载结束时会清空列表，等这一批下载完再加入
+            self.root.after(5000, lambda: self.requeue_downloads(songs))
+            return
+        lines = [re.sub(r'\s*\[已下载\]', '', line).strip()
+                 for line in self.song_text.get(1.0, END).split('\n')]
+        lines = [line for line in lines if line]
+        added = [song for song in songs if song not in lines]
+
+        self.song_text.delete(1.0, END)
+        for song in lines + added:
+            suffix = " [已下载]" if self.is_song_downloaded(song) else ""
+            self.song_text.insert(END, f"{song}{suffix}\n")
+        self.save_todo_list()
+        self.log(f"已将 {len(songs)} 首不完整的歌曲加入待下载列表", "INFO")
+
+    def start_duplicate_scan(self):
+        """查找重复歌曲：计算新增/修改过的歌曲的指纹，再按指纹分组"""
+        if not FINGERPRINT_AVAILABLE:
+            messagebox.showerror("错误", "numpy未安装,无法计算声学指纹")
+            return
+        if self.fingerprint_scanner.running:
+            messagebox.showinfo("提示", "重复歌曲检测正在进行")
+            return
+
+        paths = self.library.paths()
+        state = {"reported": 0}
+
+        def progress(done, total):
+            # 每10%报告一次
+            step = max(1, total // 10)
+            if done == total or done - state["reported"] >= step:
+                state["reported"] = done
+                self.root.after(0, lambda: self.log(f"计算声学指纹 [{done}/{total}]", "INFO"))
+
+        def finished(summary):
+            # 仍在工作线程中：比较指纹，完成后回到Tk线程显示
+            if "error" in summary:
+                self.root.after(0, lambda: self.log(f"重复歌曲检测失败: {summary['error']}", "ERROR"))
+                return
+            try:
+                groups = find_duplicates(self.library.fingerprints())
+            except Exception as e:
+                self.root.after(0, lambda error=e: self.log(f"重复歌曲检测失败: {error}", "ERROR"))
+                return
+            self.root.after(0, lambda: self.on_duplicates_found(groups, summary))
+
+        self.log("开始查找重复歌曲...", "INFO")
+        self.fingerprint_scanner.start(paths, progress, finished)
+
+    def on_duplicates_found(self, groups, summary):
+        """重复歌曲检测完成（Tk线程）"""
+        self.log(f"重复歌曲检测完成：计算指纹 {summary['analyzed']} 首, 跳过 {summary['skipped']} 首, "
+                 f"失败 {summary['failed']} 首, 重复 {len(groups)} 组", "SUCCESS")
+        if not groups:
+            messagebox.showinfo("查找重复", "没有发现重复的歌曲")
+            return
+        self.show_duplicates_dialog(groups)
+
+    def pick_duplicate_keeper(self, tracks):
+        """一组重复歌曲中默认保留的：比特率高、有歌词、文件大、名字短的优先"""
+        return max(tracks, key=lambda t: (t["bitrate"] or 0, t["has_lrc"], t["size"], -len(t["name"])))["id"]
+
+    def show_duplicates_dialog(self, groups):
+        """重复歌曲分组：双击选择要保留的歌曲，一键删除其余的"""
+        dialog = Toplevel(self.root)
+        dialog.title("重复歌曲")
+        dialog.geometry("760x460")
+        dialog.configure(bg=self.bg_color)
+        dialog.transient(self.root)
+
+        Label(
+            dialog,
+            text=f"发现 {len(groups)} 组重复歌曲（双击选择要保留的一首）",
+            font=("Microsoft YaHei UI", 11, "bold"),
+            bg=self.bg_color
+        ).pack(pady=(15, 5))
+
+        columns = ("keep", "bitrate", "size", "lyrics", "folder")
+        tree = ttk.Treeview(dialog, columns=columns, height=14)
+        tree.heading("#0", text="歌曲名称")
+        tree.heading("keep", text="保留")
+        tree.heading("bitrate", text="比特率")
+        tree.heading("size", text="文件大小")
+        tree.heading("lyrics", text="歌词")
+        tree.heading("folder", text="文件夹")
+        tree.column("#0", width=260, anchor=W)
+        tree.column("keep", width=50, anchor=CENTER)
+        tree.column("bitrate", width=80, anchor=CENTER)
+        tree.column("size", width=80, anchor=CENTER)
+        tree.column("lyrics", width=50, anchor=CENTER)
+        tree.column("folder", width=200, anchor=W)
+        tree.pack(fill=BOTH, expand=True, padx=15)
+
+        # 分组 -> 保留的歌曲ID
+        keep = {}
+        members = {}
+        for number, group in enumerate(groups):
+            tracks = []
+            for song in group:
+                track = self.library.get(song)
+                if track:
+                    track["id"] = song
+                    tracks.append(track)
+            if len(tracks) < 2:
+                continue
+            group_iid = f"group{number}"
+            keep[group_iid] = self.pick_duplicate_keeper(tracks)
+            members[group_iid] = [t["id"] for t in tracks]
+            tree.insert("", END, iid=group_iid, text=f"第 {number + 1} 组（{len(tracks)} 首）", open=True)
+            for track in tracks:
+                tree.insert(group_iid, END, iid=track["id"], text=track["name"], values=(
+                    "✓" if track["id"] == keep[group_iid] else "",
+                    f"{track['bitrate']} kbps" if track["bitrate"] else "未知",
+                    f"{track['size'] / 1024 / 1024:.2f} MB",
+                    "✓" if track["has_lrc"] else "",
+                    self.library.root_path(track["root"]) or ""))
+
+        def choose_keeper(event):
+            iid = tree.identify_row(event.y)
+            group_iid = tree.parent(iid) if iid else ""
+            if not group_iid:
+                return
+            keep[group_iid] = iid
+            for song in members[group_iid]:
+                tree.set(song, "keep", "✓" if song == iid else "")
+
+        tree.bind('<Double-Button-1>', choose_keeper)
+
+        def resolve():
+            count = sum(len(songs) - 1 for songs in members.values())
+            if not messagebox.askyesno("确认删除", f"每组保留标记的一首，删除其余 {count} 首？\n此操作不可恢复!",
+                                       parent=dialog):
+                return
+            dialog.destroy()
+            self.resolve_duplicates([(keep[g], [s for s in songs if s != keep[g]]) for g, songs in members.items()])
+
+        btn_frame = Frame(dialog, bg=self.bg_color)
+        btn_frame.pack(pady=10)
+
+        Button(
+            btn_frame,
+            text="一键处理",
+            font=("Microsoft YaHei UI", 10),
+            bg=self.error_color,
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            width=12,
+            command=resolve
+        ).pack(side=LEFT, padx=5)
+
+        Button(
+            btn_frame,
+            text="关闭",
+            font=("Microsoft YaHei UI", 10),
+            bg="#95a5a6",
+            fg="white",
+            relief=FLAT,
+            cursor="hand2",
+            width=12,
+            command=dialog.destroy
+        ).pack(side=LEFT, padx=5)
+
+    def resolve_duplicates(self, plan):
+        """plan: [(保留的歌曲ID, [删除的歌曲ID, ...]), ...]；保留的歌曲没有歌词时改用被删除歌曲的歌词"""
+        deleted = 0
+        freed = 0
+        for keeper, songs in plan:
+            keep_mp3, keep_lrc = self.song_paths(keeper)
+            for song in songs:
+                # 正在播放或暂停的歌曲不删除
+                if song == self.current_playing:
+                    self.log(f"正在播放，跳过: {self.song_title(song)}", "WARNING")
+                    continue
+                mp3_path, lrc_path = self.song_paths(song)
+                try:
+                    # 先删MP3（Windows上文件被占用时会失败），成功后再处理歌词，避免歌词对不上
+                    if os.path.exists(mp3_path):
+                        size = os.path.getsize(mp3_path)
+                        os.remove(mp3_path)
+                        freed += size
+                    if os.path.exists(lrc_path):
+                        if os.path.exists(keep_lrc):
+                            os.remove(lrc_path)
+                        else:
+                            os.replace(lrc_path, keep_lrc)
+                    if self.lyrics_store.has(song):
+                        if self.lyrics_store.has(keeper) or os.path.exists(keep_lrc):
+                            self.lyrics_store.delete(song)
+                        else:
+                            self.lyrics_store.rename(song, keeper)
+                    deleted += 1
+                except OSError as e:
+                    self.log(f"删除失败: {self.song_title(song)} - {e}", "ERROR")
+
+        self.log(f"重复歌曲处理完成：删除 {deleted} 首, 释放 {freed / 1024 / 1024:.1f} MB", "SUCCESS")
+        self.refresh_local_music()
+
+    def apply_crossfade(self, pos):
+        """交叉淡化：结尾淡出、由排队衔接的下一首开头淡入
+
+        pygame.mixer.music只有一条音频流，这里用音量包络包住无缝衔接点。
+        """
+        if self.crossfade_ms <= 0:
+            return
+
+        volume = 1.0
+        remaining = self.music_length - pos
+        if self.queued_track and self.music_length_known and remaining < self.crossfade_ms:
+            volume = max(0.0, remaining / self.crossfade_ms)
+        elif self.fading_in:
+            if pos < self.crossfade_ms:
+                volume = pos / self.crossfade_ms
+            else:
+                self.fading_in = False
+
+        self.set_music_volume(volume)
 
     def toggle_play_pause(self):
         """播放/暂停切换"""
@@ -1347,40 +2454,58 @@ class MusicDownloaderGUI:
 
         if self.is_playing:
             pygame.mixer.music.pause()
+            self.position.pause()
             self.is_playing = False
+            self.cancel_clock()
         else:
-            pygame.mixer.music.unpause()
+            # 缓冲中由播放时钟在数据足够后继续
+            if not self.buffering:
+                pygame.mixer.music.unpause()
+                self.position.resume()
             self.is_playing = True
+            self.schedule_clock()
 
-        # 刷新列表显示，更新按钮状态
-        self.refresh_local_music()
+        # 更新列表中正在播放的行
+        self.refresh_play_state()
 
     def stop_music(self):
         """停止播放"""
+        self.end_stream()
         if PYGAME_AVAILABLE:
             pygame.mixer.music.stop()
+            if self.queued_track:
+                # 停止时排队的歌曲可能已被启动，卸载掉
+                try:
+                    pygame.mixer.music.unload()
+                except Exception:
+                    pass
+            self.set_music_volume(1.0)
+        self.queued_track = None
+        self.prepared_track = None
+        self.fading_in = False
 
         self.is_playing = False
+        self.cancel_clock()
+        self.position.reset()
         self.current_playing = None
         self.current_lrc = []
         self.music_length = 0
         self.now_playing_label.config(text="暂无播放")
 
         # 清除歌词
-        self.lrc_text.config(state=NORMAL)
-        self.lrc_text.delete(1.0, END)
-        self.lrc_text.config(state=DISABLED)
+        self.clear_lyrics_display()
 
         # 清除桌面歌词
         self.update_desktop_lyric("暂无播放")
 
         # 重置进度条UI和时间标签
+        self.load_waveform(None)
         self.update_progress_ui(0)
         self.time_label.config(text="00:00")
         self.total_time_label.config(text="00:00")
 
-        # 刷新列表显示，更新按钮状态
-        self.refresh_local_music()
+        # 更新列表中正在播放的行
+        self.refresh_play_state()
 
     def toggle_loop(self):
         """切换循环模式"""
@@ -1389,18 +2514,38 @@ class MusicDownloaderGUI:
         # 更新按钮颜色
         self.loop_btn.config(bg="#9b59b6" if self.loop_enabled else "#95a5a6")
 
+        # 开启循环后为当前歌曲预加载下一首
+        if self.loop_enabled and self.current_playing and not self.queued_track:
+            self.prepare_next_track()
+
         status = "已开启" if self.loop_enabled else "已关闭"
         messagebox.showinfo("提示", f"循环播放{status}")
 
         # 保存配置
         self.save_config()
 
+    def toggle_shuffle(self):
+        """切换随机播放"""
+        self.shuffle_enabled = not self.shuffle_enabled
+        self.playlist.set_shuffle(self.shuffle_enabled)
+        self.shuffle_btn.config(bg="#9b59b6" if self.shuffle_enabled else "#95a5a6")
+        self.requeue_next_track()
+
+        # 保存配置
+        self.save_config()
+
     def save_config(self):
         """保存播放器配置"""
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 f.write(f"last_song={self.current_playing or ''}\n")
                 f.write(f"loop_enabled={self.loop_enabled}\n")
+                f.write(f"download_workers={self.download_workers}\n")
+                f.write(f"crossfade_ms={self.crossfade_ms}\n")
+                f.write(f"shuffle_enabled={self.shuffle_enabled}\n")
+                f.write(f"normalize_volume={self.normalize_volume}\n")
+                f.write(f"library_roots={'|'.join(self.library_roots)}\n")
+                f.write(f"use_lyrics_store={self.use_lyrics_store}\n")
         except:
             pass
 
@@ -1413,59 +2558,144 @@ class MusicDownloaderGUI:
                         line = line.strip()
                         if line.startswith('last_song='):
                             song = line.split('=', 1)[1]
-                            if song and self.is_song_downloaded(song):
+                            if song and os.path.exists(self.song_paths(song)[0]):
                                 self.current_playing = song
                         elif line.startswith('loop_enabled='):
                             self.loop_enabled = line.split('=', 1)[1] == 'True'
+                        elif line.startswith('download_workers='):
+                            self.download_workers = max(1, int(line.split('=', 1)[1]))
+                        elif line.startswith('crossfade_ms='):
+                            self.crossfade_ms = max(0, int(line.split('=', 1)[1]))
+                        elif line.startswith('shuffle_enabled='):
+                            self.shuffle_enabled = line.split('=', 1)[1] == 'True'
+                        elif line.startswith('normalize_volume='):
+                            self.normalize_volume = line.split('=', 1)[1] == 'True'
+                        elif line.startswith('library_roots='):
+                            self.library_roots = [p for p in line.split('=', 1)[1].split('|') if p]
+                        elif line.startswith('use_lyrics_store='):
+                            self.use_lyrics_store = line.split('=', 1)[1] == 'True'
         except:
             pass
 
-    def update_lyrics(self):
-        """更新歌词显示和进度条"""
-        while self.current_playing and PYGAME_AVAILABLE:
-            if not self.is_playing:
-                time.sleep(0.1)
-                continue
+    def schedule_clock(self, delay=0):
+        """安排下一次播放时钟回调（同一时间只保留一个）"""
+        self.cancel_clock()
+        if self.current_playing and self.is_playing and PYGAME_AVAILABLE:
+            self.clock_job = self.root.after(delay, self.playback_tick)
 
+    def cancel_clock(self):
+        """取消已安排的播放时钟回调"""
+        if self.clock_job is not None:
             try:
-                # 获取当前播放位置（毫秒）
-                pos = pygame.mixer.music.get_pos()
-
-                if pos < 0:  # 播放结束
-                    if self.loop_enabled:
-                        # 列表循环：播放下一首
-                        next_song = self.get_next_song()
-                        if next_song:
-                            time.sleep(0.5)  # 短暂延迟
-                            self.root.after(0, lambda s=next_song: self.play_music(s))
-                            break
-                        else:
-                            # 没有下一首，停止播放
-                            break
-                    else:
-                        # 不循环，停止播放
-                        break
-
-                # 更新进度条（如果用户没有在拖动）
-                if not self.user_seeking and self.music_length > 0:
-                    progress = pos / self.music_length
-                    self.root.after(0, lambda p=progress: self.update_progress_ui(p))
-
-                    # 更新时间标签
-                    current_time = self.format_time(pos)
-                    total_time = self.format_time(self.music_length)
-                    self.root.after(0, lambda ct=current_time:
-                                   self.time_label.config(text=ct))
-                    self.root.after(0, lambda tt=total_time:
-                                   self.total_time_label.config(text=tt))
-
-                # 更新歌词显示
-                if self.current_lrc and not self.user_seeking:
-                    self.root.after(0, lambda p=pos: self.update_lyrics_display(p))
-
-                time.sleep(0.1)
-            except:
-                break
+                self.root.after_cancel(self.clock_job)
+            except Exception:
+                pass
+            self.clock_job = None
+
+    def current_position(self):
+        """当前歌曲内的播放位置（毫秒），播放结束返回负数"""
+        if pygame.mixer.music.get_pos() < 0:
+            return -1
+        return self.position.position()
+
+    def playback_tick(self):
+        """播放时钟：一次回调内完成进度条、时间和歌词的更新，再按下一个变化点安排唤醒"""
+        self.clock_job = None
+        if not (self.current_playing and self.is_playing and PYGAME_AVAILABLE):
+            return
+
+        try:
+            raw_pos = pygame.mixer.music.get_pos()
+        except Exception:
+            return
+
+        if raw_pos < 0:  # 播放结束
+            self.on_track_end()
+            return
+
+        # get_pos在排队的歌曲开始时归零
+        if self.queued_track and self.last_raw_pos is not None and raw_pos < self.last_raw_pos:
+            self.advance_to_queued(raw_pos)
+            return
+        self.last_raw_pos = raw_pos
+
+        pos = self.position.position()
+        if self.stream is not None and self.check_stream_buffer(pos):
+            self.clock_job = self.root.after(200, self.playback_tick)
+            return
+
+        self.apply_crossfade(pos)
+        self.render_position(pos)
+        self.clock_job = self.root.after(self.next_clock_delay(pos), self.playback_tick)
+
+    def render_position(self, pos):
+        """把播放位置同步到进度条、时间标签和歌词（只在有变化时操作控件）"""
+        if not self.user_seeking and self.music_length > 0:
+            width = self.progress_canvas.winfo_width()
+            x = int(min(1.0, pos / self.music_length) * width)
+            if x != self.last_progress_x:
+                self.last_progress_x = x
+                self.update_progress_ui(min(1.0, pos / self.music_length))
+
+            time_text = self.format_time(pos)
+            if time_text != self.last_time_text:
+                self.last_time_text = time_text
+                self.time_label.config(text=time_text)
+                self.total_time_label.config(text=self.format_time(self.music_length))
+
+        if self.current_lrc and not self.user_seeking:
+            self.update_lyrics_display(pos)
+            # 桌面歌词逐字推进（宽度不变时不操作控件）
+            if self.desktop_lyric_visible() and self.lrc_display_index >= 0:
+                self.desktop_lyric.update(pos)
+
+    def next_clock_delay(self, pos):
+        """距离下一个可见变化（下一句歌词、进度条下一个像素、下一秒）的毫秒数"""
+        delay = 1000 - pos % 1000
+
+        if self.current_lrc:
+            index = self.current_lrc.index_at(pos)
+            if index + 1 < len(self.current_lrc):
+                delay = min(delay, self.current_lrc.times[index + 1] - pos)
+
+        width = self.progress_canvas.winfo_width()
+        if self.music_length > 0 and width > 0:
+            ms_per_pixel = self.music_length / width
+            next_pixel = (int(pos / ms_per_pixel) + 1) * ms_per_pixel
+            delay = min(delay, next_pixel - pos)
+
+        # 排队的下一首开始时及时切换界面；淡化期间约每40ms调整一次音量
+        if self.queued_track and self.music_length_known:
+            remaining = self.music_length - pos
+            if remaining > 0:
+                delay = min(delay, remaining)
+            if self.crossfade_ms > 0:
+                if remaining > self.crossfade_ms:
+                    delay = min(delay, remaining - self.crossfade_ms)
+                else:
+                    delay = min(delay, 40)
+        if self.fading_in:
+            delay = min(delay, 40)
+        # 桌面歌词高亮再推进1像素的时间
+        if self.current_lrc and self.desktop_lyric_visible() and self.lrc_display_index >= 0:
+            sweep_delay = self.desktop_lyric.next_change(pos)
+            if sweep_delay is not None:
+                delay = min(delay, sweep_delay)
+
+        # 边下边播时定期检查缓冲
+        if self.stream is not None and not self.stream.finished:
+            delay = min(delay, 250)
+
+        # 不低于一帧（约60fps），避免长歌曲宽进度条时过于频繁
+        return max(16, int(delay) + 1)
+
+    def on_track_end(self):
+        """当前歌曲播放结束"""
+        if self.loop_enabled:
+            # 列表循环：播放下一首
+            next_song = self.playlist.advance()
+            if next_song:
+                self.play_music(next_song)
 
     def log(self, message, level="INFO"):
         """添加日志"""
@@ -1488,6 +2718,11 @@ class MusicDownloaderGUI:
         self.log_text.see(END)
         self.log_text.config(state=DISABLED)
 
+    def log_trace_summary(self):
+        """在日志中输出本批次各阶段耗时统计"""
+        for line in self.tracer.format_summary().split("\n"):
+            self.log(line, "INFO")
+
     def load_todo_list(self):
         """加载待下载列表，并标记已下载"""
         if os.path.exists(self.todo_file):
@@ -1605,13 +2840,261 @@ class MusicDownloaderGUI:
         self.stop_btn.config(state=NORMAL)
         self.progress_bar.start(10)
 
+        if self.download_workers > 1:
+            self.start_parallel_download(songs)
+            return
+
         thread = threading.Thread(target=self.download_thread, args=(songs,))
         thread.daemon = True
         thread.start()
 
+    def start_parallel_download(self, songs):
+        """使用异步调度器并行下载"""
+        from download_orchestrator import DownloadOrchestrator
+
+        os.makedirs(self.download_dir, exist_ok=True)
+
+        self.tracer.reset()
+        self.orchestrator = DownloadOrchestrator(
+            self.download_dir,
+            driver_factory=self.create_driver,
+            browser_workers=self.download_workers,
+            mp3juice_url=self.mp3juice_url,
+            lrclib_url=self.lrclib_url,
+            tracer=self.tracer
+        )
+        self.orchestrator.start()
+
+        self.parallel_total = 0
+        self.parallel_finished = 0
+        self.parallel_success = 0
+        skipped_count = 0
+
+        for song in songs:
+            if self.is_song_downloaded(song):
+                self.log(f"⊘ {song} - 已下载，跳过", "SKIP")
+                skipped_count += 1
+                continue
+            self.orchestrator.submit(song)
+            self.parallel_total += 1
+
+        self.parallel_skipped = skipped_count
+        self.stream_btn.config(state=NORMAL)
+        self.log(f"开始并行下载 {self.parallel_total} 首歌曲（{self.download_workers} 个浏览器）...", "INFO")
+        self.root.after(100, self.poll_download_events)
+
+    def poll_download_events(self):
+        """在Tk线程中处理调度器的进度事件"""
+        orchestrator = self.orchestrator
+        if not orchestrator:
+            return
+
+        for event in orchestrator.poll_events():
+            song = event["song"]
+            status = event["status"]
+            job = orchestrator.jobs.get(event["job_id"])
+
+            if status == "browser":
+                self.log(f"[{song}] 正在搜索和转换", "INFO")
+            elif status == "mp3_progress":
+                total = event.get("total") or 0
+                if total:
+                    percent = event["bytes"] * 100 // total
+                    self.progress_label.config(text=f"正在下载: {song} {percent}%")
+                self.download_progress[song] = event
+                if self.stream and self.stream_song == song:
+                    self.stream.notify()
+                elif self.stream_pending:
+                    self.try_start_stream(song)
+            elif status == "mp3_done":
+                self.download_progress.pop(song, None)
+                if self.stream and self.stream_song == song:
+                    self.on_stream_finished(event["path"])
+            elif status == "lrc_done":
+                self.store_lyrics(self.sanitize_filename(song), event["path"])
+                if self.stream and self.stream_song == song:
+                    self.reload_stream_lyrics()
+            elif status in ("done", "failed", "timeout", "cancelled"):
+                self.download_progress.pop(song, None)
+                if self.stream and self.stream_song == song and not self.stream.finished:
+                    self.stream.mark_failed()
+                    self.log(f"边下边播中断: {song}", "WARNING")
+                self.parallel_finished += 1
+                self.tracer.song_finished(song, status == "done")
+                if status == "done" and job and job.lrc_success:
+                    self.log(f"✓ {song} - 下载完成", "SUCCESS")
+                    self.append_to_file(self.success_file, song, "MP3:成功, 歌词:成功")
+                    self.parallel_success += 1
+                elif status == "done":
+                    self.log(f"⚠ {song} - MP3成功，歌词失败", "WARNING")
+                    self.append_to_file(self.success_file, song, "MP3:成功, 歌词:失败")
+                    self.parallel_success += 1
+                elif status != "cancelled":
+                    lrc_result = "成功" if job and job.lrc_success else "失败"
+                    self.log(f"✗ {song} - 下载失败 {event.get('message', '')}（歌词:{lrc_result}）", "ERROR")
+                    self.append_to_file(self.error_file, song, f"MP3:失败, 歌词:{lrc_result}")
+
+                self.progress_label.config(
+                    text=f"已完成 [{self.parallel_finished}/{self.parallel_total}]")
+
+        if self.is_downloading and self.parallel_finished < self.parallel_total:
+            self.root.after(100, self.poll_download_events)
+            return
+
+        # 全部完成（或已停止）
+        orchestrator.shutdown(wait=False)
+        self.orchestrator = None
+
+        if self.is_downloading:
+            summary = f"下载完成！成功: {self.parallel_success}, 跳过: {self.parallel_skipped}"
+            self.log(summary, "SUCCESS")
+            self.log_trace_summary()
+            messagebox.showinfo("完成", summary)
+            self.song_text.delete(1.0, END)
+            self.save_todo_list()
+            # 曲库扫描完成后会接着做响度扫描和完整性检查
+            self.refresh_local_music()
+
+        self.is_downloading = False
+        self.reset_ui()
+
+    def request_stream_playback(self):
+        """边下边播：播放正在下载的歌曲，数据足够时立即开始"""
+        if not PYGAME_AVAILABLE:
+            messagebox.showerror("错误", "pygame未安装,无法播放音乐")
+            return
+
+        if not self.orchestrator:
+            messagebox.showinfo("提示", "边下边播需要并行下载模式（配置 download_workers 大于1）")
+            return
+
+        # 选已下载字节最多的歌曲
+        candidates = sorted(self.download_progress.items(), key=lambda kv: -kv[1]["bytes"])
+        for song, _ in candidates:
+            if self.try_start_stream(song):
+                return
+
+        self.stream_pending = True
+        self.log("边下边播：等待歌曲开始下载...", "INFO")
+
+    def try_start_stream(self, song):
+        """已缓冲足够数据时开始边下边播，返回是否已开始"""
+        event = self.download_progress.get(song)
+        if not event:
+            return False
+
+        info = mp3_stream_info(event["path"])
+        if info is None:
+            return False
+
+        offset, kbps = info
+        bytes_per_ms = kbps / 8.0
+        if event["bytes"] < offset + STREAM_START_BUFFER_MS * bytes_per_ms:
+            return False
+
+        self.play_stream(song, event["path"], event.get("total") or 0, offset, bytes_per_ms)
+        return self.stream is not None
+
+    def play_stream(self, song, part_path, total, offset, bytes_per_ms):
+        """从下载中的 .part 文件开始播放"""
+        self._init_pygame()
+
+        final_path = part_path[:-len(".part")] if part_path.endswith(".part") else part_path
+        name = os.path.basename(final_path)[:-4]
+        lrc_path = os.path.join(self.download_dir, f"{name}.lrc")
+
+        try:
+            self.end_stream()
+            if self.current_playing:
+                pygame.mixer.music.stop()
+            self.queued_track = None
+            self.prepared_track = None
+
+            self.clear_lyrics_display("加载中...")
+
+            stream = GrowingFile(part_path, final_path, total)
+            pygame.mixer.music.load(stream, "mp3")
+            self.fading_in = False
+            self.set_music_volume(1.0)
+            pygame.mixer.music.play()
+        except Exception as e:
+            self.log(f"边下边播失败: {song} - {e}", "ERROR")
+            return
+
+        self.stream = stream
+        self.stream_song = song
+        self.stream_offset = offset
+        self.stream_bytes_per_ms = bytes_per_ms
+        self.stream_pending = False
+        self.buffering = False
+        self.log(f"边下边播: {song}", "INFO")
+
+        track = PreparedTrack(name, final_path, lrc_path)
+        if total:
+            track.length = int((total - offset) / bytes_per_ms)
+        self.activate_track(track, 0)
+
+    def end_stream(self):
+        """结束边下边播状态（唤醒可能在等待数据的音频线程）"""
+        if self.stream:
+            self.stream.mark_failed()
+        self.stream = None
+        self.stream_song = None
+        self.buffering = False
+
+    def on_stream_finished(self, final_path):
+        """边下边播的歌曲下载完成：改用真实时长"""
+        self.stream.mark_finished()
+        length = read_length(final_path)
+        if length:
+            self.music_length = length
+            self.music_length_known = True
+        self.last_time_text = None
+
+    def reload_stream_lyrics(self):
+        """边下边播的歌曲歌词下载完成"""
+        lrc_doc = self.load_lyrics(self.current_playing,
+                                   os.path.join(self.download_dir, f"{self.current_playing}.lrc"))
+        if lrc_doc is not None:
+            self.current_lrc = lrc_doc
+            self.update_lyrics_display(self.position.position())
+
+    def stream_buffered_ms(self, pos):
+        """播放位置之后已下载的时长（毫秒）"""
+        needed = self.stream_offset + pos * self.stream_bytes_per_ms
+        return (self.stream.available() - needed) / self.stream_bytes_per_ms
+
+    def check_stream_buffer(self, pos):
+        """边下边播缓冲检查：快追上下载时暂停，缓冲足够后继续；返回True表示正在等待数据"""
+        stream = self.stream
+        done = stream.finished or stream.failed
+        buffered = None if done else self.stream_buffered_ms(pos)
+
+        if self.buffering:
+            if done or buffered >= STREAM_RESUME_BUFFER_MS:
+                self.buffering = False
+                pygame.mixer.music.unpause()
+                self.position.resume()
+                self.now_playing_label.config(text=f"正在播放: {self.current_playing}")
+                return False
+            return True
+
+        if not done and buffered < STREAM_LOW_BUFFER_MS:
+            self.buffering = True
+            pygame.mixer.music.pause()
+            self.position.pause()
+            self.now_playing_label.config(text=f"缓冲中: {self.current_playing}")
+            return True
+
+        return False
+
     def stop_download(self):
         """停止下载"""
         self.is_downloading = False
+        if self.stream and not self.stream.finished:
+            self.stream.mark_failed()
+        if self.orchestrator:
+            self.orchestrator.shutdown(wait=False)
         if self.driver:
             try:
                 self.driver.quit()
@@ -1624,6 +3107,9 @@ class MusicDownloaderGUI:
         """重置UI状态"""
         self.start_btn.config(state=NORMAL)
         self.stop_btn.config(state=DISABLED)
+        self.stream_btn.config(state=DISABLED)
+        self.stream_pending = False
+        self.download_progress = {}
         self.progress_bar.stop()
         self.progress_label.config(text="准备就绪")
 
@@ -1632,6 +3118,7 @@ class MusicDownloaderGUI:
         try:
             self.log(f"开始下载 {len(songs)} 首歌曲...", "INFO")
             os.makedirs(self.download_dir, exist_ok=True)
+            self.tracer.reset()
 
             self.setup_driver()
 
@@ -1671,6 +3158,7 @@ class MusicDownloaderGUI:
                     self.log(f"✗ {song} - 下载失败", "ERROR")
                     self.append_to_file(self.error_file, song, "MP3:失败")
 
+                self.tracer.song_finished(song, mp3_success)
                 time.sleep(2)
 
             if self.driver:
@@ -1679,9 +3167,11 @@ class MusicDownloaderGUI:
             if self.is_downloading:
                 summary = f"下载完成！成功: {downloaded_count}, 跳过: {skipped_count}"
                 self.log(summary, "SUCCESS")
+                self.log_trace_summary()
                 self.root.after(0, lambda: messagebox.showinfo("完成", summary))
                 self.song_text.delete(1.0, END)
                 self.save_todo_list()
+                # 曲库扫描完成后会接着做响度扫描和完整性检查
                 self.root.after(0, self.refresh_local_music)
 
         except Exception as e:
@@ -1692,15 +3182,18 @@ class MusicDownloaderGUI:
 
     def setup_driver(self):
         """设置Chrome驱动（延迟导入）"""
+        self.driver = self.create_driver(self.download_dir)
+
+    def create_driver(self, download_dir):
+        """创建下载到指定目录的Chrome驱动"""
         # 延迟导入Selenium模块
         from selenium import webdriver
-        from selenium.webdriver.common.by import By
         from selenium.webdriver.chrome.options import Options
         from selenium.webdriver.chrome.service import Service
 
         chrome_options = Options()
         prefs = {
-            "download.default_directory": self.download_dir,
+            "download.default_directory": download_dir,
             "download.prompt_for_download": False,
             "download.directory_upgrade": True,
             "safebrowsing.enabled": True
@@ -1721,11 +3214,12 @@ class MusicDownloaderGUI:
         if os.path.exists(chrome_path) and os.path.exists(chromedriver_path):
             chrome_options.binary_location = chrome_path
             service = Service(executable_path=chromedriver_path)
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            driver = webdriver.Chrome(service=service, options=chrome_options)
         else:
-            self.driver = webdriver.Chrome(options=chrome_options)
+            driver = webdriver.Chrome(options=chrome_options)
 
-        self.driver.implicitly_wait(10)
+        driver.implicitly_wait(10)
+        return driver
 
     def download_mp3(self, song_name):
         """下载MP3"""
@@ -1735,45 +3229,60 @@ class MusicDownloaderGUI:
         from selenium.webdriver.support import expected_conditions as EC
         from selenium.common.exceptions import TimeoutException
 
+        tracer = self.tracer
         try:
             before_files = set(f for f in os.listdir(self.download_dir) if f.endswith('.mp3'))
 
-            self.driver.get("https://mp3juice.co/")
+            with tracer.span(song_name, "search") as span:
+                self.driver.get(self.mp3juice_url)
 
-            search_box = WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'input[type="text"]'))
-            )
+                search_box = WebDriverWait(self.driver, 20).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, 'input[type="text"]'))
+                )
 
-            search_box.clear()
-            search_box.send_keys(song_name)
+                search_box.clear()
+                search_box.send_keys(song_name)
 
-            search_button = self.driver.find_element(By.XPATH, '//button[contains(text(), "Search")]')
-            search_button.click()
+                search_button = self.driver.find_element(By.XPATH, '//button[contains(text(), "Search")]')
+                search_button.click()
 
-            WebDriverWait(self.driver, 30).until(
-                EC.presence_of_element_located((By.XPATH, '//a[text()="MP3 Download"]'))
-            )
+                WebDriverWait(self.driver, 30).until(
+                    EC.presence_of_element_located((By.XPATH, '//a[text()="MP3 Download"]'))
+                )
+
+                download_buttons = self.driver.find_elements(By.XPATH, '//a[text()="MP3 Download"]')
+                if not download_buttons:
+                    span.fail("not_found")
 
-            download_buttons = self.driver.find_elements(By.XPATH, '//a[text()="MP3 Download"]')
             if download_buttons:
-                self.driver.execute_script("arguments[0].click();", download_buttons[0])
+                with tracer.span(song_name, "convert") as span:
+                    self.driver.execute_script("arguments[0].click();", download_buttons[0])
 
-                try:
-                    download_link = WebDriverWait(self.driver, 90).until(
-                        EC.presence_of_element_located((By.XPATH, '//a[text()="Download"]'))
-                    )
-                except TimeoutException:
-                    return False
+                    try:
+                        download_link = WebDriverWait(self.driver, 90).until(
+                            EC.presence_of_element_located((By.XPATH, '//a[text()="Download"]'))
+                        )
+                    except TimeoutException:
+                        span.fail("timeout")
+                        return False
 
                 self.driver.execute_script("arguments[0].click();", download_link)
 
-                for i in range(30):
-                    time.sleep(1)
-                    after_files = set(f for f in os.listdir(self.download_dir) if f.endswith('.mp3'))
-                    new_files = after_files - before_files
+                downloaded_file = None
+                with tracer.span(song_name, "landing") as span:
+                    for i in range(30):
+                        time.sleep(1)
+                        after_files = set(f for f in os.listdir(self.download_dir) if f.endswith('.mp3'))
+                        new_files = after_files - before_files
+
+                        if new_files:
+                            downloaded_file = list(new_files)[0]
+                            break
+                    else:
+                        span.fail("timeout")
 
-                    if new_files:
-                        downloaded_file = list(new_files)[0]
+                if downloaded_file:
+                    with tracer.span(song_name, "rename"):
                         old_path = os.path.join(self.download_dir, downloaded_file)
                         safe_name = self.sanitize_filename(song_name)
                         new_path = os.path.join(self.download_dir, f"{safe_name}.mp3")
@@ -1782,7 +3291,7 @@ class MusicDownloaderGUI:
                             os.remove(new_path)
 
                         os.rename(old_path, new_path)
-                        return True
+                    return True
 
                 return False
             else:
@@ -1793,56 +3302,61 @@ class MusicDownloaderGUI:
 
     def download_lrc(self, song_name):
         """下载歌词"""
+        tracer = self.tracer
         try:
-            search_url = f"https://lrclib.net/search/{quote(song_name)}"
-            self.driver.get(search_url)
-
-            time.sleep(3)
-
-            # 优先查找带"Synced"标识的按钮
-            first_button_found = self.driver.execute_script("""
-                const buttons = document.querySelectorAll('button.rounded.text-indigo-700');
+            with tracer.span(song_name, "lrc_search") as span:
+                search_url = f"{self.lrclib_url}/search/{quote(song_name)}"
+                self.driver.get(search_url)
+
+                time.sleep(3)
+
+                # 优先查找带"Synced"标识的按钮
+                first_button_found = self.driver.execute_script("""
+                    const buttons = document.querySelectorAll('button.rounded.text-indigo-700');
+
+                    // 首先查找带有"Synced"标识的按钮
+                    for (let button of buttons) {
+                        const parentRow = button.closest('tr') || button.closest('div');
+                        if (parentRow && parentRow.textContent.includes('Synced')) {
+                            button.click();
+                            return true;
+                        }
+                    }
 
-                // 首先查找带有"Synced"标识的按钮
-                for (let button of buttons) {
-                    const parentRow = button.closest('tr') || button.closest('div');
-                    if (parentRow && parentRow.textContent.includes('Synced')) {
-                        button.click();
+                    // 如果没有找到Synced的,点击第一个按钮
+                    if (buttons.length > 0) {
+                        buttons[0].click();
                         return true;
                     }
-                }
 
-                // 如果没有找到Synced的,点击第一个按钮
-                if (buttons.length > 0) {
-                    buttons[0].click();
-                    return true;
-                }
+                    return false;
+                """)
 
-                return false;
-            """)
+                if not first_button_found:
+                    span.fail("not_found")
+                    return False, None
 
-            if not first_button_found:
-                return False, None
-
-            time.sleep(2)
+            with tracer.span(song_name, "lrc_extract") as span:
+                time.sleep(2)
 
-            lyrics_text = self.driver.execute_script("""
-                const elements = document.querySelectorAll('*');
-                for (let elem of elements) {
-                    const text = elem.textContent;
-                    if (text && text.includes('[00:') && text.length > 100) {
-                        if (elem.children.length === 0 || elem.children.length === 1) {
-                            return text;
+                lyrics_text = self.driver.execute_script("""
+                    const elements = document.querySelectorAll('*');
+                    for (let elem of elements) {
+                        const text = elem.textContent;
+                        if (text && text.includes('[00:') && text.length > 100) {
+                            if (elem.children.length === 0 || elem.children.length === 1) {
+                                return text;
+                            }
                         }
                     }
-                }
-                return null;
-            """)
+                    return null;
+                """)
 
-            if lyrics_text and len(lyrics_text) > 50:
-                return True, lyrics_text
-            else:
-                return False, None
+                if lyrics_text and len(lyrics_text) > 50:
+                    return True, lyrics_text
+                else:
+                    span.fail("not_found")
+                    return False, None
 
         except Exception as e:
             return False, None
@@ -1851,6 +3365,9 @@ class MusicDownloaderGUI:
         """保存歌词"""
         try:
             safe_filename = self.sanitize_filename(filename)
+            if self.use_lyrics_store:
+                self.lyrics_store.put(safe_filename, lyrics_content)
+                return True
             lrc_path = os.path.join(self.download_dir, f"{safe_filename}.lrc")
             with open(lrc_path, 'w', encoding='utf-8') as f:
                 f.write(lyrics_content)
@@ -1896,27 +3413,34 @@ class MusicDownloaderGUI:
                 # 设置背景
                 self.desktop_lyric_window.configure(bg='#1a1a1a')
 
-                # 歌词标签
-                self.desktop_lyric_label = Label(
+                # 卡拉OK歌词画布
+                self.desktop_lyric = KaraokeRenderer(
                     self.desktop_lyric_window,
-                    text="暂无播放",
-                    font=("Microsoft YaHei UI", 20, "bold"),
                     bg='#1a1a1a',
                     fg='white',
-                    wraplength=750,
-                    justify=CENTER
+                    highlight=self.primary_color
                 )
-                self.desktop_lyric_label.pack(expand=True, fill=BOTH, padx=20, pady=20)
+                self.desktop_lyric.pack(expand=True, fill=BOTH, padx=20, pady=20)
 
                 # 支持拖动
-                self.desktop_lyric_label.bind('<Button-1>', self.desktop_lyric_drag_start)
-                self.desktop_lyric_label.bind('<B1-Motion>', self.desktop_lyric_drag)
+                self.desktop_lyric.bind('<Button-1>', self.desktop_lyric_drag_start)
+                self.desktop_lyric.bind('<B1-Motion>', self.desktop_lyric_drag)
 
                 # 双击关闭
-                self.desktop_lyric_label.bind('<Double-Button-1>', lambda e: self.toggle_desktop_lyric())
+                self.desktop_lyric.bind('<Double-Button-1>', lambda e: self.toggle_desktop_lyric())
             else:
                 self.desktop_lyric_window.deiconify()
 
+            # 显示当前状态
+            if self.current_lrc and self.lrc_display_index >= 0:
+                self.show_desktop_line(self.lrc_display_index)
+                self.desktop_lyric.update(self.position.position())
+            elif self.current_playing:
+                self.desktop_lyric.set_text(f"正在播放: {self.song_title(self.current_playing)}")
+            else:
+                self.desktop_lyric.set_text("暂无播放")
+            self.schedule_clock()
+
             # 更新按钮状态
             self.desktop_lyric_btn.config(bg="#d63939")
         else:
@@ -1929,23 +3453,40 @@ class MusicDownloaderGUI:
 
     def desktop_lyric_drag_start(self, event):
         """桌面歌词拖动开始"""
-        self.desktop_lyric_x = event.x
-        self.desktop_lyric_y = event.y
+        self.desktop_lyric_x = event.x_root - self.desktop_lyric_window.winfo_x()
+        self.desktop_lyric_y = event.y_root - self.desktop_lyric_window.winfo_y()
 
     def desktop_lyric_drag(self, event):
         """桌面歌词拖动"""
-        x = self.desktop_lyric_window.winfo_x() + event.x - self.desktop_lyric_x
-        y = self.desktop_lyric_window.winfo_y() + event.y - self.desktop_lyric_y
+        x = event.x_root - self.desktop_lyric_x
+        y = event.y_root - self.desktop_lyric_y
         self.desktop_lyric_window.geometry(f"+{x}+{y}")
 
+    def desktop_lyric_visible(self):
+        """桌面歌词是否正在显示"""
+        return self.show_desktop_lyric and self.desktop_lyric is not None
+
     def update_desktop_lyric(self, text):
-        """更新桌面歌词内容"""
-        if self.show_desktop_lyric and self.desktop_lyric_window:
+        """更新桌面歌词内容（提示文字，无进度）"""
+        if self.desktop_lyric_visible():
             try:
-                self.desktop_lyric_label.config(text=text)
+                self.desktop_lyric.set_text(text)
             except:
                 pass
 
+    def show_desktop_line(self, index):
+        """桌面歌词切换到第index行（带逐字时间）"""
+        if not self.desktop_lyric_visible():
+            return
+        lrc = self.current_lrc
+        text = lrc.texts[index]
+        if not text:
+            return
+        try:
+            self.desktop_lyric.set_line(text, lrc.words(index), lrc.times[index], lrc.line_end(index))
+        except:
+            pass
+
     def show_about(self):
         """显示关于信息"""
         messagebox.showinfo(
@@ -2004,6 +3545,9 @@ def check_single_instance():
 
 def main():
     """主函数"""
+    # 打包后波形计算的子进程会重新启动本程序，这里直接进入子进程逻辑
+    multiprocessing.freeze_support()
+
     # 检查单例
     if not check_single_instance():
         return
@@ -19,7 +19,7 @@ a = Analysis(
     excludes=[
         'matplotlib', 'numpy', 'pandas', 'scipy', 'PIL',
         'pytest', 'setuptools', 'wheel', 'pip',
-        'pydoc', 'doctest', 'asyncio'
+        'pydoc', 'doctest'
     ],
     noarchive=False,
     optimize=2,
@@ -12,6 +12,7 @@ import sys
 import pyperclip
 import shutil
 from datetime import datetime
+from collections import Counter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -20,6 +21,8 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from urllib.parse import quote
 
+from stage_tracer import StageTracer
+
 
 def get_exe_dir():
     """获取exe所在目录"""
@@ -125,14 +128,27 @@ class MusicDownloader:
         self.todo_file = os.path.join(exe_dir, "todo-download.txt")
         self.success_file = os.path.join(exe_dir, "download-success.txt")
         self.error_file = os.path.join(exe_dir, "download-err.txt")
+        self.trace_file = os.path.join(exe_dir, "download-trace.jsonl")
+        self.metrics_file = None
+        self.tracer = StageTracer(self.trace_file)
+        # 站点地址（基准测试时指向本地模拟站点）
+        self.mp3juice_url = "https://mp3juice.co/"
+        self.lrclib_url = "https://lrclib.net"
         self.driver = None
 
     def setup_driver(self):
         """设置Chrome驱动"""
+        self.driver = self.create_driver(self.download_dir)
+
+    def create_driver(self, download_dir, performance_log=False):
+        """创建下载到指定目录的Chrome驱动
+
+        performance_log=True 时开启Chrome性能日志（网络事件），供会话录制使用
+        """
         chrome_options = Options()
         # 设置下载目录
         prefs = {
-            "download.default_directory": self.download_dir,
+            "download.default_directory": download_dir,
             "download.prompt_for_download": False,
             "download.directory_upgrade": True,
             "safebrowsing.enabled": True
@@ -143,6 +159,8 @@ class MusicDownloader:
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
+        if performance_log:
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
 
         # 尝试解压bundled Chrome（如果需要）
         extract_bundled_chrome()
@@ -158,13 +176,14 @@ class MusicDownloader:
             print(f"使用bundled Chrome: {chrome_path}")
             chrome_options.binary_location = chrome_path
             service = Service(executable_path=chromedriver_path)
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            driver = webdriver.Chrome(service=service, options=chrome_options)
         else:
             # 使用系统Chrome
             print("使用系统Chrome")
-            self.driver = webdriver.Chrome(options=chrome_options)
+            driver = webdriver.Chrome(options=chrome_options)
 
-        self.driver.implicitly_wait(10)
+        driver.implicitly_wait(10)
+        return driver
 
     def sanitize_filename(self, name):
         """清理文件名，移除非法字符"""
@@ -188,50 +207,60 @@ class MusicDownloader:
 
     def download_mp3_from_mp3juice(self, song_name):
         """从MP3Juice下载MP3"""
+        tracer = self.tracer
         try:
             print(f"正在搜索: {song_name}")
 
             # 记录下载前的MP3文件
             before_files = set(f for f in os.listdir(self.download_dir) if f.endswith('.mp3'))
 
-            self.driver.get("https://mp3juice.co/")
+            with tracer.span(song_name, "search") as span:
+                self.driver.get(self.mp3juice_url)
 
-            # 等待搜索框加载
-            search_box = WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'input[type="text"]'))
-            )
+                # 等待搜索框加载
+                search_box = WebDriverWait(self.driver, 20).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, 'input[type="text"]'))
+                )
 
-            # 输入搜索内容
-            search_query = f"{song_name}"
-            search_box.clear()
-            search_box.send_keys(search_query)
+                # 输入搜索内容
+                search_query = f"{song_name}"
+                search_box.clear()
+                search_box.send_keys(search_query)
 
-            # 点击搜索按钮
-            search_button = self.driver.find_element(By.XPATH, '//button[contains(text(), "Search")]')
-            search_button.click()
+                # 点击搜索按钮
+                search_button = self.driver.find_element(By.XPATH, '//button[contains(text(), "Search")]')
+                search_button.click()
 
-            # 等待搜索结果，查找"MP3 Download"链接
-            print("等待搜索结果加载...")
-            WebDriverWait(self.driver, 30).until(
-                EC.presence_of_element_located((By.XPATH, '//a[text()="MP3 Download"]'))
-            )
+                # 等待搜索结果，查找"MP3 Download"链接
+                print("等待搜索结果加载...")
+                WebDriverWait(self.driver, 30).until(
+                    EC.presence_of_element_located((By.XPATH, '//a[text()="MP3 Download"]'))
+                )
 
-            print("搜索结果已加载")
+                print("搜索结果已加载")
 
-            # 使用JavaScript点击第一个"MP3 Download"按钮，避免元素被遮挡
-            download_buttons = self.driver.find_elements(By.XPATH, '//a[text()="MP3 Download"]')
-            if download_buttons:
-                self.driver.execute_script("arguments[0].click();", download_buttons[0])
+                # 使用JavaScript点击第一个"MP3 Download"按钮，避免元素被遮挡
+                download_buttons = self.driver.find_elements(By.XPATH, '//a[text()="MP3 Download"]')
+                if not download_buttons:
+                    span.fail("not_found")
 
-                # 等待按钮文字变成"Download" (从initializing变为Download)
-                print("等待转换完成（最长90秒）...")
-                try:
-                    # 一旦出现Download按钮就立即停止等待
-                    download_link = WebDriverWait(self.driver, 90).until(
-                        EC.presence_of_element_located((By.XPATH, '//a[text()="Download"]'))
-                    )
-                    print("准备下载")
-                except TimeoutException:
+            if download_buttons:
+                with tracer.span(song_name, "convert") as span:
+                    self.driver.execute_script("arguments[0].click();", download_buttons[0])
+
+                    # 等待按钮文字变成"Download" (从initializing变为Download)
+                    print("等待转换完成（最长90秒）...")
+                    try:
+                        # 一旦出现Download按钮就立即停止等待
+                        download_link = WebDriverWait(self.driver, 90).until(
+                            EC.presence_of_element_located((By.XPATH, '//a[text()="Download"]'))
+                        )
+                        print("准备下载")
+                    except TimeoutException:
+                        span.fail("timeout")
+                        download_link = None
+
+                if download_link is None:
                     print("等待Download超时90秒，跳过此歌曲")
                     return False
 
@@ -241,15 +270,23 @@ class MusicDownloader:
 
                 # 等待下载完成并重命名文件
                 print("等待文件下载完成...")
-                max_wait = 30  # 最多等待30秒
-                for i in range(max_wait):
-                    time.sleep(1)
-                    after_files = set(f for f in os.listdir(self.download_dir) if f.endswith('.mp3'))
-                    new_files = after_files - before_files
-
-                    if new_files:
-                        # 找到新下载的文件
-                        downloaded_file = list(new_files)[0]
+                downloaded_file = None
+                with tracer.span(song_name, "landing") as span:
+                    max_wait = 30  # 最多等待30秒
+                    for i in range(max_wait):
+                        time.sleep(1)
+                        after_files = set(f for f in os.listdir(self.download_dir) if f.endswith('.mp3'))
+                        new_files = after_files - before_files
+
+                        if new_files:
+                            # 找到新下载的文件
+                            downloaded_file = list(new_files)[0]
+                            break
+                    else:
+                        span.fail("timeout")
+
+                if downloaded_file:
+                    with tracer.span(song_name, "rename"):
                         old_path = os.path.join(self.download_dir, downloaded_file)
 
                         # 重命名为标准名称
@@ -262,7 +299,7 @@ class MusicDownloader:
 
                         os.rename(old_path, new_path)
                         print(f"文件已重命名: {safe_name}.mp3")
-                        return True
+                    return True
 
                 print("下载超时，未检测到新文件")
                 return False
@@ -278,74 +315,81 @@ class MusicDownloader:
 
     def download_lrc_from_lrclib(self, song_name):
         """从LRCLib下载歌词"""
+        tracer = self.tracer
         try:
             print(f"正在搜索歌词: {song_name}")
 
-            # 直接访问搜索URL
-            search_url = f"https://lrclib.net/search/{quote(song_name)}"
-            self.driver.get(search_url)
+            with tracer.span(song_name, "lrc_search") as span:
+                # 直接访问搜索URL
+                search_url = f"{self.lrclib_url}/search/{quote(song_name)}"
+                self.driver.get(search_url)
 
-            # 等待搜索结果加载
-            print("等待搜索结果加载...")
-            time.sleep(3)
+                # 等待搜索结果加载
+                print("等待搜索结果加载...")
+                time.sleep(3)
 
-            # 查找并点击第一个歌词结果按钮
-            try:
-                # 等待页面加载
-                time.sleep(2)
+                # 查找并点击第一个歌词结果按钮
+                try:
+                    # 等待页面加载
+                    time.sleep(2)
+
+                    # 查找class包含"rounded text-"的按钮（搜索结果按钮）
+                    first_button_found = self.driver.execute_script("""
+                        const buttons = document.querySelectorAll('button.rounded.text-indigo-700');
+                        if (buttons.length > 0) {
+                            buttons[0].click();
+                            return true;
+                        }
+                        return false;
+                    """)
 
-                # 查找class包含"rounded text-"的按钮（搜索结果按钮）
-                first_button_found = self.driver.execute_script("""
-                    const buttons = document.querySelectorAll('button.rounded.text-indigo-700');
-                    if (buttons.length > 0) {
-                        buttons[0].click();
-                        return true;
-                    }
-                    return false;
-                """)
-
-                if not first_button_found:
-                    print("未找到搜索结果")
-                    return False, None
+                    if not first_button_found:
+                        print("未找到搜索结果")
+                        span.fail("not_found")
+                        return False, None
 
-                print("找到搜索结果")
+                    print("找到搜索结果")
 
-            except Exception as e:
-                print(f"点击搜索结果失败: {str(e)}")
-                return False, None
+                except Exception as e:
+                    print(f"点击搜索结果失败: {str(e)}")
+                    span.fail("error")
+                    return False, None
 
-            # 等待歌词弹窗加载
-            print("等待歌词弹窗加载...")
-            time.sleep(2)
+            with tracer.span(song_name, "lrc_extract") as span:
+                # 等待歌词弹窗加载
+                print("等待歌词弹窗加载...")
+                time.sleep(2)
 
-            # 直接从页面元素获取歌词，不使用复制（避免权限弹窗）
-            try:
-                print("尝试直接从页面读取歌词")
-                lyrics_text = self.driver.execute_script("""
-                    // 查找包含 [00: 格式的元素（歌词内容）
-                    const elements = document.querySelectorAll('*');
-                    for (let elem of elements) {
-                        const text = elem.textContent;
-                        if (text && text.includes('[00:') && text.length > 100) {
-                            // 确保是最接近的、最直接包含歌词的元素
-                            if (elem.children.length === 0 || elem.children.length === 1) {
-                                return text;
+                # 直接从页面元素获取歌词，不使用复制（避免权限弹窗）
+                try:
+                    print("尝试直接从页面读取歌词")
+                    lyrics_text = self.driver.execute_script("""
+                        // 查找包含 [00: 格式的元素（歌词内容）
+                        const elements = document.querySelectorAll('*');
+                        for (let elem of elements) {
+                            const text = elem.textContent;
+                            if (text && text.includes('[00:') && text.length > 100) {
+                                // 确保是最接近的、最直接包含歌词的元素
+                                if (elem.children.length === 0 || elem.children.length === 1) {
+                                    return text;
+                                }
                             }
                         }
-                    }
-                    return null;
-                """)
-
-                if lyrics_text and len(lyrics_text) > 50:
-                    print(f"成功从页面获取歌词，长度: {len(lyrics_text)} 字符")
-                    return True, lyrics_text
-                else:
-                    print("未找到有效歌词内容")
-                    return False, None
+                        return null;
+                    """)
+
+                    if lyrics_text and len(lyrics_text) > 50:
+                        print(f"成功从页面获取歌词，长度: {len(lyrics_text)} 字符")
+                        return True, lyrics_text
+                    else:
+                        print("未找到有效歌词内容")
+                        span.fail("not_found")
+                        return False, None
 
-            except TimeoutException:
-                print("未找到复制")
-                return False, None
+                except TimeoutException:
+                    print("未找到复制")
+                    span.fail("timeout")
+                    return False, None
 
         except Exception as e:
             print(f"下载歌词失败: {str(e)}")
@@ -382,6 +426,11 @@ class MusicDownloader:
 
         return songs
 
+    def is_song_downloaded(self, song_name):
+        """下载文件夹中是否已有这首歌的MP3"""
+        safe_name = self.sanitize_filename(song_name)
+        return os.path.exists(os.path.join(self.download_dir, f"{safe_name}.mp3"))
+
     def append_to_file(self, filename, song_name, status="success"):
         """追加记录到文件"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -394,6 +443,89 @@ class MusicDownloader:
             for song in remaining_songs:
                 f.write(f"{song}\n")
 
+    def remove_from_todo_list(self, done_songs):
+        """从待下载列表中移除已处理的歌曲
+
+        按内容逐行匹配（同名歌曲出现几次就移除几行），其余行原样保留，
+        包括空行、注释和处理期间新追加的歌曲；写入前文件又有变化时重新读取。
+        """
+        for _ in range(5):
+            try:
+                with open(self.todo_file, 'r', encoding='utf-8') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    lines = f.readlines()
+            except OSError:
+                return
+
+            pending = Counter(done_songs)
+            kept = []
+            for line in lines:
+                song = line.strip()
+                if song and pending[song] > 0:
+                    pending[song] -= 1
+                    continue
+                kept.append(line)
+
+            tmp_file = self.todo_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.writelines(kept)
+            if os.path.getsize(self.todo_file) == size:
+                os.replace(tmp_file, self.todo_file)
+                return
+        os.remove(tmp_file)
+        print("待下载列表一直在变化，未移除已处理的歌曲")
+
+    def process_song(self, song_name):
+        """下载单首歌曲的MP3和歌词，并记录结果"""
+        # 下载MP3
+        mp3_success = self.download_mp3_from_mp3juice(song_name)
+
+        # 下载歌词
+        lrc_success, lrc_content = self.download_lrc_from_lrclib(song_name)
+
+        # 保存歌词 - 使用原始歌曲名，而不是从MP3Juice获取的标题
+        if lrc_success and lrc_content:
+            safe_name = self.sanitize_filename(song_name)
+            lrc_saved = self.save_lrc_file(safe_name, lrc_content)
+        else:
+            lrc_saved = False
+
+        # 记录结果
+        status_parts = []
+        if mp3_success:
+            status_parts.append("MP3:成功")
+        else:
+            status_parts.append("MP3:失败")
+
+        if lrc_saved:
+            status_parts.append("歌词:成功")
+        else:
+            status_parts.append("歌词:失败")
+
+        status_msg = ", ".join(status_parts)
+
+        if mp3_success or lrc_saved:
+            # 至少有一个成功就记录到成功文件
+            print(f"[完成] {song_name} - {status_msg}")
+            self.append_to_file(self.success_file, song_name, status_msg)
+
+        if not mp3_success or not lrc_saved:
+            # 有任何失败就记录到错误文件
+            print(f"[部分失败] {song_name} - {status_msg}")
+            self.append_to_file(self.error_file, song_name, status_msg)
+
+        self.tracer.song_finished(song_name, mp3_success)
+        return mp3_success, lrc_saved
+
+    def report_trace(self):
+        """输出本批次各阶段耗时汇总"""
+        print(f"\n{'='*60}")
+        print("阶段耗时统计")
+        print(self.tracer.format_summary())
+        if self.metrics_file:
+            self.tracer.write_prometheus(self.metrics_file)
+            print(f"指标已导出: {self.metrics_file}")
+
     def process_downloads(self):
         """处理所有下载任务"""
         songs = self.read_todo_list()
@@ -403,6 +535,7 @@ class MusicDownloader:
             return
 
         print(f"共有 {len(songs)} 首歌曲待下载")
+        self.tracer.reset()
 
         self.setup_driver()
 
@@ -412,57 +545,115 @@ class MusicDownloader:
                 print(f"[{i}/{len(songs)}] 正在处理: {song_name}")
                 print(f"{'='*60}")
 
-                # 下载MP3
-                mp3_success = self.download_mp3_from_mp3juice(song_name)
+                self.process_song(song_name)
 
-                # 下载歌词
-                lrc_success, lrc_content = self.download_lrc_from_lrclib(song_name)
+                # 等待一下，避免请求过快
+                time.sleep(2)
 
-                # 保存歌词 - 使用原始歌曲名，而不是从MP3Juice获取的标题
-                if lrc_success and lrc_content:
-                    safe_name = self.sanitize_filename(song_name)
-                    lrc_saved = self.save_lrc_file(safe_name, lrc_content)
-                else:
-                    lrc_saved = False
+            # 下载完成后，从todo列表移除已处理的歌曲（保留批处理期间新追加的）
+            self.remove_from_todo_list(songs)
+            self.report_trace()
+            print(f"\n{'='*60}")
+            print("所有下载任务已完成！")
+            print(f"{'='*60}")
+
+        finally:
+            if self.driver:
+                self.driver.quit()
 
-                # 记录结果
-                status_parts = []
-                if mp3_success:
-                    status_parts.append("MP3:成功")
-                else:
-                    status_parts.append("MP3:失败")
 
-                if lrc_saved:
-                    status_parts.append("歌词:成功")
-                else:
-                    status_parts.append("歌词:失败")
+    def process_downloads_parallel(self, workers=2):
+        """使用异步调度器并行处理所有下载任务"""
+        from download_orchestrator import DownloadOrchestrator
 
-                status_msg = ", ".join(status_parts)
+        songs = self.read_todo_list()
 
-                if mp3_success or lrc_saved:
-                    # 至少有一个成功就记录到成功文件
-                    print(f"[完成] {song_name} - {status_msg}")
-                    self.append_to_file(self.success_file, song_name, status_msg)
+        if not songs:
+            print("没有待下载的歌曲")
+            return
 
-                if not mp3_success or not lrc_saved:
-                    # 有任何失败就记录到错误文件
-                    print(f"[部分失败] {song_name} - {status_msg}")
-                    self.append_to_file(self.error_file, song_name, status_msg)
+        print(f"共有 {len(songs)} 首歌曲待下载（{workers} 个浏览器并行）")
+        self.tracer.reset()
 
-                # 等待一下，避免请求过快
-                time.sleep(2)
+        orchestrator = DownloadOrchestrator(
+            self.download_dir,
+            driver_factory=self.create_driver,
+            browser_workers=workers,
+            mp3juice_url=self.mp3juice_url,
+            lrclib_url=self.lrclib_url,
+            tracer=self.tracer
+        )
+        orchestrator.start()
 
-            # 下载完成后，清空todo列表
-            self.update_todo_list([])
+        try:
+            futures = [orchestrator.submit(song)[1] for song in songs]
+            for future in futures:
+                job = future.result()
+                status_msg = (f"MP3:{'成功' if job.mp3_success else '失败'}, "
+                              f"歌词:{'成功' if job.lrc_success else '失败'}")
+                if job.mp3_success or job.lrc_success:
+                    print(f"[完成] {job.song} - {status_msg}")
+                    self.append_to_file(self.success_file, job.song, status_msg)
+                if not job.mp3_success or not job.lrc_success:
+                    print(f"[部分失败] {job.song} - {status_msg}")
+                    self.append_to_file(self.error_file, job.song, status_msg)
+                self.tracer.song_finished(job.song, job.mp3_success)
+
+            # 从todo列表移除已处理的歌曲（保留批处理期间新追加的）
+            self.remove_from_todo_list(songs)
+            self.report_trace()
             print(f"\n{'='*60}")
             print("所有下载任务已完成！")
             print(f"{'='*60}")
 
+        except KeyboardInterrupt:
+            print("\n已停止下载")
         finally:
+            orchestrator.shutdown()
+
+    def watch_downloads(self, poll_interval=1.0, report_every=50):
+        """监听模式：持续读取todo文件中新追加的歌曲并下载
+
+        不会清空todo文件，已处理的位置记录在 todo-download.txt.offset 中，
+        其他程序只需向todo文件追加行即可投递下载任务。
+        todo文件被整体改写（如界面保存列表）时偏移从头开始，已下载的歌曲跳过。
+        每处理 report_every 首歌输出一次阶段耗时并清空，长时间运行时不占用越来越多内存。
+        """
+        from todo_watcher import TodoTailer
+
+        tailer = TodoTailer(self.todo_file, poll_interval=poll_interval)
+        self.tracer.reset()
+        self.setup_driver()
+
+        try:
+            for song_name, end_offset in tailer.follow():
+                if self.is_song_downloaded(song_name):
+                    print(f"[监听] 已下载，跳过: {song_name}")
+                    tailer.commit(end_offset)
+                    continue
+
+                print(f"\n{'='*60}")
+                print(f"[监听] 正在处理: {song_name}")
+                print(f"{'='*60}")
+
+                self.process_song(song_name)
+                tailer.commit(end_offset)
+
+                if self.tracer.songs_done >= report_every:
+                    self.report_trace()
+                    self.tracer.reset()
+
+                # 等待一下，避免请求过快
+                time.sleep(2)
+
+        except KeyboardInterrupt:
+            print("\n已停止监听")
+        finally:
+            if self.tracer.songs_done:
+                self.report_trace()
             if self.driver:
                 self.driver.quit()
 
-
 def main():
     """主函数"""
     print("音乐下载器 V2 启动...")
@@ -476,7 +667,27 @@ def main():
     os.makedirs(download_dir, exist_ok=True)
 
     downloader = MusicDownloader(download_dir=download_dir)
-    downloader.process_downloads()
+    if "--metrics" in sys.argv:
+        # 批次结束时导出Prometheus文本格式：--metrics download-metrics.prom
+        index = sys.argv.index("--metrics") + 1
+        if index >= len(sys.argv) or sys.argv[index].startswith("--"):
+            print("用法: python music_downloader_v2.py --metrics <输出文件>")
+            return
+        downloader.metrics_file = sys.argv[index]
+    if "--watch" in sys.argv:
+        # 监听模式：持续处理追加到todo文件的歌曲
+        downloader.watch_downloads()
+    elif "--workers" in sys.argv:
+        # 并行模式：python music_downloader_v2.py --workers 3
+        index = sys.argv.index("--workers") + 1
+        try:
+            workers = int(sys.argv[index])
+        except (IndexError, ValueError):
+            print("用法: python music_downloader_v2.py --workers <浏览器数量>")
+            return
+        downloader.process_downloads_parallel(workers)
+    else:
+        downloader.process_downloads()
 
     print("\n程序结束")
 
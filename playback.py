@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+播放位置模型
+pygame.mixer.music.get_pos() 只表示"距离上次play()过了多久"，跳转之后就不再是歌曲位置。
+这里用 跳转基准位置 + 单调时钟 计算歌曲内的真实位置，并在已加载的流内跳转（不重新加载文件）。
+预加载：在当前歌曲播放时提前读入下一首的文件页、时长和歌词，结束时无缝衔接。
+边下边播：GrowingFile 让pygame从仍在下载的 .part 文件读取，读到已下载部分末尾时等待。
+"""
+
+import io
+import os
+import time
+import threading
+
+from lrc_parser import load_lrc
+
+try:
+    import pygame
+    PYGAME_AVAILABLE = True
+except ImportError:
+    PYGAME_AVAILABLE = False
+
+
+# 预读文件时每次读取的大小
+PREREAD_CHUNK = 1024 * 1024
+
+# MPEG Layer III 比特率表（kbps），按 版本 -> 比特率索引
+_MP3_BITRATES = {
+    "1": (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    "2": (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+DEFAULT_BITRATE = 128
+
+# 边下边播：开始播放前需要缓冲的时长；缓冲低于LOW时暂停，恢复到RESUME后继续（毫秒）
+STREAM_START_BUFFER_MS = 3000
+STREAM_LOW_BUFFER_MS = 1500
+STREAM_RESUME_BUFFER_MS = 4000
+
+# 文件尾部的标签探测范围（ID3v1/APE/Lyrics3），下载未完成时这部分读到的是0
+TAIL_PROBE = 64 * 1024
+
+
+class PreparedTrack:
+    """预先准备好的歌曲：路径、时长（毫秒，未知为None）和解析后的歌词"""
+
+    def __init__(self, song, mp3_path, lrc_path):
+        self.song = song
+        self.mp3_path = mp3_path
+        self.lrc_path = lrc_path
+        self.length = None
+        self.lrc = None
+        self.lrc_loaded = False   # 是否已读取过歌词（lrc为None时可能是没有歌词）
+
+
+def read_length(mp3_path):
+    """用mutagen读取时长（毫秒），不可用时返回None"""
+    try:
+        from mutagen.mp3 import MP3
+        return int(MP3(mp3_path).info.length * 1000)
+    except Exception:
+        return None
+
+
+def preread_file(path):
+    """把文件读入系统缓存，切换歌曲时打开和解码不再等磁盘"""
+    try:
+        with open(path, 'rb') as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                return
+            while f.read(PREREAD_CHUNK):
+                pass
+    except Exception:
+        pass
+
+
+def prepare_track(song, mp3_path, lrc_path, preread=True, length=None, load_lyrics=load_lrc):
+    """读取时长、解析歌词，可选预读文件；已知时长（曲库索引）时不再解析MP3
+
+    load_lyrics(lrc路径) 读取歌词，默认读 .lrc 文件（歌词库由调用方传入）。
+    """
+    track = PreparedTrack(song, mp3_path, lrc_path)
+    if preread:
+        preread_file(mp3_path)
+    track.length = length if length is not None else read_length(mp3_path)
+    try:
+        track.lrc = load_lyrics(lrc_path)
+    except Exception:
+        track.lrc = None
+    track.lrc_loaded = True
+    return track
+
+
+def mp3_stream_info(path):
+    """读取音频数据起始偏移（跳过ID3v2）和首帧比特率，返回 (偏移, kbps)；
+    无法识别或数据还没下载到首帧时返回None（之后再试）"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(10)
+            offset = 0
+            if header[:3] == b"ID3" and len(header) == 10:
+                # 标签可能很大（内嵌封面），按标签头中的大小跳过
+                size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+                offset = 10 + size
+                if header[5] & 0x10:  # 有页脚
+                    offset += 10
+            f.seek(offset)
+            head = f.read(64 * 1024)
+    except OSError:
+        return None
+
+    if len(head) < 4:
+        return None
+
+    for i in range(len(head) - 3):
+        if head[i] != 0xFF or (head[i + 1] & 0xE0) != 0xE0:
+            continue
+        version_bits = (head[i + 1] >> 3) & 0x03
+        layer_bits = (head[i + 1] >> 1) & 0x03
+        bitrate_index = head[i + 2] >> 4
+        if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15):
+            continue
+        table = _MP3_BITRATES["1" if version_bits == 3 else "2"]
+        return offset + i, table[bitrate_index]
+
+    return None
+
+
+class GrowingFile(io.RawIOBase):
+    """边下载边读取的文件
+
+    有数据时只返回已下载的部分，不等凑满；读取位置追上已下载部分时短暂等待
+    （最多 wait_timeout 秒，调用方是SDL音频线程，不能久等）。
+    下载完成后 .part 被改名，自动改读最终文件。
+    每次读取都重新打开文件，避免Windows上占用 .part 导致下载器无法改名。
+    """
+
+    def __init__(self, part_path, final_path, total=0, wait_timeout=0.3):
+        super().__init__()
+        self.part_path = part_path
+        self.final_path = final_path
+        self.total = total
+        self.wait_timeout = wait_timeout
+        self.finished = False
+        self.failed = False
+        self._pos = 0
+        self._read_end = 0
+        self._part_seen = False
+        self._cond = threading.Condition()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _current(self):
+        """(当前应读取的路径, 已写入磁盘的字节数)"""
+        try:
+            size = os.path.getsize(self.part_path)
+            self._part_seen = True
+            return self.part_path, size
+        except OSError:
+            pass
+        # .part 还没创建时，同名的最终文件是以前下载的旧文件，不能读
+        if not (self._part_seen or self.finished):
+            return None, 0
+        try:
+            return self.final_path, os.path.getsize(self.final_path)
+        except OSError:
+            return None, 0
+
+    def available(self):
+        """已下载的字节数"""
+        return self._current()[1]
+
+    def notify(self):
+        """有新数据到达（下载进度事件）"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def mark_finished(self):
+        """下载完成"""
+        self.finished = True
+        self.notify()
+
+    def mark_failed(self):
+        """下载失败：之后读到末尾即结束"""
+        self.failed = True
+        self.notify()
+
+    def readinto(self, buffer):
+        want = len(buffer)
+        if want == 0:
+            return 0
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            path, size = self._current()
+            if self._pos < size or self.finished or self.failed:
+                break
+            jumped = self._pos != self._read_end
+            if jumped and self.total and self._pos >= self.total - TAIL_PROBE:
+                # 解码器跳到文件尾探测标签，数据还没到，返回0字节填充
+                count = min(want, self.total - self._pos)
+                if count <= 0:
+                    return 0
+                buffer[:count] = b"\x00" * count
+                self._pos += count
+                self._read_end = self._pos
+                return count
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 0
+            with self._cond:
+                self._cond.wait(min(0.1, remaining))
+
+        if path is None or self._pos >= size:
+            return 0
+
+        with open(path, 'rb') as f:
+            f.seek(self._pos)
+            data = f.read(min(want, size - self._pos))
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        self._read_end = self._pos
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            end = self.total if self.total and not self.finished else self.available()
+            self._pos = end + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+class PlaybackPosition:
+    """歌曲内播放位置：base_ms 为最近一次开始/跳转时的位置，运行时再加上经过的时间"""
+
+    def __init__(self):
+        self.base_ms = 0
+        self.running = False
+        self._started = 0.0
+
+    def start(self, base_ms=0):
+        """从指定位置开始计时"""
+        self.base_ms = base_ms
+        self._started = time.monotonic()
+        self.running = True
+
+    def pause(self):
+        """暂停：把已经过的时间并入基准位置"""
+        if self.running:
+            self.base_ms = self.position()
+            self.running = False
+
+    def resume(self):
+        """继续计时"""
+        if not self.running:
+            self._started = time.monotonic()
+            self.running = True
+
+    def seek(self, position_ms):
+        """跳转后重设基准位置，保持运行/暂停状态不变"""
+        self.base_ms = position_ms
+        self._started = time.monotonic()
+
+    def reset(self):
+        """停止播放"""
+        self.base_ms = 0
+        self.running = False
+
+    def position(self):
+        """当前位置（毫秒）"""
+        if not self.running:
+            return self.base_ms
+        return self.base_ms + int((time.monotonic() - self._started) * 1000)
+
+
+def seek_music(position_ms, paused=False):
+    """在已加载的音乐流内跳转
+
+    优先使用 set_pos（MP3/OGG支持，不重新打开文件）；
+    不支持时退回 play(start=)，同样复用已加载的流。
+    """
+    seconds = position_ms / 1000.0
+    try:
+        pygame.mixer.music.set_pos(seconds)
+        return
+    except Exception:
+        pass
+
+    pygame.mixer.music.play(start=seconds)
+    if paused:
+        pygame.mixer.music.pause()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+播放列表
+- 播放顺序 order（顺序或随机排列）+ 歌曲->位置 字典，上一首/下一首为O(1)
+- 随机播放使用整轮排列，一轮内不重复，播完再重新打乱
+- 插队队列："下一首播放" 放在队首，"添加到播放队列" 放在队尾
+- 曲库变化时按歌曲名保持当前位置
+"""
+
+import random
+from bisect import bisect_left
+from collections import deque
+
+
+class Playlist:
+    """播放列表和播放队列"""
+
+    def __init__(self, songs=(), shuffle=False, seed=None):
+        self.songs = []          # 曲库（已排序）
+        self._members = set()
+        self.shuffle = shuffle
+        self.order = []          # 当前一轮的播放顺序
+        self._next_order = None  # 预先生成的下一轮随机顺序（peek_next时生成，advance切换到它）
+        self._order_pos = {}     # 歌曲 -> 在order中的位置
+        self.pos = -1            # 当前歌曲在order中的位置
+        self.current = None
+        self.queue = deque()     # 插队队列
+        self.history = deque(maxlen=200)  # 播放历史（上一首）
+        self._random = random.Random(seed)
+        self.set_songs(songs)
+
+    def __len__(self):
+        return len(self.songs)
+
+    def __contains__(self, song):
+        return song in self._members
+
+    # ------------------------------------------------------------------
+    # 曲库
+    # ------------------------------------------------------------------
+
+    def set_songs(self, songs):
+        """更新曲库，保持当前歌曲和随机顺序中尚未播放的部分"""
+        new_songs = sorted(songs)
+        new_members = set(new_songs)
+        added = [s for s in new_songs if s not in self._members]
+        old_order, old_pos = self.order, self.pos
+
+        self.songs = new_songs
+        self._members = new_members
+        self.queue = deque(s for s in self.queue if s in new_members)
+
+        if self._next_order is not None:
+            if old_order and old_pos + 1 >= len(old_order):
+                # 本轮已播完、下一轮已生成（下一首可能已经预加载）：
+                # 新歌曲插入下一轮，下一轮的第一首不变
+                next_order = [s for s in self._next_order if s in new_members]
+                for song in added:
+                    next_order.insert(self._random.randint(min(1, len(next_order)), len(next_order)), song)
+                self._next_order = next_order
+                added = []
+            else:
+                self._next_order = None
+
+        if self.shuffle:
+            played = [s for s in old_order[:old_pos + 1] if s in new_members]
+            rest = [s for s in old_order[old_pos + 1:] if s in new_members]
+            # 新歌曲随机插入到本轮未播放的部分
+            for song in added:
+                rest.insert(self._random.randint(0, len(rest)), song)
+            if not old_order:
+                self._random.shuffle(rest)
+            self._set_order(played + rest)
+            self.pos = len(played) - 1
+        else:
+            self._set_order(new_songs)
+            self.pos = self._sequential_pos(self.current)
+
+        if self.current in self._order_pos:
+            self.pos = self._order_pos[self.current]
+
+    def _set_order(self, order):
+        self.order = order
+        self._order_pos = {song: i for i, song in enumerate(order)}
+
+    def _sequential_pos(self, song):
+        """顺序模式下的位置；歌曲已不在曲库时停在它前面，下一首接着它原来的后一首"""
+        if song is None:
+            return -1
+        if song in self._order_pos:
+            return self._order_pos[song]
+        return bisect_left(self.songs, song) - 1
+
+    def set_shuffle(self, shuffle):
+        """切换随机播放，新顺序从当前歌曲开始"""
+        self.shuffle = shuffle
+        self._next_order = None
+        if shuffle:
+            self._reshuffle(first=self.current)
+        else:
+            self._set_order(self.songs)
+            self.pos = self._sequential_pos(self.current)
+
+    def _shuffled(self, first=None, avoid=None):
+        """生成一轮随机顺序；first放在最前，avoid不放在最前（避免连续重复）"""
+        order = [s for s in self.songs if s != first]
+        self._random.shuffle(order)
+        if avoid is not None and len(order) > 1 and order[0] == avoid:
+            swap = self._random.randint(1, len(order) - 1)
+            order[0], order[swap] = order[swap], order[0]
+        if first is not None and first in self._members:
+            order.insert(0, first)
+        return order
+
+    def _reshuffle(self, first=None):
+        """重新打乱当前一轮，从first开始"""
+        self._set_order(self._shuffled(first))
+        self.pos = 0 if first is not None and first in self._members else -1
+
+    # ------------------------------------------------------------------
+    # 播放
+    # ------------------------------------------------------------------
+
+    def set_current(self, song, move=True):
+        """开始播放某首歌（用户点播或自动切换）；move=False时不改变播放顺序中的位置"""
+        if song == self.current:
+            return
+        if self.current is not None:
+            self.history.append(self.current)
+        self.current = song
+        if move and song in self._order_pos:
+            self.pos = self._order_pos[song]
+
+    def peek_next(self, wrap=True):
+        """下一首（不移动位置），没有时返回None"""
+        if self.queue:
+            return self.queue[0]
+        if not self.order:
+            return None
+        if self.pos + 1 < len(self.order):
+            return self.order[self.pos + 1]
+        if not wrap:
+            return None
+        if self.shuffle:
+            # 一轮已播完：生成下一轮（不以刚播放的歌曲开头），advance时才切换过去
+            if not self._next_order:
+                self._next_order = self._shuffled(avoid=self.current)
+            return self._next_order[0] if self._next_order else None
+        return self.order[0]
+
+    def advance(self, song=None, wrap=True):
+        """切换到下一首并返回它；传入song时表示已经切换到这首（如无缝衔接）"""
+        if song is None:
+            song = self.peek_next(wrap)
+            if song is None:
+                return None
+        if self.queue and self.queue[0] == song:
+            # 插队的歌曲播完后回到原来的顺序继续
+            self.queue.popleft()
+            self.set_current(song, move=False)
+        else:
+            if (self._next_order and self.pos + 1 >= len(self.order)
+                    and song == self._next_order[0]):
+                # 进入下一轮
+                self._set_order(self._next_order)
+                self._next_order = None
+                self.pos = 0
+            self.set_current(song)
+        return song
+
+    def previous(self):
+        """上一首：优先按播放历史，其次按播放顺序"""
+        while self.history:
+            song = self.history.pop()
+            if song in self._members:
+                self.current = song
+                if song in self._order_pos:
+                    self.pos = self._order_pos[song]
+                return song
+        if not self.order:
+            return None
+        self.pos = (self.pos - 1) % len(self.order)
+        self.current = self.order[self.pos]
+        return self.current
+
+    # ------------------------------------------------------------------
+    # 插队
+    # ------------------------------------------------------------------
+
+    def play_next(self, song):
+        """下一首播放"""
+        try:
+            self.queue.remove(song)
+        except ValueError:
+            pass
+        self.queue.appendleft(song)
+
+    def add_to_queue(self, song):
+        """添加到播放队列末尾"""
+        self.queue.append(song)
+
+    def clear_queue(self):
+        """清空播放队列"""
+        self.queue.clear()
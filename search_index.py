@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+曲库搜索索引（内存）
+每首歌生成几个检索键：歌名本身、全拼（起风了 -> qifengle）、首字母（起风了 -> qfl），统一小写并去掉空白。
+- 3个字符以上：三元组(trigram)倒排表，取最短的倒排表再逐个核对子串
+- 1~2个字符：键和单词的前缀表；单个/两个汉字用汉字倒排表
+倒排表用 array('i') 存歌曲编号（按编号递增，删除时二分查找），10万首时内存只有几十MB；增删歌曲时只改动该歌曲的条目。
+删除的歌曲先留空位，空位多了再整体重新编号。
+条目以歌曲ID区分，检索的文字默认就是ID，也可以另给（多个曲库文件夹时ID不等于歌名）。
+拼音需要 pypinyin，没有安装时只按歌名和英文单词首字母检索。
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+
+try:
+    from pypinyin import lazy_pinyin
+    PYPINYIN_AVAILABLE = True
+except ImportError:
+    PYPINYIN_AVAILABLE = False
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_SPACE_RE = re.compile(r'\s+')
+
+# 删除留下的空位超过这个数、且超过总数的1/4时重新编号
+COMPACT_MIN = 1000
+
+
+def _is_han(ch):
+    return '\u4e00' <= ch <= '\u9fff'
+
+
+def normalize(text):
+    """小写并去掉空白"""
+    return _SPACE_RE.sub('', text.lower())
+
+
+def search_keys(name):
+    """歌曲的检索键 (键元组, 英文单词列表)"""
+    lower = name.lower()
+    keys = [normalize(lower)]
+    words = _WORD_RE.findall(lower)
+
+    if PYPINYIN_AVAILABLE and any(_is_han(ch) for ch in name):
+        parts = [p.lower() for p in lazy_pinyin(name)]
+        keys.append(normalize(''.join(parts)))
+        # 首字母：每个汉字的拼音和每个英文单词各取一个字母
+        keys.append(''.join(w[0] for p in parts for w in _WORD_RE.findall(p)))
+    elif len(words) > 1:
+        keys.append(''.join(w[0] for w in words))
+
+    unique = []
+    for key in keys:
+        if key and key not in unique:
+            unique.append(key)
+    return tuple(unique), words
+
+
+class SearchIndex:
+    """三元组 + 前缀 + 拼音 搜索索引"""
+
+    def __init__(self, names=()):
+        self.set_names(names)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def set_names(self, names):
+        """重建索引"""
+        self.names = []      # 编号 -> 歌曲ID（已删除为None）
+        self.ids = {}        # 歌曲ID -> 编号
+        self.titles = []     # 编号 -> 检索的文字
+        self.keys = []       # 编号 -> 检索键
+        self.texts = []      # 编号 -> 检索键用换行连接（核对子串时只需一次 in）
+        self.trigrams = {}   # 三元组 -> array 编号
+        self.prefixes = {}   # 1~2字符前缀 -> array 编号
+        self.hanzi = {}      # 汉字 -> array 编号
+        self.removed = 0     # 已删除的空位数
+        for name in names:
+            self.add(name)
+
+    def update(self, names):
+        """按新的曲库增删，返回 (新增数, 删除数)；names 为歌曲ID序列或 {歌曲ID: 文字}"""
+        if not isinstance(names, dict):
+            names = dict.fromkeys(names)
+        removed = [name for name in self.ids if name not in names]
+        for name in removed:
+            self.remove(name)
+        if self.removed > COMPACT_MIN and self.removed * 4 > len(self.names):
+            self.compact()
+        added = [name for name in names if name not in self.ids]
+        for name in added:
+            self.add(name, names[name])
+        return len(added), len(removed)
+
+    def _postings(self, name, keys, words):
+        """歌曲在各倒排表中的条目（去重）"""
+        trigrams = set()
+        prefixes = set()
+        for key in keys:
+            for i in range(len(key) - 2):
+                trigrams.add(key[i:i + 3])
+        for token in keys + tuple(words):
+            prefixes.add(token[:1])
+            if len(token) > 1:
+                prefixes.add(token[:2])
+        hanzi = set(ch for ch in name if _is_han(ch))
+        return ((self.trigrams, trigrams), (self.prefixes, prefixes), (self.hanzi, hanzi))
+
+    def add(self, name, text=None):
+        if name in self.ids:
+            return
+        text = text or name
+        keys, words = search_keys(text)
+        song_id = len(self.names)
+        self.names.append(name)
+        self.titles.append(text)
+        self.keys.append(keys)
+        self.texts.append('\n'.join(keys))
+        self.ids[name] = song_id
+        for table, grams in self._postings(text, keys, words):
+            for gram in grams:
+                posting = table.get(gram)
+                if posting is None:
+                    table[gram] = array('i', (song_id,))
+                else:
+                    posting.append(song_id)
+
+    def remove(self, name):
+        song_id = self.ids.pop(name, None)
+        if song_id is None:
+            return
+        keys = self.keys[song_id]
+        text = self.titles[song_id]
+        words = _WORD_RE.findall(text.lower())
+        for table, grams in self._postings(text, keys, words):
+            for gram in grams:
+                posting = table.get(gram)
+                if posting is None:
+                    continue
+                i = bisect_left(posting, song_id)
+                if i < len(posting) and posting[i] == song_id:
+                    del posting[i]
+                if not posting:
+                    del table[gram]
+        self.names[song_id] = None
+        self.titles[song_id] = ''
+        self.keys[song_id] = ()
+        self.texts[song_id] = ''
+        self.removed += 1
+
+    def compact(self):
+        """去掉删除留下的空位，重新编号（编号顺序不变，倒排表仍然递增）"""
+        mapping = array('i', bytes(4 * len(self.names)))
+        live = 0
+        for song_id, name in enumerate(self.names):
+            if name is None:
+                mapping[song_id] = -1
+            else:
+                mapping[song_id] = live
+                live += 1
+
+        keep = [i for i, name in enumerate(self.names) if name is not None]
+        self.names = [self.names[i] for i in keep]
+        self.titles = [self.titles[i] for i in keep]
+        self.keys = [self.keys[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        for table in (self.trigrams, self.prefixes, self.hanzi):
+            for gram, posting in table.items():
+                table[gram] = array('i', (mapping[i] for i in posting))
+        self.removed = 0
+
+    def search(self, query, limit=None):
+        """返回匹配的歌曲ID集合；空查询返回None（表示不过滤）"""
+        q = normalize(query)
+        if not q:
+            return None
+
+        if len(q) >= 3:
+            postings = []
+            for i in range(len(q) - 2):
+                posting = self.trigrams.get(q[i:i + 3])
+                if posting is None:
+                    return set()
+                postings.append(posting)
+            candidates = min(postings, key=len)
+            texts = self.texts
+            if len(q) == 3:
+                ids = set(candidates)
+            else:
+                ids = set(i for i in candidates if q in texts[i])
+        elif all(_is_han(ch) for ch in q):
+            postings = [self.hanzi.get(ch) for ch in q]
+            if not all(postings):
+                return set()
+            candidates = min(postings, key=len)
+            keys = self.keys
+            ids = set(i for i in candidates if q in keys[i][0])
+        else:
+            ids = set(self.prefixes.get(q, ()))
+
+        names = self.names
+        if limit:
+            ids = list(ids)[:limit]
+        return set(names[i] for i in ids)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载阶段追踪
+记录每首歌每个阶段（搜索、转换、落地、重命名、歌词……）的耗时，
+逐条写入JSONL，批次结束时输出各阶段的 p50/p90/p99 和每分钟歌曲数，
+可选导出Prometheus文本格式供采集。
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Span:
+    """一个阶段的计时记录"""
+
+    def __init__(self, song, stage, worker):
+        self.song = song
+        self.stage = stage
+        self.worker = worker
+        self.outcome = "ok"
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = 0.0
+
+    def fail(self, outcome="fail"):
+        """标记该阶段失败（如超时、未找到）"""
+        self.outcome = outcome
+
+
+class StageTracer:
+    """阶段耗时追踪器（线程安全）"""
+
+    def __init__(self, trace_file=None):
+        self.trace_file = trace_file
+        self.spans = []
+        self.songs_done = 0
+        self.songs_ok = 0
+        self.batch_start = time.time()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """开始新的批次"""
+        with self._lock:
+            self.spans = []
+            self.songs_done = 0
+            self.songs_ok = 0
+            self.batch_start = time.time()
+
+    @contextmanager
+    def span(self, song, stage, worker=None):
+        """追踪一个阶段：with tracer.span(song, "search") as span: ..."""
+        span = Span(song, stage, worker or threading.current_thread().name)
+        try:
+            yield span
+        except BaseException as e:
+            span.outcome = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+            raise
+        finally:
+            span.duration = time.perf_counter() - span._t0
+            self._record(span)
+
+    def _record(self, span):
+        """保存并写出一条记录"""
+        record = {
+            "song": span.song,
+            "worker": span.worker,
+            "stage": span.stage,
+            "start": round(span.start, 3),
+            "duration": round(span.duration, 4),
+            "outcome": span.outcome,
+        }
+        with self._lock:
+            self.spans.append(record)
+            if self.trace_file:
+                try:
+                    with open(self.trace_file, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except Exception:
+                    pass
+
+    def song_finished(self, song, success):
+        """一首歌处理结束"""
+        with self._lock:
+            self.songs_done += 1
+            if success:
+                self.songs_ok += 1
+
+    def summary(self):
+        """汇总各阶段耗时分布"""
+        with self._lock:
+            spans = list(self.spans)
+            songs_done = self.songs_done
+            songs_ok = self.songs_ok
+            elapsed = time.time() - self.batch_start
+
+        by_stage = {}
+        for record in spans:
+            by_stage.setdefault(record["stage"], []).append(record)
+
+        stages = {}
+        for stage, records in by_stage.items():
+            durations = sorted(r["duration"] for r in records)
+            stages[stage] = {
+                "count": len(durations),
+                "errors": sum(1 for r in records if r["outcome"] != "ok"),
+                "total": sum(durations),
+                "p50": percentile(durations, 50),
+                "p90": percentile(durations, 90),
+                "p99": percentile(durations, 99),
+                "max": durations[-1],
+            }
+
+        return {
+            "stages": stages,
+            "songs": songs_done,
+            "songs_ok": songs_ok,
+            "elapsed": elapsed,
+            "songs_per_minute": songs_done * 60.0 / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def format_summary(self):
+        """生成便于阅读的汇总文本"""
+        summary = self.summary()
+        lines = [
+            f"歌曲: {summary['songs']} (成功 {summary['songs_ok']}), "
+            f"耗时 {summary['elapsed']:.1f}s, {summary['songs_per_minute']:.2f} 首/分钟",
+            f"{'阶段':<14}{'次数':>6}{'失败':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'合计':>10}",
+        ]
+        stages = sorted(summary["stages"].items(), key=lambda kv: -kv[1]["total"])
+        for stage, s in stages:
+            lines.append(
+                f"{stage:<14}{s['count']:>6}{s['errors']:>6}"
+                f"{s['p50']:>8.2f}s{s['p90']:>8.2f}s{s['p99']:>8.2f}s{s['total']:>9.1f}s"
+            )
+        return "\n".join(lines)
+
+    def prometheus_text(self):
+        """导出Prometheus文本格式"""
+        summary = self.summary()
+        lines = [
+            "# HELP mahepo_stage_duration_seconds Download stage duration.",
+            "# TYPE mahepo_stage_duration_seconds summary",
+        ]
+        for stage, s in sorted(summary["stages"].items()):
+            for q, key in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99")):
+                lines.append(
+                    f'mahepo_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} {s[key]:.6f}'
+                )
+            lines.append(f'mahepo_stage_duration_seconds_sum{{stage="{stage}"}} {s["total"]:.6f}')
+            lines.append(f'mahepo_stage_duration_seconds_count{{stage="{stage}"}} {s["count"]}')
+
+        lines.append("# HELP mahepo_stage_errors_total Stages that did not finish ok.")
+        lines.append("# TYPE mahepo_stage_errors_total counter")
+        for stage, s in sorted(summary["stages"].items()):
+            lines.append(f'mahepo_stage_errors_total{{stage="{stage}"}} {s["errors"]}')
+
+        lines.append("# HELP mahepo_songs_total Songs processed in this batch.")
+        lines.append("# TYPE mahepo_songs_total counter")
+        lines.append(f"mahepo_songs_total {summary['songs']}")
+        lines.append("# HELP mahepo_songs_per_minute Batch throughput.")
+        lines.append("# TYPE mahepo_songs_per_minute gauge")
+        lines.append(f"mahepo_songs_per_minute {summary['songs_per_minute']:.4f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """写出Prometheus文本文件（可被node_exporter textfile采集）"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+待下载列表监听 - 持续读取 todo-download.txt 中新追加的歌曲
+已处理的位置持久化保存到偏移文件，程序重启后从上次的位置继续
+"""
+
+import os
+import json
+import hashlib
+
+from file_watch import FileChangeWaiter
+
+# 用文件开头若干字节的哈希识别“同一个文件”，防止文件被整体替换后沿用旧偏移
+HEAD_BYTES = 256
+
+
+class TodoTailer:
+    """以追加日志的方式读取待下载列表"""
+
+    def __init__(self, todo_file, offset_file=None, poll_interval=1.0):
+        self.todo_file = todo_file
+        self.offset_file = offset_file or todo_file + ".offset"
+        self.poll_interval = poll_interval
+        self.offset = 0
+        self.inode = None
+        self.head = ""
+        self.load_offset()
+        # 已读取（但不一定已处理完）的位置
+        self._read_pos = self.offset
+
+    def _file_head(self, f):
+        """计算文件开头的哈希"""
+        f.seek(0)
+        return hashlib.sha1(f.read(HEAD_BYTES)).hexdigest()
+
+    def load_offset(self):
+        """读取已持久化的偏移"""
+        try:
+            with open(self.offset_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.offset = int(state.get("offset", 0))
+            self.inode = state.get("inode")
+            self.head = state.get("head", "")
+        except Exception:
+            self.offset = 0
+            self.inode = None
+            self.head = ""
+
+    def commit(self, offset):
+        """持久化偏移（写临时文件 + fsync + 原子替换）"""
+        self.offset = offset
+        state = {"offset": self.offset, "inode": self.inode, "head": self.head}
+        tmp_file = self.offset_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.offset_file)
+
+    def read_new_lines(self):
+        """读取偏移之后新增的完整行，返回 [(歌曲名, 该行结束偏移), ...]
+
+        未以换行结尾的最后一行视为仍在写入，留到下次读取。
+        """
+        if not os.path.exists(self.todo_file):
+            return []
+
+        with open(self.todo_file, 'rb') as f:
+            st = os.fstat(f.fileno())
+            head = self._file_head(f)
+
+            # 文件被截断、替换或重写时从头开始
+            if (st.st_size < self._read_pos or
+                    (self.inode is not None and st.st_ino != self.inode) or
+                    (self.head and self._read_pos >= HEAD_BYTES and head != self.head)):
+                self.offset = 0
+                self._read_pos = 0
+
+            # 开头部分仍在增长时哈希会变，所以每次都记录最新值
+            self.inode = st.st_ino
+            self.head = head
+
+            f.seek(self._read_pos)
+            data = f.read()
+
+        songs = []
+        start = 0
+        while True:
+            newline = data.find(b"\n", start)
+            if newline < 0:
+                break
+            song = data[start:newline].decode('utf-8', errors='replace').lstrip('\ufeff').strip()
+            start = newline + 1
+            # 空行也返回，便于调用方推进偏移
+            songs.append((song or None, self._read_pos + start))
+
+        position = self._read_pos + start
+        self._read_pos = position
+        return songs
+
+    def follow(self, should_continue=lambda: True):
+        """持续产出新追加的歌曲，返回 (歌曲名, 结束偏移)
+
+        调用方处理完一首歌后应调用 commit(结束偏移)，保证崩溃后最多重做一首。
+        """
+        waiter = FileChangeWaiter(self.todo_file, poll_interval=self.poll_interval)
+        print(f"正在监听 {self.todo_file}（{waiter.mode}）")
+
+        try:
+            while should_continue():
+                pending = self.read_new_lines()
+                for song, end_offset in pending:
+                    if not should_continue():
+                        return
+                    if song is None:
+                        self.commit(end_offset)
+                        continue
+                    yield song, end_offset
+
+                if not pending:
+                    waiter.wait(timeout=self.poll_interval)
+        finally:
+            waiter.close()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存曲库（列式存储）
+每个字段一列：大小/修改时间/时长/比特率用 array，是否有歌词等放在标志位列，
+歌手和专辑按字符串池编号存储（同一歌手只存一份），只有歌曲ID和歌曲名是逐首的字符串。
+100万首约几十MB；排序返回下标数组，有NumPy时用argsort，没有时用 sorted(key=列.__getitem__)，
+同一列只排序一次。列表显示时才为可见的几行生成 Track 记录。
+"""
+
+from array import array
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 标志位
+FLAG_LRC = 1
+FLAG_BROKEN = 2     # 完整性检查发现不完整或损坏
+
+# 和SQLite的 COLLATE NOCASE 一致：只把ASCII字母转小写
+_ASCII_LOWER = {c: c + 32 for c in range(ord('A'), ord('Z') + 1)}
+
+
+def name_key(name):
+    """歌曲名排序键"""
+    return name.translate(_ASCII_LOWER)
+
+
+class Track:
+    """单首歌曲（按需生成）"""
+    __slots__ = ("index", "id", "name", "size", "mtime", "duration_ms", "bitrate", "has_lrc", "artist", "album", "broken")
+
+    def __init__(self, index, track_id, name, size, mtime, duration_ms, bitrate, has_lrc, artist, album, broken=False):
+        self.index = index
+        self.id = track_id
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.duration_ms = duration_ms
+        self.bitrate = bitrate
+        self.has_lrc = has_lrc
+        self.artist = artist
+        self.album = album
+        self.broken = broken
+
+
+class StringPool:
+    """字符串池：相同字符串只存一份，列中存编号（0为空）"""
+
+    def __init__(self):
+        self.strings = [""]
+        self._ids = {"": 0}
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def intern(self, string):
+        if not string:
+            return 0
+        string_id = self._ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self._ids[string] = string_id
+        return string_id
+
+
+class KeyView:
+    """按某个顺序读取排序键的只读序列（供bisect使用，不生成整列的键）"""
+
+    def __init__(self, order, key):
+        self.order = order
+        self.key = key
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index):
+        return self.key(self.order[index])
+
+
+class TrackStore:
+    """列式曲库，下标为歌曲编号（按歌曲名排序），ids 为歌曲ID（见 LibraryIndex.track_id）"""
+
+    COLUMNS = ("name", "size", "mtime", "duration", "bitrate", "lyrics", "artist", "album")
+
+    def __init__(self):
+        self.ids = []
+        self.names = []
+        self.roots = array('i')       # 曲库文件夹编号
+        self.size = array('q')
+        self.mtime = array('q')
+        self.duration = array('i')    # 毫秒，未知为-1
+        self.bitrate = array('H')     # kbps，未知为0
+        self.flags = array('B')
+        self.artist = array('i')
+        self.album = array('i')
+        self.artists = StringPool()
+        self.albums = StringPool()
+        self._orders = {}
+        self._index = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: (id, name, size, mtime, duration_ms, bitrate, has_lrc, artist, album, root, broken)，需已按 name_key 排序"""
+        store = cls()
+        rows = list(rows)
+        # 按列整体构建，比逐首append快很多
+        store.ids = [row[0] for row in rows]
+        store.names = [row[1] for row in rows]
+        store.size = array('q', (row[2] or 0 for row in rows))
+        store.mtime = array('q', (row[3] or 0 for row in rows))
+        store.duration = array('i', (row[4] if row[4] is not None else -1 for row in rows))
+        store.bitrate = array('H', (min(row[5] or 0, 0xFFFF) for row in rows))
+        store.flags = array('B', ((FLAG_LRC if row[6] else 0) | (FLAG_BROKEN if row[10] else 0) for row in rows))
+        artists, albums = store.artists.intern, store.albums.intern
+        store.artist = array('i', (artists(row[7]) for row in rows))
+        store.album = array('i', (albums(row[8]) for row in rows))
+        store.roots = array('i', (row[9] or 0 for row in rows))
+        return store
+
+    def append(self, track_id, name, size, mtime, duration_ms, bitrate, has_lrc, artist=None, album=None, root=0,
+               broken=False):
+        self.ids.append(track_id)
+        self.names.append(name)
+        self.roots.append(root or 0)
+        self.size.append(size or 0)
+        self.mtime.append(mtime or 0)
+        self.duration.append(duration_ms if duration_ms is not None else -1)
+        self.bitrate.append(min(bitrate or 0, 0xFFFF))
+        self.flags.append((FLAG_LRC if has_lrc else 0) | (FLAG_BROKEN if broken else 0))
+        self.artist.append(self.artists.intern(artist))
+        self.album.append(self.albums.intern(album))
+        self._orders = {}
+        self._index = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        return self.record(index)
+
+    def record(self, index):
+        duration = self.duration[index]
+        return Track(index, self.ids[index], self.names[index], self.size[index], self.mtime[index],
+                     duration if duration >= 0 else None, self.bitrate[index] or None,
+                     bool(self.flags[index] & FLAG_LRC),
+                     self.artists[self.artist[index]] or None, self.albums[self.album[index]] or None,
+                     bool(self.flags[index] & FLAG_BROKEN))
+
+    def index_of(self, track_id):
+        """歌曲ID -> 下标，不存在返回None（字典按需建立）"""
+        if self._index is None:
+            self._index = {track_id: i for i, track_id in enumerate(self.ids)}
+        return self._index.get(track_id)
+
+    def has_lrc(self, index):
+        return bool(self.flags[index] & FLAG_LRC)
+
+    def is_broken(self, index):
+        return bool(self.flags[index] & FLAG_BROKEN)
+
+    def set_flag(self, track_ids, flag):
+        """给这些歌曲加上标志位（如歌词在歌词库中的歌曲加 FLAG_LRC）"""
+        index = self.index_of
+        for track_id in track_ids:
+            i = index(track_id)
+            if i is not None:
+                self.flags[i] |= flag
+        self._orders.pop("lyrics", None)
+
+    # ------------------------------------------------------------------
+    # 排序与过滤
+    # ------------------------------------------------------------------
+
+    def key_func(self, column):
+        """列 -> 下标的排序键函数"""
+        if column == "name":
+            names = self.names
+            return lambda i: name_key(names[i])
+        if column == "lyrics":
+            flags = self.flags
+            return lambda i: flags[i] & FLAG_LRC
+        if column == "artist":
+            artist, strings = self.artist, self.artists.strings
+            return lambda i: strings[artist[i]].lower()
+        if column == "album":
+            album, strings = self.album, self.albums.strings
+            return lambda i: strings[album[i]].lower()
+        return getattr(self, column).__getitem__
+
+    def _pool_rank(self, column):
+        """歌手/专辑：字符串池中每个编号按名称排序后的名次"""
+        strings = (self.artists if column == "artist" else self.albums).strings
+        rank = array('i', bytes(4 * len(strings)))
+        for r, sid in enumerate(sorted(range(len(strings)), key=lambda s: strings[s].lower())):
+            rank[sid] = r
+        return rank
+
+    def order(self, column):
+        """整库按列排序的下标（稳定排序，缓存）"""
+        order = self._orders.get(column)
+        if order is not None:
+            return order
+
+        n = len(self.names)
+        if column == "name":
+            # 本身按名称存储
+            order = range(n)
+        elif NUMPY_AVAILABLE:
+            if column in ("artist", "album"):
+                ids = np.frombuffer(getattr(self, column), dtype=np.int32)
+                values = np.frombuffer(self._pool_rank(column), dtype=np.int32)[ids]
+            elif column == "lyrics":
+                values = np.frombuffer(self.flags, dtype=np.uint8) & FLAG_LRC
+            else:
+                column_array = getattr(self, column)
+                values = np.frombuffer(column_array, dtype=column_array.typecode)
+            order = array('i', np.argsort(values, kind='stable').astype(np.int32).tobytes())
+        elif column in ("artist", "album"):
+            rank, ids = self._pool_rank(column), getattr(self, column)
+            order = array('i', sorted(range(n), key=lambda i: rank[ids[i]]))
+        else:
+            order = array('i', sorted(range(n), key=self.key_func(column)))
+
+        self._orders[column] = order
+        return order
+
+    def sort(self, column, indices=None):
+        """排序：indices为None时整库，否则只排序这些下标；返回 (下标序列, 排序键序列)"""
+        key = self.key_func(column)
+        if indices is None:
+            order = self.order(column)
+        else:
+            order = array('i', sorted(indices, key=key))
+        return order, KeyView(order, key)
+
+    def select(self, track_ids):
+        """歌曲ID集合 -> 下标列表（按歌曲名顺序）"""
+        index = self.index_of
+        return sorted(i for i in (index(track_id) for track_id in track_ids) if i is not None)
+
+    def filter(self, predicate):
+        """满足 predicate(下标) 的下标"""
+        return array('i', (i for i in range(len(self.names)) if predicate(i)))
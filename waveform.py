@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+波形峰值
+后台进程把每首歌解码一次，降采样为固定数量的 最小值/最大值 对（int8），
+按 路径+大小+修改时间 的哈希缓存到磁盘，播放时直接读取缓存绘制进度条波形。
+有NumPy时用NumPy计算，没有时退回audioop/array（打包版不含NumPy）。
+"""
+
+import os
+import hashlib
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import audioop
+    AUDIOOP_AVAILABLE = True
+except ImportError:
+    AUDIOOP_AVAILABLE = False
+
+# 每首歌的峰值对数量
+PEAK_BUCKETS = 1024
+# 解码采样率（单声道），只用于画波形，不需要高采样率
+DECODE_RATE = 11025
+
+
+def cache_key(path):
+    """缓存键：路径 + 大小 + 修改时间 的SHA1"""
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def cache_file(cache_dir, path):
+    """峰值缓存文件路径"""
+    return os.path.join(cache_dir, cache_key(path) + ".peaks")
+
+
+def load_peaks(cache_dir, path):
+    """读取缓存的峰值（array('b')，依次为 min0,max0,min1,max1,...），没有缓存返回None"""
+    try:
+        with open(cache_file(cache_dir, path), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    peaks = array('b')
+    peaks.frombytes(data)
+    return peaks
+
+
+def decode_pcm(path, rate=DECODE_RATE):
+    """用pygame解码为16位单声道PCM（在工作进程中使用无声音频驱动）；path 也可以是文件对象"""
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=rate, size=-16, channels=1)
+    return pygame.mixer.Sound(path).get_raw()
+
+
+def compute_peaks(pcm, buckets=PEAK_BUCKETS):
+    """16位PCM -> buckets 个 (最小值, 最大值) 对，缩放到int8，返回bytes"""
+    count = len(pcm) // 2
+    if count == 0:
+        return bytes(buckets * 2)
+
+    if NUMPY_AVAILABLE:
+        samples = np.frombuffer(pcm[:count * 2], dtype=np.int16)
+        per = max(1, count // buckets)
+        if per * buckets > count:
+            samples = np.concatenate([samples, np.zeros(per * buckets - count, dtype=np.int16)])
+        blocks = samples[:per * buckets].reshape(buckets, per)
+        out = np.empty(buckets * 2, dtype=np.int8)
+        out[0::2] = (blocks.min(axis=1) >> 8).astype(np.int8)
+        out[1::2] = (blocks.max(axis=1) >> 8).astype(np.int8)
+        return out.tobytes()
+
+    per = max(1, count // buckets)
+    out = array('b')
+    for i in range(buckets):
+        block = pcm[i * per * 2:(i + 1) * per * 2]
+        if not block:
+            out.extend((0, 0))
+            continue
+        if AUDIOOP_AVAILABLE:
+            low, high = audioop.minmax(block, 2)
+        else:
+            samples = array('h')
+            samples.frombytes(block)
+            # 纯Python时隔点取样，峰值略有误差但足够画图
+            samples = samples[::max(1, len(samples) // 512)]
+            low, high = min(samples), max(samples)
+        out.extend((low >> 8, high >> 8))
+    return out.tobytes()
+
+
+def build_peaks(path, target, buckets=PEAK_BUCKETS):
+    """工作进程入口：解码、计算并写入缓存文件"""
+    data = compute_peaks(decode_pcm(path), buckets)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = target + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+    return target
+
+
+class WaveformService:
+    """波形峰值服务：命中缓存立即返回，否则交给进程池计算，完成后回调"""
+
+    def __init__(self, cache_dir, workers=1):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._pool = None
+        self._pending = {}   # 路径 -> 回调列表
+        self._lock = threading.Lock()
+
+    def request(self, path, callback=None):
+        """获取峰值：有缓存直接返回；否则返回None，计算完成后调用 callback(path, peaks)"""
+        peaks = load_peaks(self.cache_dir, path)
+        if peaks is not None:
+            return peaks
+
+        try:
+            target = cache_file(self.cache_dir, path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if path in self._pending:
+                if callback:
+                    self._pending[path].append(callback)
+                return None
+            self._pending[path] = [callback] if callback else []
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            future = self._pool.submit(build_peaks, path, target)
+
+        future.add_done_callback(lambda f, p=path: self._done(p, f))
+        return None
+
+    def _done(self, path, future):
+        """进程池任务完成（在结果线程中调用）"""
+        with self._lock:
+            callbacks = self._pending.pop(path, [])
+
+        try:
+            future.result()
+            peaks = load_peaks(self.cache_dir, path)
+        except Exception as e:
+            print(f"Waveform error: {path} - {e}")
+            peaks = None
+
+        for callback in callbacks:
+            try:
+                callback(path, peaks)
+            except Exception:
+                pass
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None